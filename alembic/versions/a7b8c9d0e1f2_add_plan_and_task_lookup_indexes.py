@@ -0,0 +1,69 @@
+"""Add composite indexes for latest-plan and active-task lookups
+
+Revision ID: a7b8c9d0e1f2
+Revises: f6a7b8c9d0e1
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7b8c9d0e1f2'
+down_revision: Union[str, Sequence[str], None] = 'f6a7b8c9d0e1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add (user_id, created_at) plan indexes and a (user_id, task_type, status) task index.
+
+    The plan indexes serve the "latest plan for user" lookups (ORDER BY
+    created_at DESC LIMIT 1); the task index serves the in-flight generation
+    task check. Chat and feedback history are already covered by
+    d4e5f6a7b8c9. Built concurrently so writes aren't blocked.
+    """
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_nutrition_plans_user_created',
+            'nutrition_plans',
+            ['user_id', 'created_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_workout_plans_user_created',
+            'workout_plans',
+            ['user_id', 'created_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_generation_tasks_user_type_status',
+            'generation_tasks',
+            ['user_id', 'task_type', 'status'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Drop the plan and task lookup indexes."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_generation_tasks_user_type_status',
+            table_name='generation_tasks',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_workout_plans_user_created',
+            table_name='workout_plans',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_nutrition_plans_user_created',
+            table_name='nutrition_plans',
+            postgresql_concurrently=True,
+        )
@@ -0,0 +1,53 @@
+"""Add current plan pointers to users
+
+Revision ID: b8c9d0e1f2a3
+Revises: a7b8c9d0e1f2
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8c9d0e1f2a3'
+down_revision: Union[str, Sequence[str], None] = 'a7b8c9d0e1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add users.current_{nutrition,workout}_plan_id and point them at each user's latest plan."""
+    # Batch mode, so SQLite (which can't ALTER constraints) rebuilds the table instead
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('current_nutrition_plan_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('current_workout_plan_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_users_current_nutrition_plan_id', 'nutrition_plans',
+            ['current_nutrition_plan_id'], ['id'], ondelete='SET NULL',
+        )
+        batch_op.create_foreign_key(
+            'fk_users_current_workout_plan_id', 'workout_plans',
+            ['current_workout_plan_id'], ['id'], ondelete='SET NULL',
+        )
+    # Uses the (user_id, created_at) indexes from a7b8c9d0e1f2
+    for column, table in (
+        ('current_nutrition_plan_id', 'nutrition_plans'),
+        ('current_workout_plan_id', 'workout_plans'),
+    ):
+        op.execute(
+            f"UPDATE users SET {column} = ("
+            f"SELECT p.id FROM {table} p WHERE p.user_id = users.id "
+            f"ORDER BY p.created_at DESC, p.id DESC LIMIT 1)"
+        )
+
+
+def downgrade() -> None:
+    """Drop the current plan pointers."""
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_constraint('fk_users_current_workout_plan_id', type_='foreignkey')
+        batch_op.drop_constraint('fk_users_current_nutrition_plan_id', type_='foreignkey')
+        batch_op.drop_column('current_workout_plan_id')
+        batch_op.drop_column('current_nutrition_plan_id')
@@ -0,0 +1,31 @@
+"""Add activity_bitmap to user_streaks
+
+Revision ID: c3d4e5f6a7b8
+Revises: b2c3d4e5f6a7
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3d4e5f6a7b8'
+down_revision: Union[str, Sequence[str], None] = 'b2c3d4e5f6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the per-user active-day bitset backing the streak columns.
+
+    Populate it afterwards with `python -m app.utils.streaks`.
+    """
+    op.add_column('user_streaks', sa.Column('activity_bitmap', sa.LargeBinary(), nullable=True))
+
+
+def downgrade() -> None:
+    """Drop activity_bitmap from user_streaks."""
+    op.drop_column('user_streaks', 'activity_bitmap')
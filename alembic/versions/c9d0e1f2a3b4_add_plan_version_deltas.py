@@ -0,0 +1,65 @@
+"""Add delta storage columns to plan versions
+
+Revision ID: c9d0e1f2a3b4
+Revises: b8c9d0e1f2a3
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9d0e1f2a3b4'
+down_revision: Union[str, Sequence[str], None] = 'b8c9d0e1f2a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PLAN_TABLES = ('nutrition_plans', 'workout_plans')
+
+
+def upgrade() -> None:
+    """Add base_plan_id and plan_delta to both plan tables.
+
+    Existing versions stay full copies; compact them afterwards with
+    `python -m app.utils.plan_deltas`.
+    """
+    for table in PLAN_TABLES:
+        op.add_column(table, sa.Column('base_plan_id', sa.Integer(), nullable=True))
+        op.add_column(table, sa.Column('plan_delta', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Rebuild delta-stored versions into full plan_data, then drop the delta columns."""
+    from app.utils.plan_deltas import apply_delta
+
+    bind = op.get_bind()
+    for table_name in PLAN_TABLES:
+        table = sa.table(
+            table_name,
+            sa.column('id', sa.Integer()),
+            sa.column('plan_data', sa.JSON()),
+            sa.column('plan_delta', sa.JSON()),
+            sa.column('base_plan_id', sa.Integer()),
+        )
+        # A base always has a higher id, so newest-first finds every base already rebuilt
+        deltas = bind.execute(
+            sa.select(table.c.id, table.c.base_plan_id, table.c.plan_delta)
+            .where(table.c.base_plan_id.isnot(None))
+            .order_by(table.c.id.desc())
+        ).all()
+        for plan_id, base_plan_id, delta in deltas:
+            base = bind.execute(
+                sa.select(table.c.plan_data).where(table.c.id == base_plan_id)
+            ).scalar()
+            bind.execute(
+                sa.update(table)
+                .where(table.c.id == plan_id)
+                .values(plan_data=apply_delta(base, delta))
+            )
+
+    for table in PLAN_TABLES:
+        op.drop_column(table, 'plan_delta')
+        op.drop_column(table, 'base_plan_id')
@@ -0,0 +1,170 @@
+"""Partition chat_history by month and add the chat archive catalog
+
+Revision ID: d0e1f2a3b4c5
+Revises: c9d0e1f2a3b4
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd0e1f2a3b4c5'
+down_revision: Union[str, Sequence[str], None] = 'c9d0e1f2a3b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHAT_COLUMNS = 'id, user_id, message, response, created_at, write_id'
+
+
+def _create_chat_indexes(write_id_columns) -> None:
+    op.create_index('ix_chat_history_id', 'chat_history', ['id'], unique=False)
+    op.create_index('ix_chat_history_user_id', 'chat_history', ['user_id'], unique=False)
+    op.create_index(
+        'ix_chat_history_user_created_id', 'chat_history', ['user_id', 'created_at', 'id'], unique=False
+    )
+    op.create_index('uq_chat_history_write_id', 'chat_history', write_id_columns, unique=True)
+
+
+def upgrade() -> None:
+    """Add chat_archive_segments and, on Postgres, rebuild chat_history as a partitioned table.
+
+    The existing rows are copied into monthly partitions inside this migration's
+    transaction, which blocks chat writes for the duration of the copy: run it in
+    a maintenance window. SQLite keeps a plain table; only the write_id key
+    changes there.
+    """
+    from app.utils.chat_archive import DEFAULT_PARTITION, PARTITIONS_AHEAD, add_months, create_partition, month_start
+
+    op.create_table(
+        'chat_archive_segments',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Date(), nullable=False),
+        sa.Column('byte_offset', sa.BigInteger(), nullable=False),
+        sa.Column('byte_length', sa.Integer(), nullable=False),
+        sa.Column('row_count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(
+        'uq_chat_archive_segments_user_month', 'chat_archive_segments', ['user_id', 'month'], unique=True
+    )
+    op.create_index(op.f('ix_chat_archive_segments_month'), 'chat_archive_segments', ['month'], unique=False)
+
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        op.drop_index('uq_chat_history_write_id', table_name='chat_history')
+        op.create_index('uq_chat_history_write_id', 'chat_history', ['write_id', 'created_at'], unique=True)
+        return
+
+    op.execute('ALTER TABLE chat_history RENAME TO chat_history_unpartitioned')
+    op.execute('ALTER TABLE chat_history_unpartitioned RENAME CONSTRAINT chat_history_pkey TO chat_history_unpartitioned_pkey')
+    for index in ('ix_chat_history_id', 'ix_chat_history_user_id', 'ix_chat_history_user_created_id', 'uq_chat_history_write_id'):
+        op.execute(f'DROP INDEX {index}')
+    # The id sequence carries over to the new table
+    op.execute('ALTER SEQUENCE chat_history_id_seq OWNED BY NONE')
+    op.execute(
+        """
+        CREATE TABLE chat_history (
+            id integer NOT NULL DEFAULT nextval('chat_history_id_seq'),
+            user_id integer,
+            message text,
+            response text NOT NULL,
+            created_at timestamp with time zone NOT NULL DEFAULT now(),
+            write_id varchar(32),
+            CONSTRAINT chat_history_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute('ALTER SEQUENCE chat_history_id_seq OWNED BY chat_history.id')
+
+    oldest = bind.execute(sa.text(
+        "SELECT min(created_at AT TIME ZONE 'UTC') FROM chat_history_unpartitioned"
+    )).scalar()
+    month = month_start(oldest.date() if oldest else date.today())
+    last = add_months(month_start(date.today()), PARTITIONS_AHEAD)
+    while month <= last:
+        create_partition(bind, month)
+        month = add_months(month, 1)
+    op.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF chat_history DEFAULT')
+
+    op.execute(
+        f'INSERT INTO chat_history ({CHAT_COLUMNS}) '
+        f'SELECT id, user_id, message, response, COALESCE(created_at, now()), write_id '
+        f'FROM chat_history_unpartitioned'
+    )
+    op.execute('DROP TABLE chat_history_unpartitioned')
+    _create_chat_indexes(['write_id', 'created_at'])
+
+
+def downgrade() -> None:
+    """Rebuild chat_history as a plain table, restoring archived turns, and drop the catalog.
+
+    Archived months are read back from CHAT_ARCHIVE_DIR; the archive files are
+    left in place.
+    """
+    from app.utils.chat_archive import archive_path
+    import orjson
+    import zstandard
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('ALTER TABLE chat_history RENAME TO chat_history_partitioned')
+        op.execute('ALTER TABLE chat_history_partitioned RENAME CONSTRAINT chat_history_pkey TO chat_history_partitioned_pkey')
+        for index in ('ix_chat_history_id', 'ix_chat_history_user_id', 'ix_chat_history_user_created_id', 'uq_chat_history_write_id'):
+            op.execute(f'DROP INDEX {index}')
+        op.execute('ALTER SEQUENCE chat_history_id_seq OWNED BY NONE')
+        op.execute(
+            """
+            CREATE TABLE chat_history (
+                id integer NOT NULL DEFAULT nextval('chat_history_id_seq'),
+                user_id integer,
+                message text,
+                response text NOT NULL,
+                created_at timestamp with time zone DEFAULT now(),
+                write_id varchar(32),
+                CONSTRAINT chat_history_pkey PRIMARY KEY (id)
+            )
+            """
+        )
+        op.execute('ALTER SEQUENCE chat_history_id_seq OWNED BY chat_history.id')
+        op.execute(
+            f'INSERT INTO chat_history ({CHAT_COLUMNS}) '
+            f'SELECT {CHAT_COLUMNS} FROM chat_history_partitioned'
+        )
+        op.execute('DROP TABLE chat_history_partitioned CASCADE')
+    else:
+        op.drop_index('uq_chat_history_write_id', table_name='chat_history')
+
+    chat_history = sa.table(
+        'chat_history',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('message', sa.Text),
+        sa.column('response', sa.Text),
+        sa.column('created_at', sa.DateTime(timezone=True)),
+    )
+    segments = bind.execute(sa.text(
+        'SELECT user_id, month, byte_offset, byte_length FROM chat_archive_segments ORDER BY month, user_id'
+    )).all()
+    decompressor = zstandard.ZstdDecompressor()
+    for segment in segments:
+        with open(archive_path(segment.month), 'rb') as archive:
+            archive.seek(segment.byte_offset)
+            lines = decompressor.decompress(archive.read(segment.byte_length)).splitlines()
+        rows = [{**orjson.loads(line), 'user_id': segment.user_id} for line in lines]
+        for row in rows:
+            row['created_at'] = datetime.fromisoformat(row['created_at'])
+        bind.execute(chat_history.insert(), rows)
+
+    if bind.dialect.name == 'postgresql':
+        _create_chat_indexes(['write_id'])
+    else:
+        op.create_index('uq_chat_history_write_id', 'chat_history', ['write_id'], unique=True)
+    op.drop_index(op.f('ix_chat_archive_segments_month'), table_name='chat_archive_segments')
+    op.drop_index('uq_chat_archive_segments_user_month', table_name='chat_archive_segments')
+    op.drop_table('chat_archive_segments')
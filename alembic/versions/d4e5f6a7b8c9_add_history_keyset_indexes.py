@@ -0,0 +1,55 @@
+"""Add composite indexes for keyset pagination of chat and feedback history
+
+Revision ID: d4e5f6a7b8c9
+Revises: c3d4e5f6a7b8
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e5f6a7b8c9'
+down_revision: Union[str, Sequence[str], None] = 'c3d4e5f6a7b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add (user_id, created_at, id) indexes matching the history cursors.
+
+    daily_logs and body_metric_logs are already covered by their unique
+    (user_id, date) indexes. Built concurrently so writes aren't blocked.
+    """
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_history_user_created_id',
+            'chat_history',
+            ['user_id', 'created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_plan_feedbacks_user_created_id',
+            'plan_feedbacks',
+            ['user_id', 'created_at', 'id'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Drop the history keyset indexes."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_plan_feedbacks_user_created_id',
+            table_name='plan_feedbacks',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_chat_history_user_created_id',
+            table_name='chat_history',
+            postgresql_concurrently=True,
+        )
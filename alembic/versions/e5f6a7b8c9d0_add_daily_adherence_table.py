@@ -0,0 +1,54 @@
+"""Add daily_adherence table
+
+Revision ID: e5f6a7b8c9d0
+Revises: d4e5f6a7b8c9
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5f6a7b8c9d0'
+down_revision: Union[str, Sequence[str], None] = 'd4e5f6a7b8c9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the materialized per-day plan adherence table.
+
+    Populate it afterwards with `python -m app.utils.adherence`.
+    """
+    op.create_table(
+        'daily_adherence',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('log_date', sa.Date(), nullable=False),
+        sa.Column('scheduled_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('completed_count', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('plan_id', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['plan_id'], ['workout_plans.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index(op.f('ix_daily_adherence_id'), 'daily_adherence', ['id'], unique=False)
+    # Composite unique: one row per user per date; rollups range-scan it
+    op.create_index(
+        'uq_daily_adherence_user_date',
+        'daily_adherence',
+        ['user_id', 'log_date'],
+        unique=True,
+    )
+
+
+def downgrade() -> None:
+    """Drop the daily_adherence table."""
+    op.drop_index('uq_daily_adherence_user_date', table_name='daily_adherence')
+    op.drop_index(op.f('ix_daily_adherence_id'), table_name='daily_adherence')
+    op.drop_table('daily_adherence')
@@ -0,0 +1,46 @@
+"""Add chat_history.write_id for idempotent write-behind inserts
+
+Revision ID: f6a7b8c9d0e1
+Revises: e5f6a7b8c9d0
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a7b8c9d0e1'
+down_revision: Union[str, Sequence[str], None] = 'e5f6a7b8c9d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add the nullable write_id column and its unique index.
+
+    Existing rows keep a NULL write_id. The index is built concurrently so
+    chat writes aren't blocked.
+    """
+    op.add_column('chat_history', sa.Column('write_id', sa.String(length=32), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_chat_history_write_id',
+            'chat_history',
+            ['write_id'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Drop write_id and its index."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'uq_chat_history_write_id',
+            table_name='chat_history',
+            postgresql_concurrently=True,
+        )
+    op.drop_column('chat_history', 'write_id')
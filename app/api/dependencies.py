@@ -1,4 +1,4 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
@@ -7,8 +7,9 @@ from typing import Optional
 from passlib.context import CryptContext
 
 from ..core.config import settings
-from ..core.database import get_db
+from ..core.database import ReadSessionLocal, get_db, pick_replica
 from ..models import models, schemas
+from ..utils import read_your_writes
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
@@ -48,7 +49,9 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(
+    request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -67,5 +70,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     user = get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
+    # Lets the read-your-writes middleware pin this user after a write
+    request.state.user_id = user.id
     return user
 
+
+def read_session(user_id: int) -> Session:
+    """A session reading from a replica, or from the primary if the user wrote recently."""
+    replica = pick_replica()
+    if replica is not None and read_your_writes.is_pinned(user_id):
+        replica = None
+    return ReadSessionLocal(replica=replica)
+
+
+def get_read_db(current_user: models.User = Depends(get_current_user)):
+    """Session for GET endpoints; see read_session."""
+    db = read_session(current_user.id)
+    try:
+        yield db
+    finally:
+        db.close()
+
@@ -1,15 +1,44 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from typing import List, Optional
 from sqlalchemy.orm import Session
 import json
 from ...core.database import get_db
 from ...core.langraph_workflow import workflow_manager
 from ...models import models, schemas
-from ...utils import helpers
+from ...utils import chat_archive, chat_index, current_plans, faq_cache, helpers, pagination, write_behind
 from ...utils.rate_limit import check_chat_rate_limit
-from ..dependencies import get_current_user
+from ..dependencies import get_current_user, get_read_db
 
 router = APIRouter()
 
+# Prompt context: the latest turns, plus the past turns most relevant to the new message
+RECENT_TURNS = 4
+RELEVANT_TURNS = 6
+
+def _save_turn(user_id: int, message: str, response: str, db: Session) -> schemas.ChatResponse:
+    # Queued for a batched insert; written synchronously only if Redis can't take it
+    created_at = write_behind.enqueue_chat_turn(user_id, message, response)
+    if created_at is not None:
+        return schemas.ChatResponse(response=response, created_at=created_at)
+
+    chat_history = models.ChatHistory(
+        user_id=user_id,
+        message=message,
+        response=response
+    )
+    db.add(chat_history)
+    db.commit()
+    db.refresh(chat_history)
+    chat_index.add_turn(
+        user_id, chat_history.id, chat_history.message, chat_history.response, chat_history.created_at
+    )
+
+    return schemas.ChatResponse(
+        response=response,
+        created_at=chat_history.created_at,  # type: ignore
+    )
+
+
 @router.post("/chat", response_model=schemas.ChatResponse)
 def chat_with_ai(
     message: schemas.ChatMessage,
@@ -31,29 +60,48 @@ def chat_with_ai(
         models.UserGoals.user_id == current_user.id
     ).first()
     
-    # Get latest plans
-    nutrition_plan = db.query(models.NutritionPlan).filter(
-        models.NutritionPlan.user_id == current_user.id
-    ).order_by(models.NutritionPlan.created_at.desc()).first()
-    
-    workout_plan = db.query(models.WorkoutPlan).filter(
-        models.WorkoutPlan.user_id == current_user.id
-    ).order_by(models.WorkoutPlan.created_at.desc()).first()
-    
     if not profile or not goals:
         raise HTTPException(
             status_code=400,
             detail="User profile and goals must be set before chatting"
         )
-    
-    # Get last N chat messages for context
-    history_records = db.query(models.ChatHistory).filter(
+
+    # General questions get a shared, profile-independent answer
+    if faq_cache.is_generic(message.message):
+        response = faq_cache.get_answer(message.message)
+        if response is not None:
+            faq_cache.record("hit")
+        else:
+            faq_cache.record("miss")
+            response = workflow_manager.answer_general_question(message.message)
+            faq_cache.store_answer(message.message, response)
+        return _save_turn(current_user.id, message.message, response, db)
+    faq_cache.record("personal")
+
+    # Get current plans
+    nutrition_plan = current_plans.current_plan(db, current_user.id, "nutrition")
+    workout_plan = current_plans.current_plan(db, current_user.id, "workout")
+
+    # Context: the last few turns plus older turns relevant to this message
+    recent_records = db.query(models.ChatHistory).filter(
         models.ChatHistory.user_id == current_user.id
-    ).order_by(models.ChatHistory.created_at.desc()).limit(10).all()
-    
+    ).order_by(models.ChatHistory.created_at.desc(), models.ChatHistory.id.desc()).limit(RECENT_TURNS).all()
+    # Turns still queued for write-behind aren't in the table yet
+    recent_records = write_behind.merge_queued(recent_records, current_user.id, RECENT_TURNS)
+
+    relevant_ids = chat_index.relevant_turn_ids(
+        db, current_user.id, message.message, RELEVANT_TURNS,
+        exclude_ids=[record.id for record in recent_records if record.id],
+    )
+    relevant_records = db.query(models.ChatHistory).filter(
+        models.ChatHistory.id.in_(relevant_ids)
+    ).all() if relevant_ids else []
+
+    # Every relevant turn is older than the recent ones
+    history_records = sorted(relevant_records, key=lambda r: (r.created_at, r.id)) + recent_records[::-1]
     chat_messages = [
         {"user": record.message, "assistant": record.response}
-        for record in reversed(history_records)
+        for record in history_records
     ]
 
     # Prepare user data for chat
@@ -78,36 +126,35 @@ def chat_with_ai(
     
     # Get AI response
     response = workflow_manager.chat_with_AI(user_data, message.message)
+    return _save_turn(current_user.id, message.message, response, db)
 
-    chat_history = models.ChatHistory(
-        user_id=current_user.id,
-        message=message.message,
-        response=response
-    )
-    db.add(chat_history)
-    db.commit()
-    db.refresh(chat_history)
 
-    return schemas.ChatResponse(
-        response=response,
-        created_at=chat_history.created_at,  # type: ignore
-    )   
+@router.get("/chat/faq-cache/stats", response_model=schemas.FaqCacheStatsResponse)
+def get_faq_cache_stats(current_user: models.User = Depends(get_current_user)):
+    """Shared FAQ answer cache counters: hits, misses, personal (uncached) messages and hit rate."""
+    return faq_cache.stats()
 
-@router.get("/chat/history")
+@router.get("/chat/history", response_model=List[schemas.ChatHistoryItem])
 def get_chat_history(
+    response: Response,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    limit: int = 50
+    db: Session = Depends(get_read_db),
+    limit: int = Query(default=50, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page")
 ):
-    history = db.query(models.ChatHistory).filter(
-        models.ChatHistory.user_id == current_user.id
-    ).order_by(models.ChatHistory.created_at.desc()).limit(limit).all()
-    
-    return [
-        {
-            "message": chat.message,
-            "response": chat.response,
-            "created_at": chat.created_at
-        }
-        for chat in history
-    ]
\ No newline at end of file
+    columns = [models.ChatHistory.created_at, models.ChatHistory.id]
+    history = pagination.keyset(
+        db.query(models.ChatHistory).filter(models.ChatHistory.user_id == current_user.id),
+        columns,
+        cursor,
+    ).limit(limit).all()
+    before = pagination.decode_cursor(cursor, columns) if cursor else None
+    # Turns still queued for write-behind aren't in the table yet
+    history = write_behind.merge_queued(history, current_user.id, limit, before)
+    if len(history) < limit:
+        # Scrolled past the live partitions: continue into the archived months
+        if history:
+            before = (history[-1].created_at, history[-1].id)
+        history += chat_archive.history_page(db, current_user.id, before, limit - len(history))
+    pagination.set_next_cursor(response, history, ["created_at", "id"], limit)
+    return history
@@ -3,16 +3,18 @@ Feedback Loop endpoints — adaptive plan modification via AI.
 POST /api/feedback/plan   → adapt workout or nutrition plan based on free-text feedback
 GET  /api/feedback/history → paginated history of past feedback + what the AI changed
 """
+import uuid
 from datetime import datetime, timedelta
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 
 from ...core.database import get_db
 from ...core.langraph_workflow import workflow_manager
 from ...models import models, schemas
-from ..dependencies import get_current_user
+from ...utils import current_plans, pagination, quota
+from ..dependencies import get_current_user, get_read_db
 
 router = APIRouter()
 
@@ -20,19 +22,26 @@ router = APIRouter()
 DAILY_FEEDBACK_LIMIT = 5
 
 
-def _check_feedback_rate_limit(user_id: int, plan_type: str, db: Session) -> None:
-    """Raise 429 if the user has already submitted DAILY_FEEDBACK_LIMIT adaptations today."""
-    one_day_ago = datetime.utcnow() - timedelta(days=1)
-    count = (
-        db.query(models.PlanFeedback)
-        .filter(
-            models.PlanFeedback.user_id == user_id,
-            models.PlanFeedback.plan_type == plan_type,
-            models.PlanFeedback.created_at >= one_day_ago,
+def _check_feedback_rate_limit(user_id: int, plan_type: str, db: Session) -> str:
+    """Raise 429 if the user has already submitted DAILY_FEEDBACK_LIMIT adaptations today.
+    Consumes one unit of the user's quota ledger when the request is admitted and
+    returns its charge id, for quota.release_quota.
+    """
+    def load_history():
+        one_day_ago = datetime.utcnow() - timedelta(days=1)
+        rows = (
+            db.query(models.PlanFeedback.created_at)
+            .filter(
+                models.PlanFeedback.user_id == user_id,
+                models.PlanFeedback.plan_type == plan_type,
+                models.PlanFeedback.created_at >= one_day_ago,
+            )
+            .all()
         )
-        .count()
-    )
-    if count >= DAILY_FEEDBACK_LIMIT:
+        return [row.created_at for row in rows]
+
+    charge_id = uuid.uuid4().hex
+    if not quota.acquire_quota(user_id, f"feedback:{plan_type}", DAILY_FEEDBACK_LIMIT, load_history, charge_id):
         raise HTTPException(
             status_code=429,
             detail=(
@@ -40,6 +49,7 @@ def _check_feedback_rate_limit(user_id: int, plan_type: str, db: Session) -> Non
                 f"{plan_type} plan adaptations per day. Try again tomorrow."
             ),
         )
+    return charge_id
 
 
 def _build_user_data(
@@ -69,6 +79,53 @@ def _build_user_data(
     }
 
 
+def _adapt_and_persist(
+    plan_type: str,
+    feedback_text: str,
+    feedback_history: list,
+    user_data: dict,
+    latest_workout: models.WorkoutPlan | None,
+    latest_nutrition: models.NutritionPlan | None,
+    user_id: int,
+    db: Session,
+) -> tuple:
+    """Run the AI adaptation and store the new plan version plus its feedback record."""
+    if plan_type == "workout":
+        updated_plan = workflow_manager.adapt_workout_plan(
+            user_data, feedback_text, feedback_history
+        )
+        source_plan_id = latest_workout.id if latest_workout else None
+
+        # Extract and strip the AI's embedded summary
+        changes_summary: str = updated_plan.pop("changes_summary", "Plan adapted per your feedback.")
+
+        # Persist new plan version (original row untouched) and make it current
+        current_plans.add_version(db, user_id, "workout", updated_plan)
+
+    else:  # nutrition
+        updated_plan = workflow_manager.adapt_nutrition_plan(
+            user_data, feedback_text, feedback_history
+        )
+        source_plan_id = latest_nutrition.id if latest_nutrition else None
+
+        changes_summary = updated_plan.pop("changes_summary", "Plan adapted per your feedback.")
+
+        current_plans.add_version(db, user_id, "nutrition", updated_plan)
+
+    # Persist feedback record
+    feedback_record = models.PlanFeedback(
+        user_id=user_id,
+        plan_type=plan_type,
+        feedback_text=feedback_text,
+        changes_summary=changes_summary,
+        source_plan_id=source_plan_id,
+    )
+    db.add(feedback_record)
+    db.commit()
+    db.refresh(feedback_record)
+    return updated_plan, changes_summary, feedback_record
+
+
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 
 @router.post("/plan", response_model=schemas.PlanFeedbackResponse)
@@ -92,9 +149,6 @@ def submit_plan_feedback(
             detail="plan_type must be 'workout' or 'nutrition'.",
         )
 
-    # Rate limit check
-    _check_feedback_rate_limit(current_user.id, plan_type, db)
-
     # Load profile & goals
     profile = (
         db.query(models.UserProfile)
@@ -113,18 +167,8 @@ def submit_plan_feedback(
         )
 
     # Load current plans
-    latest_workout = (
-        db.query(models.WorkoutPlan)
-        .filter(models.WorkoutPlan.user_id == current_user.id)
-        .order_by(models.WorkoutPlan.created_at.desc())
-        .first()
-    )
-    latest_nutrition = (
-        db.query(models.NutritionPlan)
-        .filter(models.NutritionPlan.user_id == current_user.id)
-        .order_by(models.NutritionPlan.created_at.desc())
-        .first()
-    )
+    latest_workout = current_plans.current_plan(db, current_user.id, "workout")
+    latest_nutrition = current_plans.current_plan(db, current_user.id, "nutrition")
 
     # Ensure the relevant plan actually exists
     if plan_type == "workout" and not latest_workout:
@@ -161,50 +205,25 @@ def submit_plan_feedback(
         profile, goals, latest_workout, latest_nutrition, current_user.id
     )
 
-    # ── Call the AI ───────────────────────────────────────────────────────────
-    if plan_type == "workout":
-        updated_plan = workflow_manager.adapt_workout_plan(
-            user_data, payload.feedback_text, feedback_history
-        )
-        source_plan_id = latest_workout.id if latest_workout else None
-
-        # Extract and strip the AI's embedded summary
-        changes_summary: str = updated_plan.pop("changes_summary", "Plan adapted per your feedback.")
-
-        # Persist new plan version (original row untouched)
-        new_plan_row = models.WorkoutPlan(
-            user_id=current_user.id,
-            plan_data=updated_plan,
-        )
-        db.add(new_plan_row)
-
-    else:  # nutrition
-        updated_plan = workflow_manager.adapt_nutrition_plan(
-            user_data, payload.feedback_text, feedback_history
-        )
-        source_plan_id = latest_nutrition.id if latest_nutrition else None
-
-        changes_summary = updated_plan.pop("changes_summary", "Plan adapted per your feedback.")
+    # Rate limit check (consumes a quota unit, given back if the adaptation fails)
+    charge_id = _check_feedback_rate_limit(current_user.id, plan_type, db)
 
-        new_plan_row = models.NutritionPlan(
-            user_id=current_user.id,
-            plan_data=updated_plan,
+    # ── Call the AI ───────────────────────────────────────────────────────────
+    try:
+        updated_plan, changes_summary, feedback_record = _adapt_and_persist(
+            plan_type,
+            payload.feedback_text,
+            feedback_history,
+            user_data,
+            latest_workout,
+            latest_nutrition,
+            current_user.id,
+            db,
         )
-        db.add(new_plan_row)
-
-    db.flush()  # get new_plan_row.id before committing
-
-    # Persist feedback record
-    feedback_record = models.PlanFeedback(
-        user_id=current_user.id,
-        plan_type=plan_type,
-        feedback_text=payload.feedback_text,
-        changes_summary=changes_summary,
-        source_plan_id=source_plan_id,
-    )
-    db.add(feedback_record)
-    db.commit()
-    db.refresh(feedback_record)
+    except Exception:
+        db.rollback()
+        quota.release_quota(current_user.id, f"feedback:{plan_type}", charge_id)
+        raise
 
     return schemas.PlanFeedbackResponse(
         feedback_id=feedback_record.id,
@@ -218,18 +237,21 @@ def submit_plan_feedback(
 
 @router.get("/history", response_model=List[schemas.PlanFeedbackHistoryItem])
 def get_feedback_history(
+    response: Response,
     plan_type: str = Query(
         default=None,
         description="Filter by plan type: 'workout' or 'nutrition'. Omit for all.",
     ),
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Return the history of all feedback submissions for the current user, newest first.
-    Optionally filter by plan_type.
+    Optionally filter by plan_type. Supports cursor pagination through the
+    X-Next-Cursor header.
     """
     query = db.query(models.PlanFeedback).filter(
         models.PlanFeedback.user_id == current_user.id
@@ -243,9 +265,12 @@ def get_feedback_history(
         query = query.filter(models.PlanFeedback.plan_type == plan_type)
 
     records = (
-        query.order_by(models.PlanFeedback.created_at.desc())
+        pagination.keyset(
+            query, [models.PlanFeedback.created_at, models.PlanFeedback.id], cursor
+        )
         .offset(skip)
         .limit(limit)
         .all()
     )
+    pagination.set_next_cursor(response, records, ["created_at", "id"], limit)
     return records
@@ -1,42 +1,33 @@
 import uuid
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response, status
 from sqlalchemy.orm import Session
 
 from ...core.database import get_db
 from ...models import models, schemas
-from ..dependencies import get_current_user
+from ...utils import current_plans, etag, pagination, plan_json, quota
+from ..dependencies import get_current_user, get_read_db
 from app.worker import generate_nutrition_plan_task, generate_workout_plan_task
 
 router = APIRouter()
 
-@router.post("/generate-nutrition-plan", status_code=status.HTTP_202_ACCEPTED)
-def generate_nutrition_plan(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    # Get user profile and goals
-    profile = db.query(models.UserProfile).filter(
-        models.UserProfile.user_id == current_user.id
-    ).first()
-    goals = db.query(models.UserGoals).filter(
-        models.UserGoals.user_id == current_user.id
-    ).first()
-    if not profile or not goals:
-        raise HTTPException(
-            status_code=400,
-            detail="User profile and goals must be set before generating a nutrition plan"
-        )
+# Plans each user may generate per plan type in a rolling 24h window
+DAILY_PLAN_LIMIT = 1
+# A generation task holding its slot longer than this is treated as stuck
+ACTIVE_TASK_TTL_SECONDS = 60 * 60
 
-    # Rate Limit Checks
+
+def _check_active_task(user_id: int, task_type: str, db: Session) -> None:
+    """Database fallback for the in-flight slot when Redis is unavailable."""
     active_task = db.query(models.GenerationTask).filter(
-        models.GenerationTask.user_id == current_user.id,
-        models.GenerationTask.task_type == "nutrition",
+        models.GenerationTask.user_id == user_id,
+        models.GenerationTask.task_type == task_type,
         models.GenerationTask.status.in_(["PENDING", "PROCESSING"])
     ).first()
     if active_task:
         # If the active task is stale (older than 1 hour), mark it failed and allow a new task.
-        stale_threshold = datetime.utcnow() - timedelta(hours=1)
+        stale_threshold = datetime.utcnow() - timedelta(seconds=ACTIVE_TASK_TTL_SECONDS)
         if active_task.created_at and active_task.created_at < stale_threshold:
             try:
                 active_task.status = "FAILED"
@@ -47,38 +38,94 @@ def generate_nutrition_plan(
         else:
             raise HTTPException(
                 status_code=400,
-                detail="A nutrition plan generation task is already in progress."
+                detail=f"A {task_type} plan generation task is already in progress."
             )
 
-    one_day_ago = datetime.utcnow() - timedelta(days=1)
-    recent_plan = db.query(models.NutritionPlan).filter(
-        models.NutritionPlan.user_id == current_user.id,
-        models.NutritionPlan.created_at >= one_day_ago
-    ).first()
-    if recent_plan:
+
+def _admit_generation_task(user_id: int, task_type: str, task_id: str, db: Session) -> None:
+    """
+    Admission control for plan generation: one in-flight task per plan type and
+    DAILY_PLAN_LIMIT accepted tasks per rolling day. Both checks are O(1) Redis
+    operations; the worker releases the slot (and the quota unit on failure).
+    """
+    slot = quota.acquire_slot(user_id, f"generate:{task_type}", task_id, ACTIVE_TASK_TTL_SECONDS)
+    if slot is None:
+        _check_active_task(user_id, task_type, db)
+    elif not slot:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A {task_type} plan generation task is already in progress."
+        )
+
+    def load_history():
+        one_day_ago = datetime.utcnow() - timedelta(days=1)
+        rows = db.query(models.GenerationTask.created_at).filter(
+            models.GenerationTask.user_id == user_id,
+            models.GenerationTask.task_type == task_type,
+            models.GenerationTask.status != "FAILED",
+            models.GenerationTask.created_at >= one_day_ago
+        ).all()
+        return [row.created_at for row in rows]
+
+    if not quota.acquire_quota(user_id, f"plan:{task_type}", DAILY_PLAN_LIMIT, load_history, task_id):
+        quota.release_slot(user_id, f"generate:{task_type}", task_id)
         raise HTTPException(
             status_code=429,
-            detail="You can only generate one nutrition plan per day."
+            detail=f"You can only generate one {task_type} plan per day."
+        )
+
+
+@router.post(
+    "/generate-nutrition-plan",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.TaskAcceptedResponse,
+)
+def generate_nutrition_plan(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Get user profile and goals
+    profile = db.query(models.UserProfile).filter(
+        models.UserProfile.user_id == current_user.id
+    ).first()
+    goals = db.query(models.UserGoals).filter(
+        models.UserGoals.user_id == current_user.id
+    ).first()
+    if not profile or not goals:
+        raise HTTPException(
+            status_code=400,
+            detail="User profile and goals must be set before generating a nutrition plan"
         )
 
+    # Rate Limit Checks
     task_id = str(uuid.uuid4())
-    db_task = models.GenerationTask(
-        id=task_id,
-        user_id=current_user.id,
-        task_type="nutrition",
-        status="PENDING"
-    )
-    db.add(db_task)
-    db.commit()
+    _admit_generation_task(current_user.id, "nutrition", task_id, db)
 
-    generate_nutrition_plan_task.delay(task_id, current_user.id)
+    try:
+        db_task = models.GenerationTask(
+            id=task_id,
+            user_id=current_user.id,
+            task_type="nutrition",
+            status="PENDING"
+        )
+        db.add(db_task)
+        db.commit()
+
+        generate_nutrition_plan_task.delay(task_id, current_user.id)
+    except Exception:
+        quota.release_generation(current_user.id, "nutrition", task_id, failed=True)
+        raise
 
     return {
         "task_id": task_id,
         "status": "PENDING"
     }
 
-@router.post("/generate-workout-plan", status_code=status.HTTP_202_ACCEPTED)
+@router.post(
+    "/generate-workout-plan",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=schemas.TaskAcceptedResponse,
+)
 def generate_workout_plan(
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -92,89 +139,123 @@ def generate_workout_plan(
     goals = db.query(models.UserGoals).filter(
         models.UserGoals.user_id == current_user.id
     ).first()
-    nutrition_plan = db.query(models.NutritionPlan).filter(
-        models.NutritionPlan.user_id == current_user.id
-    ).order_by(models.NutritionPlan.created_at.desc()).first()
+    nutrition_plan_id = current_plans.current_plan_id(db, current_user.id, "nutrition")
 
-    if not profile or not goals or not nutrition_plan:
+    if not profile or not goals or nutrition_plan_id is None:
         raise HTTPException(
             status_code=400,
             detail="User profile, goals, and nutrition plan must be set before generating a workout plan"
         )
 
     # Rate Limit Checks
-    active_task = db.query(models.GenerationTask).filter(
-        models.GenerationTask.user_id == current_user.id,
-        models.GenerationTask.task_type == "workout",
-        models.GenerationTask.status.in_(["PENDING", "PROCESSING"])
-    ).first()
-    if active_task:
-        # If the active task is stale (older than 1 hour), mark it failed and allow a new task.
-        stale_threshold = datetime.utcnow() - timedelta(hours=1)
-        if active_task.created_at and active_task.created_at < stale_threshold:
-            try:
-                active_task.status = "FAILED"
-                active_task.error = "Automatically marked FAILED due to being stuck >1 hour"
-                db.commit()
-            except Exception:
-                db.rollback()
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="A workout plan generation task is already in progress."
-            )
+    task_id = str(uuid.uuid4())
+    _admit_generation_task(current_user.id, "workout", task_id, db)
 
-    one_day_ago = datetime.utcnow() - timedelta(days=1)
-    recent_plan = db.query(models.WorkoutPlan).filter(
-        models.WorkoutPlan.user_id == current_user.id,
-        models.WorkoutPlan.created_at >= one_day_ago
-    ).first()
-    if recent_plan:
-        raise HTTPException(
-            status_code=429,
-            detail="You can only generate one workout plan per day."
+    try:
+        db_task = models.GenerationTask(
+            id=task_id,
+            user_id=current_user.id,
+            task_type="workout",
+            status="PENDING"
         )
+        db.add(db_task)
+        db.commit()
 
-    task_id = str(uuid.uuid4())
-    db_task = models.GenerationTask(
-        id=task_id,
-        user_id=current_user.id,
-        task_type="workout",
-        status="PENDING"
-    )
-    db.add(db_task)
-    db.commit()
-
-    generate_workout_plan_task.delay(task_id, current_user.id)
+        generate_workout_plan_task.delay(task_id, current_user.id)
+    except Exception:
+        quota.release_generation(current_user.id, "workout", task_id, failed=True)
+        raise
 
     return {
         "task_id": task_id,
         "status": "PENDING"
     }
 
-@router.get("/plans")
+@router.get("/plans", response_model=schemas.UserPlansResponse)
 def get_user_plans(
+    request: Request,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    nutrition_plan = db.query(models.NutritionPlan).filter(
-        models.NutritionPlan.user_id == current_user.id
-    ).order_by(models.NutritionPlan.created_at.desc()).first()
-    
-    workout_plan = db.query(models.WorkoutPlan).filter(
-        models.WorkoutPlan.user_id == current_user.id
-    ).order_by(models.WorkoutPlan.created_at.desc()).first()
-    
-    return {
-        "nutrition_plan":  nutrition_plan if nutrition_plan else None,
-        "workout_plan": workout_plan if workout_plan else None
-    }
+    plan_ids = current_plans.current_plan_ids(db, current_user.id)
+    tag = etag.compute("plans", plan_ids["nutrition"], plan_ids["workout"])
+    unchanged = etag.not_modified(request, tag)
+    if unchanged:
+        return unchanged
+
+    # Plan versions are immutable, so their JSON is cached per row and spliced in as-is
+    response = Response(content=plan_json.plans_bytes(db, plan_ids), media_type="application/json")
+    etag.set_headers(response, tag)
+    return response
+
+@router.get("/plans/versions", response_model=List[schemas.PlanVersionItem])
+def get_plan_versions(
+    response: Response,
+    plan_type: str = Query(pattern="^(workout|nutrition)$"),
+    limit: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Version history of one plan type, newest first: metadata only, plan_data is
+    not loaded. Fetch a version's plan with GET /plans/versions/{plan_type}/{plan_id}.
+    Supports cursor pagination through the X-Next-Cursor header.
+    """
+    model, _ = current_plans.PLAN_TYPES[plan_type]
+    versions = (
+        pagination.keyset(
+            db.query(model.id, model.created_at).filter(model.user_id == current_user.id),
+            [model.created_at, model.id],
+            cursor,
+        )
+        .limit(limit)
+        .all()
+    )
+    pagination.set_next_cursor(response, versions, ["created_at", "id"], limit)
+    current_id = current_plans.current_plan_id(db, current_user.id, plan_type)
+    return [
+        schemas.PlanVersionItem(
+            id=version.id,
+            plan_type=plan_type,
+            created_at=version.created_at,
+            is_current=version.id == current_id,
+        )
+        for version in versions
+    ]
+
+
+@router.get(
+    "/plans/versions/{plan_type}/{plan_id}",
+    response_model=Union[schemas.NutritionPlanResponse, schemas.WorkoutPlanResponse],
+)
+def get_plan_version(
+    request: Request,
+    plan_type: str = Path(pattern="^(workout|nutrition)$"),
+    plan_id: int = Path(),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db)
+):
+    """One plan version with its plan_data. Versions never change, so the ETag is just its id."""
+    model, _ = current_plans.PLAN_TYPES[plan_type]
+    owned = db.query(model.id).filter(model.id == plan_id, model.user_id == current_user.id).first()
+    if not owned:
+        raise HTTPException(status_code=404, detail="Plan version not found")
+
+    tag = etag.compute("plan-version", plan_type, plan_id)
+    unchanged = etag.not_modified(request, tag)
+    if unchanged:
+        return unchanged
+    response = Response(content=plan_json.plan_bytes(db, plan_type, plan_id), media_type="application/json")
+    etag.set_headers(response, tag)
+    return response
+
 
 @router.get("/tasks/{task_id}", response_model=schemas.TaskResponse)
 def get_task_status(
     task_id: str,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     task = db.query(models.GenerationTask).filter(
         models.GenerationTask.id == task_id,
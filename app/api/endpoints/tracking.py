@@ -1,26 +1,33 @@
 """
 Tracking endpoints – Daily Log, Body Metrics, Streak
 """
-from datetime import date, timedelta
+import json
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from redis.exceptions import RedisError
+from sqlalchemy import Date, bindparam, func, text
 from sqlalchemy.orm import Session
 
-from ...core.database import get_db
+from ...core.database import dialect_insert, get_db
 from ...models import models, schemas
-from ..dependencies import get_current_user
+from ...utils import (
+    adherence, cache, current_plans, etag, forecast, leaderboard, pagination, streaks, trends
+)
+from ..dependencies import get_current_user, get_read_db
 
 router = APIRouter()
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def _get_or_create_daily_log(
-    user_id: int, log_date: date, db: Session
-) -> models.DailyLog:
-    """Fetch existing daily log or create an empty one."""
-    daily_log = (
+def _latest_workout_plan_id(user_id: int, db: Session) -> Optional[int]:
+    return current_plans.current_plan_id(db, user_id, "workout")
+
+
+def _find_daily_log(user_id: int, log_date: date, db: Session) -> Optional[models.DailyLog]:
+    return (
         db.query(models.DailyLog)
         .filter(
             models.DailyLog.user_id == user_id,
@@ -28,40 +35,37 @@ def _get_or_create_daily_log(
         )
         .first()
     )
+
+
+def _get_or_create_daily_log(
+    user_id: int, log_date: date, db: Session
+) -> models.DailyLog:
+    """
+    Fetch existing daily log or add an empty one, linked to the user's latest
+    workout plan. Only used on write paths; the caller's commit persists it.
+    """
+    daily_log = _find_daily_log(user_id, log_date, db)
     if not daily_log:
-        # Link to the user's latest workout plan if one exists
-        latest_plan = (
-            db.query(models.WorkoutPlan)
-            .filter(models.WorkoutPlan.user_id == user_id)
-            .order_by(models.WorkoutPlan.created_at.desc())
-            .first()
-        )
         daily_log = models.DailyLog(
             user_id=user_id,
             log_date=log_date,
             completed_exercises=[],
-            workout_plan_id=latest_plan.id if latest_plan else None,
+            workout_plan_id=_latest_workout_plan_id(user_id, db),
         )
         db.add(daily_log)
-        db.commit()
-        db.refresh(daily_log)
+        db.flush()
     return daily_log
 
 
-def _update_streak(user_id: int, today: date, db: Session) -> models.UserStreak:
+def _get_or_create_streak(user_id: int, db: Session, lock: bool = False) -> models.UserStreak:
     """
-    Recalculate and persist the user's streak.
-    Rules:
-      - last_active_date == today  → already counted, no-op
-      - last_active_date == yesterday → extend streak
-      - anything else              → reset to 1
-    Always bumps total_workouts_completed when advancing from a new day.
+    Fetch the user's streak row, adding a zeroed one to the session if missing.
+    `lock` takes a row lock, for callers that rewrite the whole bitmap.
     """
-    streak = (
-        db.query(models.UserStreak)
-        .filter(models.UserStreak.user_id == user_id)
-        .first()
-    )
+    query = db.query(models.UserStreak).filter(models.UserStreak.user_id == user_id)
+    if lock:
+        query = query.with_for_update()
+    streak = query.first()
     if not streak:
         streak = models.UserStreak(
             user_id=user_id,
@@ -71,25 +75,121 @@ def _update_streak(user_id: int, today: date, db: Session) -> models.UserStreak:
             total_workouts_completed=0,
         )
         db.add(streak)
+    return streak
+
 
-    if streak.last_active_date == today:
-        # Already counted today – nothing changes
-        return streak
+def _update_streak(user_id: int, day: date, active: bool, db: Session) -> models.UserStreak:
+    """
+    Mark `day` active (≥1 exercise completed) or inactive in the user's streak
+    bitmap and refresh the projected streak columns. Days may arrive in any order.
+    """
+    streak = _get_or_create_streak(user_id, db)
+    streak.activity_bitmap = streaks.set_day(streak.activity_bitmap, day, active)
+    streaks.apply_projection(streak)
+    db.commit()
+    db.refresh(streak)
+    leaderboard.record_streak(user_id, streak.current_streak)
+    return streak
 
-    streak.total_workouts_completed += 1
 
-    if streak.last_active_date == today - timedelta(days=1):
-        streak.current_streak += 1
-    else:
-        streak.current_streak = 1
+def _validate_log_date(log_date: date) -> None:
+    """Reject dates the streak bitmap can't hold or that haven't happened yet."""
+    if log_date < streaks.STREAK_EPOCH or log_date > date.today() + timedelta(days=1):
+        raise HTTPException(
+            status_code=422,
+            detail=f"log_date must be between {streaks.STREAK_EPOCH.isoformat()} and tomorrow.",
+        )
+
+
+# ── Single-statement write path (PostgreSQL) ─────────────────────────────────
+# A check-off upserts the day's log, links it to the current workout plan when the
+# row is new, and sets or clears the day's bit in the streak bitmap, all in one
+# statement. The caller refreshes the projected streak columns from the returned
+# bitmap in the same transaction.
+
+_DAILY_LOG_UPSERT_SQL = """
+WITH log AS (
+    INSERT INTO daily_logs (user_id, log_date, completed_exercises, workout_plan_id)
+    VALUES (
+        :user_id,
+        :log_date,
+        {insert_value},
+        (SELECT current_workout_plan_id FROM users WHERE id = :user_id)
+    )
+    ON CONFLICT (user_id, log_date) DO UPDATE
+    SET completed_exercises = {update_value},
+        updated_at = now()
+    RETURNING id, user_id, log_date, completed_exercises, workout_plan_id, created_at, updated_at
+),
+streak AS (
+    INSERT INTO user_streaks AS s
+        (user_id, current_streak, longest_streak, total_workouts_completed, activity_bitmap)
+    SELECT :user_id, 0, 0, 0, set_bit(
+        decode(repeat('00', :day_index / 8 + 1), 'hex'),
+        :day_index,
+        CASE WHEN json_array_length(log.completed_exercises) > 0 THEN 1 ELSE 0 END
+    )
+    FROM log
+    ON CONFLICT (user_id) DO UPDATE
+    SET activity_bitmap = set_bit(
+        COALESCE(s.activity_bitmap, CAST('' AS bytea)) || decode(repeat('00', GREATEST(
+            :day_index / 8 + 1 - length(COALESCE(s.activity_bitmap, CAST('' AS bytea))), 0
+        )), 'hex'),
+        :day_index,
+        get_bit(EXCLUDED.activity_bitmap, :day_index)
+    )
+    RETURNING s.activity_bitmap
+)
+SELECT log.*, (SELECT activity_bitmap FROM streak) AS activity_bitmap FROM log
+"""
+
+# Replace the whole list (POST /daily-log)
+_REPLACE_EXERCISES_SQL = text(
+    _DAILY_LOG_UPSERT_SQL.format(
+        insert_value="CAST(:exercises AS json)",
+        update_value="CAST(:exercises AS json)",
+    )
+).bindparams(bindparam("log_date", type_=Date))
+
+# Add or remove one exercise, keeping the list duplicate-free (PATCH /daily-log/exercise)
+_TOGGLE_EXERCISE_SQL = text(
+    _DAILY_LOG_UPSERT_SQL.format(
+        insert_value="""CASE WHEN :completed
+            THEN json_build_array(CAST(:exercise AS text))
+            ELSE CAST('[]' AS json)
+        END""",
+        update_value="""CASE
+            WHEN NOT :completed THEN CAST(
+                COALESCE(CAST(daily_logs.completed_exercises AS jsonb), CAST('[]' AS jsonb))
+                - CAST(:exercise AS text) AS json)
+            WHEN COALESCE(CAST(daily_logs.completed_exercises AS jsonb), CAST('[]' AS jsonb))
+                @> jsonb_build_array(CAST(:exercise AS text))
+            THEN daily_logs.completed_exercises
+            ELSE CAST(
+                COALESCE(CAST(daily_logs.completed_exercises AS jsonb), CAST('[]' AS jsonb))
+                || jsonb_build_array(CAST(:exercise AS text)) AS json)
+        END""",
+    )
+).bindparams(bindparam("log_date", type_=Date))
+
 
-    if streak.current_streak > streak.longest_streak:
-        streak.longest_streak = streak.current_streak
+def _supports_single_statement_upsert(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
 
-    streak.last_active_date = today
+
+def _write_daily_log(statement, params: dict, db: Session):
+    """Run a single-statement daily-log write and project the streak from its bitmap."""
+    row = db.execute(
+        statement, {**params, "day_index": streaks.day_index(params["log_date"])}
+    ).one()
+    adherence.record_log(db, row)
+    projected = streaks.projection(bytes(row.activity_bitmap))
+    db.query(models.UserStreak).filter(
+        models.UserStreak.user_id == params["user_id"]
+    ).update(projected, synchronize_session=False)
     db.commit()
-    db.refresh(streak)
-    return streak
+    leaderboard.record_streak(params["user_id"], projected["current_streak"])
+    return row
 
 
 def _daily_log_to_response(log: models.DailyLog) -> schemas.DailyLogResponse:
@@ -112,17 +212,64 @@ def _daily_log_to_response(log: models.DailyLog) -> schemas.DailyLogResponse:
 def get_today_log(
     log_date: Optional[date] = Query(default=None, description="Defaults to today (server date)"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Get the daily workout log for today (or a specific date).
-    Auto-creates an empty log if one doesn't exist yet.
+    Read-only: a day without a log gets an unsaved empty log (id null); the row
+    is only created by the first check-off.
     The response includes the list of completed exercises and the user's active
     workout plan id so clients can fetch today's scheduled exercises.
     """
     target_date = log_date or date.today()
-    daily_log = _get_or_create_daily_log(current_user.id, target_date, db)
-    return _daily_log_to_response(daily_log)
+    daily_log = _find_daily_log(current_user.id, target_date, db)
+    if daily_log:
+        return _daily_log_to_response(daily_log)
+    return schemas.DailyLogResponse(
+        id=None,
+        user_id=current_user.id,
+        log_date=target_date,
+        completed_exercises=[],
+        workout_plan_id=_latest_workout_plan_id(current_user.id, db),
+        total_exercises_completed=0,
+    )
+
+
+@router.get("/daily-log/calendar", response_model=schemas.DailyLogCalendarResponse)
+def get_daily_log_calendar(
+    month: Optional[str] = Query(
+        default=None, pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="YYYY-MM, defaults to this month"
+    ),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Per-day completed/scheduled exercise counts for one month, in one range scan
+    of the materialized daily_adherence table. Days without a row are omitted.
+    """
+    first_day = date.fromisoformat(f"{month}-01") if month else date.today().replace(day=1)
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    rows = (
+        db.query(
+            models.DailyAdherence.log_date,
+            models.DailyAdherence.completed_count,
+            models.DailyAdherence.scheduled_count,
+        )
+        .filter(
+            models.DailyAdherence.user_id == current_user.id,
+            models.DailyAdherence.log_date >= first_day,
+            models.DailyAdherence.log_date < next_month,
+        )
+        .order_by(models.DailyAdherence.log_date)
+        .all()
+    )
+    return schemas.DailyLogCalendarResponse(
+        month=first_day.strftime("%Y-%m"),
+        days={
+            row.log_date.day: [row.completed_count, row.scheduled_count]
+            for row in rows
+        },
+    )
 
 
 @router.post("/daily-log", response_model=schemas.DailyLogResponse)
@@ -134,15 +281,29 @@ def upsert_daily_log(
     """
     Upsert a full daily log for a given date.
     Replaces completed_exercises list entirely.
-    If at least 1 exercise is completed, streak is updated.
+    The day counts towards the streak while at least 1 exercise is completed.
     """
+    _validate_log_date(payload.log_date)
+
+    if _supports_single_statement_upsert(db):
+        row = _write_daily_log(
+            _REPLACE_EXERCISES_SQL,
+            {
+                "user_id": current_user.id,
+                "log_date": payload.log_date,
+                "exercises": json.dumps(payload.completed_exercises),
+            },
+            db,
+        )
+        return _daily_log_to_response(row)
+
     daily_log = _get_or_create_daily_log(current_user.id, payload.log_date, db)
     daily_log.completed_exercises = payload.completed_exercises
+    adherence.record_log(db, daily_log)
     db.commit()
     db.refresh(daily_log)
 
-    if payload.completed_exercises:
-        _update_streak(current_user.id, payload.log_date, db)
+    _update_streak(current_user.id, payload.log_date, bool(payload.completed_exercises), db)
 
     return _daily_log_to_response(daily_log)
 
@@ -156,9 +317,25 @@ def toggle_exercise(
 ):
     """
     Toggle a single exercise as completed or not completed.
-    If at least 1 exercise is now marked complete, the streak is updated for that day.
+    The day counts towards the streak while at least 1 exercise is marked complete.
     """
     target_date = log_date or date.today()
+
+    _validate_log_date(target_date)
+
+    if _supports_single_statement_upsert(db):
+        row = _write_daily_log(
+            _TOGGLE_EXERCISE_SQL,
+            {
+                "user_id": current_user.id,
+                "log_date": target_date,
+                "exercise": payload.exercise_name,
+                "completed": payload.completed,
+            },
+            db,
+        )
+        return _daily_log_to_response(row)
+
     daily_log = _get_or_create_daily_log(current_user.id, target_date, db)
 
     completed: List[str] = list(daily_log.completed_exercises or [])
@@ -170,34 +347,42 @@ def toggle_exercise(
         completed = [e for e in completed if e != payload.exercise_name]
 
     daily_log.completed_exercises = completed
+    adherence.record_log(db, daily_log)
     db.commit()
     db.refresh(daily_log)
 
-    # Update streak whenever ≥1 exercise is marked done for this day
-    if completed:
-        _update_streak(current_user.id, target_date, db)
+    # The day counts towards the streak while ≥1 exercise is marked done
+    _update_streak(current_user.id, target_date, bool(completed), db)
 
     return _daily_log_to_response(daily_log)
 
 
 @router.get("/daily-log/history", response_model=List[schemas.DailyLogResponse])
 def get_log_history(
+    response: Response,
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=30, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Paginated list of past daily logs, newest first.
+    Pass the X-Next-Cursor header of a page as `cursor` to fetch the next one;
+    unlike `skip`, cursor pages cost the same at any depth.
     """
+    # log_date is unique per user, so it is a complete keyset on its own
     logs = (
-        db.query(models.DailyLog)
-        .filter(models.DailyLog.user_id == current_user.id)
-        .order_by(models.DailyLog.log_date.desc())
+        pagination.keyset(
+            db.query(models.DailyLog).filter(models.DailyLog.user_id == current_user.id),
+            [models.DailyLog.log_date],
+            cursor,
+        )
         .offset(skip)
         .limit(limit)
         .all()
     )
+    pagination.set_next_cursor(response, logs, ["log_date"], limit)
     return [_daily_log_to_response(log) for log in logs]
 
 
@@ -236,6 +421,7 @@ def log_body_metrics(
             existing.body_fat_pct = payload.body_fat_pct
         db.commit()
         db.refresh(existing)
+        forecast.invalidate(current_user.id)
         return existing
     else:
         new_entry = models.BodyMetricLog(
@@ -247,55 +433,459 @@ def log_body_metrics(
         db.add(new_entry)
         db.commit()
         db.refresh(new_entry)
+        forecast.invalidate(current_user.id)
         return new_entry
 
 
 @router.get("/body-metrics", response_model=List[schemas.BodyMetricResponse])
 def get_body_metrics(
+    request: Request,
+    response: Response,
     skip: int = Query(default=0, ge=0),
     limit: int = Query(default=90, ge=1, le=365),
+    cursor: Optional[str] = Query(default=None, description="X-Next-Cursor from the previous page"),
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Return all body metric logs for the current user, oldest first (for charting).
+    Supports cursor pagination through the X-Next-Cursor header, and
+    If-None-Match against an ETag of the user's series version.
     """
-    logs = (
-        db.query(models.BodyMetricLog)
+    version = (
+        db.query(
+            func.count(models.BodyMetricLog.id),
+            func.max(models.BodyMetricLog.logged_at),
+            func.max(models.BodyMetricLog.updated_at),
+        )
         .filter(models.BodyMetricLog.user_id == current_user.id)
-        .order_by(models.BodyMetricLog.logged_at.asc())
+        .one()
+    )
+    tag = etag.compute("body-metrics", *version, skip, limit, cursor)
+    unchanged = etag.not_modified(request, tag)
+    if unchanged:
+        return unchanged
+    etag.set_headers(response, tag)
+
+    logs = (
+        pagination.keyset(
+            db.query(models.BodyMetricLog).filter(models.BodyMetricLog.user_id == current_user.id),
+            [models.BodyMetricLog.logged_at],
+            cursor,
+            descending=False,
+        )
         .offset(skip)
         .limit(limit)
         .all()
     )
+    pagination.set_next_cursor(response, logs, ["logged_at"], limit)
     return logs
 
 
+# Trend payloads are keyed by the series version, so they only need a safety TTL
+BODY_METRIC_TREND_TTL_SECONDS = 24 * 60 * 60
+
+
+@router.get("/body-metrics/trend", response_model=schemas.BodyMetricTrendResponse)
+def get_body_metric_trend(
+    bucket: str = Query(default="week", pattern="^(week|month)$"),
+    alpha: float = Query(default=0.25, gt=0, lt=1, description="EMA smoothing factor"),
+    since: Optional[date] = Query(default=None, description="Only include entries from this date"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Weekly or monthly body-metric buckets with a weight EMA and the linear weight
+    trend in kg/week, computed server-side so clients don't chart raw rows.
+    Cached per user until a metric is logged or updated.
+    """
+    filters = [models.BodyMetricLog.user_id == current_user.id]
+    if since:
+        filters.append(models.BodyMetricLog.logged_at >= since)
+
+    version = (
+        db.query(
+            func.count(models.BodyMetricLog.id),
+            func.max(models.BodyMetricLog.logged_at),
+            func.max(models.BodyMetricLog.updated_at),
+        )
+        .filter(*filters)
+        .one()
+    )
+    cache_key = (
+        f"body_metrics_trend:{current_user.id}:{bucket}:{alpha}:{since}:"
+        f"{version[0]}:{version[1]}:{version[2]}"
+    )
+    cached = cache.get_json(cache_key)
+    if cached is not None:
+        return cached
+
+    rows = (
+        db.query(
+            models.BodyMetricLog.logged_at,
+            models.BodyMetricLog.weight_kg,
+            models.BodyMetricLog.body_fat_pct,
+        )
+        .filter(*filters)
+        .order_by(models.BodyMetricLog.logged_at.asc())
+        .all()
+    )
+    logged_at, weight_kg, body_fat_pct = zip(*rows) if rows else ((), (), ())
+    summary = {
+        "bucket": bucket,
+        **trends.summarize_body_metrics(logged_at, weight_kg, body_fat_pct, bucket, alpha),
+    }
+    cache.set_json(cache_key, summary, BODY_METRIC_TREND_TTL_SECONDS)
+    return summary
+
+
+@router.get("/goal-forecast", response_model=schemas.GoalForecastResponse)
+def get_goal_forecast(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Projected date the target weight is reached, with a confidence band, from a
+    robust trend over the last 90 days of weigh-ins, compared to the goal deadline.
+    Served from the nightly forecast cache; computed on demand after a new metric.
+    """
+    cached = cache.get_json(forecast.cache_key(current_user.id))
+    if cached is not None:
+        return cached
+    result = forecast.forecast_for_user(current_user.id, db)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User goals not found")
+    return result
+
+
+# ── Adherence Endpoint ────────────────────────────────────────────────────────
+
+@router.get("/adherence", response_model=List[schemas.AdherenceBucket])
+def get_adherence(
+    period: str = Query(default="week", pattern="^(week|month)$"),
+    since: Optional[date] = Query(default=None, description="Defaults to 12 weeks / 12 months ago"),
+    until: Optional[date] = Query(default=None, description="Defaults to today"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Weekly or monthly completion of the scheduled workout plan, served from the
+    materialized daily_adherence table (one index range scan).
+    """
+    until = until or date.today()
+    if since is None:
+        since = until - timedelta(weeks=12) if period == "week" else (until - timedelta(days=365)).replace(day=1)
+    return adherence.rollup(db, current_user.id, period, since, until)
+
+
 # ── Streak Endpoint ───────────────────────────────────────────────────────────
 
+# Everything UserStreakResponse needs; the activity bitmap stays in the table
+_STREAK_COLUMNS = (
+    models.UserStreak.id,
+    models.UserStreak.user_id,
+    models.UserStreak.current_streak,
+    models.UserStreak.longest_streak,
+    models.UserStreak.last_active_date,
+    models.UserStreak.total_workouts_completed,
+    models.UserStreak.updated_at,
+)
+
+
 @router.get("/streak", response_model=schemas.UserStreakResponse)
 def get_streak(
+    request: Request,
+    response: Response,
     current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """
     Return the current user's streak data.
     Auto-creates a zeroed record if none exists yet.
+    Supports If-None-Match; the ETag covers every returned column.
     """
     streak = (
-        db.query(models.UserStreak)
+        db.query(*_STREAK_COLUMNS)
         .filter(models.UserStreak.user_id == current_user.id)
         .first()
     )
     if not streak:
-        streak = models.UserStreak(
-            user_id=current_user.id,
-            current_streak=0,
-            longest_streak=0,
-            last_active_date=None,
-            total_workouts_completed=0,
+        # The replica may not have the row yet; the insert (and the re-read after
+        # it) runs on the primary, where an existing row wins
+        db.execute(
+            dialect_insert(db, models.UserStreak)
+            .values(
+                user_id=current_user.id,
+                current_streak=0,
+                longest_streak=0,
+                last_active_date=None,
+                total_workouts_completed=0,
+            )
+            .on_conflict_do_nothing(index_elements=["user_id"])
         )
-        db.add(streak)
         db.commit()
-        db.refresh(streak)
+        streak = (
+            db.query(*_STREAK_COLUMNS)
+            .filter(models.UserStreak.user_id == current_user.id)
+            .one()
+        )
+
+    tag = etag.compute("streak", *(getattr(streak, column.key) for column in _STREAK_COLUMNS))
+    unchanged = etag.not_modified(request, tag)
+    if unchanged:
+        return unchanged
+    etag.set_headers(response, tag)
     return streak
+
+
+
+# ── Leaderboard Endpoints ─────────────────────────────────────────────────────
+
+def _leaderboard_for(kind: str, user: models.User) -> str:
+    if kind == "goal":
+        if not user.goals:
+            raise HTTPException(status_code=400, detail="Set your goals to join a goal leaderboard.")
+        return leaderboard.goal_board(user.goals.goal_type)
+    if kind == "cohort":
+        return leaderboard.cohort_board(user.created_at)
+    return leaderboard.GLOBAL_BOARD
+
+
+def _leaderboard_page(kind: str, entries: list, me: Optional[tuple], db: Session):
+    user_ids = [entry_user_id for _, entry_user_id, _ in entries]
+    usernames = dict(
+        db.query(models.User.id, models.User.username).filter(models.User.id.in_(user_ids)).all()
+    ) if user_ids else {}
+    return schemas.LeaderboardResponse(
+        board=kind,
+        entries=[
+            schemas.LeaderboardEntry(
+                rank=position,
+                user_id=entry_user_id,
+                username=usernames.get(entry_user_id, ""),
+                current_streak=score,
+            )
+            for position, entry_user_id, score in entries
+        ],
+        my_rank=me[0] if me else None,
+        my_streak=me[1] if me else None,
+    )
+
+
+@router.get("/leaderboard", response_model=schemas.LeaderboardResponse)
+def get_leaderboard(
+    board: str = Query(default="global", pattern="^(global|goal|cohort)$"),
+    limit: int = Query(default=10, ge=1, le=100),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """
+    Top current streaks on the global board, the user's goal-type board or the
+    user's cohort (signup month) board, plus the caller's own rank.
+    """
+    key = _leaderboard_for(board, current_user)
+    try:
+        entries = leaderboard.top(key, limit)
+        me = leaderboard.rank(key, current_user.id)
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Leaderboards are temporarily unavailable.")
+    return _leaderboard_page(board, entries, me, db)
+
+
+@router.get("/leaderboard/around-me", response_model=schemas.LeaderboardResponse)
+def get_leaderboard_around_me(
+    board: str = Query(default="global", pattern="^(global|goal|cohort)$"),
+    radius: int = Query(default=5, ge=1, le=50),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+):
+    """The places just above and below the caller on the chosen leaderboard."""
+    key = _leaderboard_for(board, current_user)
+    try:
+        entries = leaderboard.around(key, current_user.id, radius)
+        me = leaderboard.rank(key, current_user.id)
+    except RedisError:
+        raise HTTPException(status_code=503, detail="Leaderboards are temporarily unavailable.")
+    return _leaderboard_page(board, entries, me, db)
+
+
+# ── Offline Sync Endpoint ─────────────────────────────────────────────────────
+
+# Upper bound on events per sync request (toggles + metrics)
+MAX_SYNC_EVENTS = 2000
+
+
+def _event_sort_key(occurred_at: datetime) -> datetime:
+    # Clients may send naive timestamps; treat them as UTC so they sort with aware ones
+    if occurred_at.tzinfo is None:
+        return occurred_at.replace(tzinfo=timezone.utc)
+    return occurred_at
+
+
+@router.post("/sync", response_model=schemas.TrackingSyncResponse)
+def sync_tracking(
+    payload: schemas.TrackingSyncRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Apply a batch of offline exercise toggles and body metrics in one transaction.
+    Events are replayed in `occurred_at` order with the same semantics as
+    `PATCH /daily-log/exercise` and `POST /body-metrics`, then written with one
+    bulk upsert per table. The streak is projected once at the end.
+    Returns the resulting logs and metrics for every touched date plus the streak.
+    """
+    if len(payload.exercise_toggles) + len(payload.body_metrics) > MAX_SYNC_EVENTS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A sync batch may contain at most {MAX_SYNC_EVENTS} events.",
+        )
+    for event in payload.exercise_toggles:
+        _validate_log_date(event.log_date)
+    for metric in payload.body_metrics:
+        if metric.weight_kg is None and metric.body_fat_pct is None:
+            raise HTTPException(
+                status_code=422,
+                detail="At least one of weight_kg or body_fat_pct must be provided.",
+            )
+
+    user_id = current_user.id
+    log_dates = sorted({e.log_date for e in payload.exercise_toggles})
+    metric_dates = sorted({m.logged_at for m in payload.body_metrics})
+
+    # ── Daily logs: replay toggles over the stored lists ──────────────────────
+    if log_dates:
+        existing_logs = (
+            db.query(
+                models.DailyLog.log_date,
+                models.DailyLog.completed_exercises,
+                models.DailyLog.workout_plan_id,
+            )
+            .filter(
+                models.DailyLog.user_id == user_id,
+                models.DailyLog.log_date.in_(log_dates),
+            )
+            .with_for_update()
+            .all()
+        )
+        # The bitmap is rewritten whole below: lock it so a concurrent single-day
+        # PATCH (which sets its bit in SQL) waits instead of being overwritten.
+        # Locked after the logs, the same order the PATCH statement uses.
+        streak = _get_or_create_streak(user_id, db, lock=True)
+        completed_by_date = {d: [] for d in log_dates}
+        plan_by_date = {}
+        for row in existing_logs:
+            completed_by_date[row.log_date] = list(row.completed_exercises or [])
+            plan_by_date[row.log_date] = row.workout_plan_id
+
+        for event in sorted(payload.exercise_toggles, key=lambda e: _event_sort_key(e.occurred_at)):
+            completed = completed_by_date[event.log_date]
+            if event.completed:
+                if event.exercise_name not in completed:
+                    completed.append(event.exercise_name)
+            else:
+                completed_by_date[event.log_date] = [
+                    e for e in completed if e != event.exercise_name
+                ]
+
+        latest_plan_id = _latest_workout_plan_id(user_id, db)
+        stmt = dialect_insert(db, models.DailyLog).values([
+            {
+                "user_id": user_id,
+                "log_date": log_date,
+                "completed_exercises": completed,
+                "workout_plan_id": latest_plan_id,
+            }
+            for log_date, completed in completed_by_date.items()
+        ])
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "log_date"],
+                set_={
+                    "completed_exercises": stmt.excluded.completed_exercises,
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        adherence.record_days(
+            db,
+            user_id,
+            [
+                (
+                    log_date,
+                    len(completed),
+                    plan_by_date.get(log_date, latest_plan_id),
+                )
+                for log_date, completed in completed_by_date.items()
+            ],
+        )
+
+        # ── Streak: flip every touched day's bit, then project once ──────────
+        bitmap = streak.activity_bitmap
+        for log_date, completed in completed_by_date.items():
+            bitmap = streaks.set_day(bitmap, log_date, bool(completed))
+        streak.activity_bitmap = bitmap
+        streaks.apply_projection(streak)
+
+    # ── Body metrics: last write per date wins, omitted fields are kept ───────
+    if metric_dates:
+        merged = {}
+        for metric in sorted(payload.body_metrics, key=lambda m: _event_sort_key(m.occurred_at)):
+            entry = merged.setdefault(
+                metric.logged_at,
+                {"user_id": user_id, "logged_at": metric.logged_at, "weight_kg": None, "body_fat_pct": None},
+            )
+            if metric.weight_kg is not None:
+                entry["weight_kg"] = metric.weight_kg
+            if metric.body_fat_pct is not None:
+                entry["body_fat_pct"] = metric.body_fat_pct
+
+        stmt = dialect_insert(db, models.BodyMetricLog).values(list(merged.values()))
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "logged_at"],
+                set_={
+                    "weight_kg": func.coalesce(stmt.excluded.weight_kg, models.BodyMetricLog.weight_kg),
+                    "body_fat_pct": func.coalesce(stmt.excluded.body_fat_pct, models.BodyMetricLog.body_fat_pct),
+                    "updated_at": func.now(),
+                },
+            )
+        )
+
+    if not log_dates:
+        streak = _get_or_create_streak(user_id, db)
+    db.commit()
+    db.refresh(streak)
+    if log_dates:
+        leaderboard.record_streak(user_id, streak.current_streak)
+    if metric_dates:
+        forecast.invalidate(user_id)
+
+    daily_logs = []
+    if log_dates:
+        daily_logs = (
+            db.query(models.DailyLog)
+            .filter(
+                models.DailyLog.user_id == user_id,
+                models.DailyLog.log_date.in_(log_dates),
+            )
+            .order_by(models.DailyLog.log_date.asc())
+            .all()
+        )
+    body_metrics = []
+    if metric_dates:
+        body_metrics = (
+            db.query(models.BodyMetricLog)
+            .filter(
+                models.BodyMetricLog.user_id == user_id,
+                models.BodyMetricLog.logged_at.in_(metric_dates),
+            )
+            .order_by(models.BodyMetricLog.logged_at.asc())
+            .all()
+        )
+
+    return schemas.TrackingSyncResponse(
+        daily_logs=[_daily_log_to_response(log) for log in daily_logs],
+        body_metrics=body_metrics,
+        streak=streak,
+    )
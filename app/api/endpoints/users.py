@@ -1,16 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from datetime import timedelta
+from datetime import date, timedelta
+from typing import Optional
 
 from ...core.config import settings
 from ...core.database import get_db
 from ...models import models, schemas
+from ...utils import export, forecast, leaderboard
 from ..dependencies import (
     authenticate_user,
     create_access_token,
     get_current_user,
-    get_password_hash
+    get_password_hash,
+    read_session
 )
 
 router = APIRouter()
@@ -30,6 +34,7 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    leaderboard.assign_boards(db_user.id, None, db_user.created_at)
     return db_user
 
 @router.post("/token", response_model=schemas.Token)
@@ -81,6 +86,8 @@ def create_user_goals(
         db.add(db_goals)
     db.commit()
     db.refresh(db_goals)
+    leaderboard.assign_boards(current_user.id, db_goals.goal_type, current_user.created_at)
+    forecast.invalidate(current_user.id)
     return db_goals
 
 
@@ -112,4 +119,48 @@ def update_user_goals(
         setattr(db_goals, key, value)
     db.commit()
     db.refresh(db_goals)
-    return db_goals
\ No newline at end of file
+    leaderboard.assign_boards(current_user.id, db_goals.goal_type, current_user.created_at)
+    forecast.invalidate(current_user.id)
+    return db_goals
+
+
+def _export_body(user_id: int, sections: list, fmt: str, gzip: bool):
+    # The stream outlives the request's own session, so it reads through its own
+    db = read_session(user_id)
+    try:
+        yield from export.stream_export(db, user_id, sections, fmt, gzip)
+    finally:
+        db.close()
+
+
+@router.get("/export")
+def export_user_data(
+    request: Request,
+    format: str = Query(default="ndjson", pattern="^(csv|ndjson)$"),
+    sections: Optional[str] = Query(
+        default=None,
+        description="Comma-separated subset of: " + ", ".join(export.SECTIONS),
+    ),
+    current_user: models.User = Depends(get_current_user),
+):
+    """
+    Stream the user's daily logs, body metrics, chat history, feedback and plan
+    versions as CSV (one `record_type` column plus the union of all columns) or
+    NDJSON. Rows are read with server-side cursors, and the body is gzip-compressed
+    on the fly when the client accepts it.
+    """
+    selected = [s.strip() for s in sections.split(",") if s.strip()] if sections else list(export.SECTIONS)
+    unknown = [s for s in selected if s not in export.SECTIONS]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown export sections: {', '.join(unknown)}")
+
+    gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    filename = f"fitness-export-{current_user.username}-{date.today().isoformat()}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Vary": "Accept-Encoding"}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        _export_body(current_user.id, selected, format, gzip),
+        media_type=export.FORMATS[format],
+        headers=headers,
+    )
@@ -1,19 +1,58 @@
+import random
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 from .config import settings
+from .pool_metrics import InstrumentedQueuePool, instrument
 
-if settings.DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        settings.DATABASE_URL,
-        connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(
-        settings.DATABASE_URL,
+def pool_options(profile: str) -> dict:
+    """create_engine pool arguments for a DB_POOL_PROFILE ('web' or 'worker')."""
+    if profile == "worker":
+        size, overflow = settings.WORKER_DB_POOL_SIZE, settings.WORKER_DB_MAX_OVERFLOW
+    else:
+        size, overflow = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    return {
+        "pool_size": size,
+        "max_overflow": overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_use_lifo": settings.DB_POOL_USE_LIFO,
+    }
+
+def _create_engine(url: str, name: str) -> Engine:
+    if url.startswith("sqlite"):
+        # SQLite keeps its default pool and isn't reported on /metrics
+        return create_engine(url, connect_args={"check_same_thread": False})
+    db_engine = create_engine(
+        url,
         pool_pre_ping=True,
-        pool_recycle=300
+        poolclass=InstrumentedQueuePool,
+        **pool_options(settings.DB_POOL_PROFILE),
     )
+    instrument(db_engine, name)
+    return db_engine
+
+engine = _create_engine(settings.DATABASE_URL, "primary")
+
+# Read replicas for GET endpoints; empty unless DATABASE_REPLICA_URLS is set
+replica_engines = [
+    _create_engine(url, f"replica_{index}")
+    for index, url in enumerate(url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip())
+]
+
+def dispose_engines(close: bool = True) -> None:
+    """
+    Reset the primary and replica pools; connections are reopened on demand.
+    In a forked child pass close=False: the inherited connections still belong
+    to the parent, so they are dropped without closing the parent's sockets.
+    """
+    for db_engine in (engine, *replica_engines):
+        db_engine.dispose(close=close)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -21,6 +60,38 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+
+class RoutingSession(Session):
+    """
+    Session that runs its queries on `replica` (a read-replica engine, or None for
+    the primary). The first write (a flush or an INSERT/UPDATE/DELETE statement)
+    moves it to the primary for good, so anything read after that sees the write.
+    """
+
+    def __init__(self, *args, replica: Optional[Engine] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replica = replica
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.replica = None
+        if self.replica is not None:
+            return self.replica
+        return super().get_bind(mapper=mapper, clause=clause, **kwargs)
+
+
+ReadSessionLocal = sessionmaker(
+    class_=RoutingSession,
+    autocommit=False,
+    autoflush=False,
+    bind=engine
+)
+
+
+def pick_replica() -> Optional[Engine]:
+    """A random read replica, or None when none are configured."""
+    return random.choice(replica_engines) if replica_engines else None
+
 Base = declarative_base()
 
 def get_db():
@@ -28,4 +99,11 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def dialect_insert(db, model):
+    """INSERT construct for the session's dialect, so callers can use on_conflict_do_update."""
+    # Writes go to the primary (`bind`), even from a RoutingSession currently on a replica
+    if (db.bind or db.get_bind()).dialect.name == "postgresql":
+        return postgresql_insert(model)
+    return sqlite_insert(model)
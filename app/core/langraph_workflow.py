@@ -295,6 +295,18 @@ class FitnessWorkflowManager:
         result = handle_chat_query(state)
         return result["chat_response"] or ""
 
+    def answer_general_question(self, query: str) -> str:
+        """Answer a general fitness question without any user context, so it can be shared."""
+        prompt = f"""
+    You are a knowledgeable fitness and nutrition coach.
+    Answer the following general question accurately and concisely for a general audience.
+    Don't assume anything about the person asking (age, weight, goals or plans).
+
+    Question: {query}
+    """
+        response = llm.invoke(prompt)
+        return str(getattr(response, "content", response))
+
     def adapt_workout_plan(
         self,
         user_data: Dict[str, Any],
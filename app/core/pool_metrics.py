@@ -0,0 +1,130 @@
+"""
+Database connection pool metrics.
+
+Server database engines are built with InstrumentedQueuePool, which times
+every checkout (waiting for a free connection, opening a new one, and the
+pre-ping) and counts checkouts that hit pool_timeout. SQLite engines keep
+SQLAlchemy's default pool and are not reported. Pool events count new and invalidated
+connections. Gauges (size, in use, idle, overflow) are read from the live pool
+when rendered. `render` produces the Prometheus text format served on
+GET /metrics.
+
+Counters are per process: scrape every API process, not a shared port.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.wait_sum = 0.0
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)  # last slot: above every bucket
+
+    def record_checkout(self, seconds: float) -> None:
+        with self.lock:
+            self.checkouts += 1
+            self.wait_sum += seconds
+            self.wait_counts[bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def increment(self, counter: str) -> None:
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records checkout wait times and timeouts in `stats`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.increment("timeouts")
+            raise
+        self.stats.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+# Pool label -> engine
+_engines: Dict[str, Engine] = {}
+
+
+def instrument(db_engine: Engine, name: str) -> None:
+    """Report `db_engine`'s pool under the label `name`; its pool must be an InstrumentedQueuePool."""
+    _engines[name] = db_engine
+
+    @event.listens_for(db_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        db_engine.pool.stats.increment("connects")
+
+    @event.listens_for(db_engine, "invalidate")
+    def _on_invalidate(dbapi_connection, connection_record, exception):
+        db_engine.pool.stats.increment("invalidations")
+
+
+_GAUGES = (
+    ("db_pool_size", "Configured number of persistent connections", lambda pool: pool.size()),
+    ("db_pool_checked_out", "Connections currently in use", lambda pool: pool.checkedout()),
+    ("db_pool_checked_in", "Idle connections held by the pool", lambda pool: pool.checkedin()),
+    ("db_pool_overflow", "Connections open beyond pool_size", lambda pool: max(pool.overflow(), 0)),
+)
+
+_COUNTERS = (
+    ("db_pool_checkouts_total", "Connections checked out", "checkouts"),
+    ("db_pool_timeouts_total", "Checkouts that gave up after pool_timeout", "timeouts"),
+    ("db_pool_connects_total", "New DBAPI connections opened", "connects"),
+    ("db_pool_invalidations_total", "Connections invalidated (e.g. failed pre-ping)", "invalidations"),
+)
+
+
+def render() -> str:
+    """All instrumented pools in the Prometheus text exposition format."""
+    pools = [(name, db_engine.pool) for name, db_engine in _engines.items()]
+    lines: List[str] = []
+    for metric, help_text, read in _GAUGES:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        lines += [f'{metric}{{pool="{name}"}} {read(pool)}' for name, pool in pools]
+    for metric, help_text, attribute in _COUNTERS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        lines += [f'{metric}{{pool="{name}"}} {getattr(pool.stats, attribute)}' for name, pool in pools]
+
+    metric = "db_pool_checkout_wait_seconds"
+    lines += [
+        f"# HELP {metric} Time to check out a connection, including waiting for a free one",
+        f"# TYPE {metric} histogram",
+    ]
+    for name, pool in pools:
+        with pool.stats.lock:
+            counts = list(pool.stats.wait_counts)
+            wait_sum = pool.stats.wait_sum
+        cumulative = 0
+        for bound, count in zip((*WAIT_BUCKETS, "+Inf"), counts):
+            cumulative += count
+            lines.append(f'{metric}_bucket{{pool="{name}",le="{bound}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{pool="{name}"}} {wait_sum:.6f}')
+        lines.append(f'{metric}_count{{pool="{name}"}} {cumulative}')
+    return "\n".join(lines) + "\n"
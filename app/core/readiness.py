@@ -0,0 +1,160 @@
+"""
+Startup pre-warming and readiness probes.
+
+`prewarm` runs in the app's lifespan, before the first request: it opens
+connections in the database pools, pings Redis, loads the Lua scripts and
+connects the Celery producer pool, so the first requests don't pay for
+connection setup. Failures are logged, not raised; /ready reports them.
+
+`check` backs GET /ready. Each dependency (primary and replica databases,
+Redis, the write-behind Redis if separate, the Celery broker) is probed on a small thread pool. A result is
+cached for PROBE_CACHE_SECONDS, and a probe still running after
+PROBE_TIMEOUT_SECONDS counts as failed. A hanging dependency never holds a
+request for longer than that, and probes don't pile up: a slow probe that is
+still in flight is waited on again rather than started twice.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .database import engine, replica_engines
+
+logger = logging.getLogger(__name__)
+
+# Connections opened per database pool at startup (capped at the pool size)
+PREWARM_CONNECTIONS = 5
+PROBE_TIMEOUT_SECONDS = 1.0
+PROBE_CACHE_SECONDS = 2.0
+
+
+def _warm_pool(db_engine: Engine) -> None:
+    size = getattr(db_engine.pool, "size", lambda: 1)()
+    connections = []
+    try:
+        for _ in range(min(PREWARM_CONNECTIONS, size)):
+            connection = db_engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        # Back to the pool, still open
+        for connection in connections:
+            connection.close()
+
+
+def _warm_redis() -> None:
+    from ..utils import leaderboard, quota
+    from ..utils.rate_limit import redis_client
+
+    if redis_client is None:
+        return
+    redis_client.ping()
+    for script in (quota._acquire, quota._refund, quota._release_slot, leaderboard._record, leaderboard._assign):
+        if script is not None:
+            redis_client.script_load(script.script)
+
+
+def _warm_broker() -> None:
+    from ..worker import celery_app
+
+    with celery_app.producer_or_acquire() as producer:
+        producer.connection.ensure_connection(max_retries=0)
+
+
+def prewarm() -> None:
+    started = time.perf_counter()
+    steps = [("database", lambda: _warm_pool(engine))]
+    steps += [
+        (f"database replica {index}", lambda e=db_engine: _warm_pool(e))
+        for index, db_engine in enumerate(replica_engines)
+    ]
+    steps += [("redis", _warm_redis), ("broker", _warm_broker)]
+    if settings.WRITE_BEHIND_REDIS_URL:
+        steps.append(("write-behind redis", _probe_write_behind_redis))
+    for name, step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Pre-warming {name} failed: {e}")
+    logger.info(f"Pre-warmed connections in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def _probe_database(db_engine: Engine) -> None:
+    with db_engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def _probe_redis() -> None:
+    from ..utils.rate_limit import redis_client
+
+    if redis_client is None:
+        raise RuntimeError("Redis client not configured")
+    redis_client.ping()
+
+
+def _probe_write_behind_redis() -> None:
+    from ..utils.write_behind import stream_client
+
+    if stream_client is None:
+        raise RuntimeError("Write-behind Redis client not configured")
+    stream_client.ping()
+
+
+def _probe_broker() -> None:
+    from ..worker import celery_app
+
+    with celery_app.connection_for_write(connect_timeout=PROBE_TIMEOUT_SECONDS) as connection:
+        connection.ensure_connection(max_retries=0)
+
+
+def _probes() -> Dict[str, Callable[[], None]]:
+    probes = {"database": lambda: _probe_database(engine)}
+    for index, db_engine in enumerate(replica_engines):
+        probes[f"database_replica_{index}"] = lambda e=db_engine: _probe_database(e)
+    probes["redis"] = _probe_redis
+    if settings.WRITE_BEHIND_REDIS_URL:
+        probes["redis_write_behind"] = _probe_write_behind_redis
+    probes["broker"] = _probe_broker
+    return probes
+
+
+PROBES = _probes()
+_executor = ThreadPoolExecutor(max_workers=len(PROBES), thread_name_prefix="ready-probe")
+_lock = threading.Lock()
+# name -> (checked at, error message or "ok")
+_results: Dict[str, Tuple[float, str]] = {}
+_in_flight: Dict[str, Future] = {}
+
+
+def _run(name: str, probe: Callable[[], None]) -> None:
+    try:
+        probe()
+        outcome = "ok"
+    except Exception as e:
+        outcome = f"error: {e}"
+    with _lock:
+        _results[name] = (time.monotonic(), outcome)
+        _in_flight.pop(name, None)
+
+
+def check() -> Dict[str, str]:
+    """Outcome of each probe: "ok", "error: ..." or "timeout"."""
+    now = time.monotonic()
+    with _lock:
+        for name, probe in PROBES.items():
+            cached = _results.get(name)
+            stale = cached is None or now - cached[0] > PROBE_CACHE_SECONDS
+            if stale and name not in _in_flight:
+                _in_flight[name] = _executor.submit(_run, name, probe)
+        pending = list(_in_flight.values())
+    wait(pending, timeout=PROBE_TIMEOUT_SECONDS)
+    with _lock:
+        return {
+            name: "timeout" if name in _in_flight else _results[name][1]
+            for name in PROBES
+        }
@@ -1,18 +1,33 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
 
+from .core import pool_metrics, readiness
 from .core.config import settings
-from .core.database import engine
-from .models import models
+from .core.database import dispose_engines, replica_engines
+from .core.responses import FastJSONResponse
+from .models import schemas
 from .api.endpoints import users, fitness, chat, tracking, feedback
+from .utils import read_your_writes
+from .utils.pagination import NEXT_CURSOR_HEADER
+
+# The schema is managed by Alembic (`alembic upgrade head`), not created at startup
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(readiness.prewarm)
+    yield
+    dispose_engines()
 
 app = FastAPI(
     title=settings.APP_NAME,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
 # Configure CORS
@@ -22,8 +37,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+@app.middleware("http")
+async def pin_writers_to_primary(request: Request, call_next):
+    """After a user's successful write, read their data from the primary for a while."""
+    response = await call_next(request)
+    user_id = getattr(request.state, "user_id", None)
+    if (
+        replica_engines
+        and user_id is not None
+        and request.method not in SAFE_METHODS
+        and response.status_code < 400
+    ):
+        await run_in_threadpool(read_your_writes.pin, user_id)
+    return response
+
 # Include routers
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(fitness.router, prefix="/api/fitness", tags=["fitness"])
@@ -31,10 +63,24 @@ app.include_router(chat.router, prefix="/api/chat", tags=["chat"])
 app.include_router(tracking.router, prefix="/api/tracking", tags=["tracking"])
 app.include_router(feedback.router, prefix="/api/feedback", tags=["feedback"])
 
-@app.get("/")
+@app.get("/", response_model=schemas.MessageResponse)
 def read_root():
     return {"message": "Fitness AI Backend is running!"}
 
-@app.get("/health")
+@app.get("/health", response_model=schemas.HealthResponse)
 def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    """Liveness: the process is up and serving. Dependencies are checked by /ready."""
+    return {"status": "healthy"}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Connection pool metrics of this process, in the Prometheus text format."""
+    return PlainTextResponse(pool_metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready", response_model=schemas.ReadinessResponse, responses={503: {"model": schemas.ReadinessResponse}})
+def readiness_check():
+    """Readiness: database pool(s), Redis and the Celery broker answer (cached, time-bounded probes)."""
+    checks = readiness.check()
+    if all(outcome == "ok" for outcome in checks.values()):
+        return {"status": "ready", "checks": checks}
+    return FastJSONResponse(status_code=503, content={"status": "not_ready", "checks": checks})
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey
+from sqlalchemy import BigInteger, Column, Integer, String, Float, Boolean, DateTime, Date, Text, JSON, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -33,10 +33,29 @@ class User(Base):
     hashed_password = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Latest plan versions (see app/utils/current_plans.py)
+    current_nutrition_plan_id = Column(
+        Integer,
+        ForeignKey("nutrition_plans.id", ondelete="SET NULL", use_alter=True,
+                   name="fk_users_current_nutrition_plan_id"),
+        nullable=True,
+    )
+    current_workout_plan_id = Column(
+        Integer,
+        ForeignKey("workout_plans.id", ondelete="SET NULL", use_alter=True,
+                   name="fk_users_current_workout_plan_id"),
+        nullable=True,
+    )
     profile = relationship("UserProfile", back_populates="user", uselist=False, cascade="all, delete-orphan")
     goals = relationship("UserGoals", back_populates="user", uselist=False, cascade="all, delete-orphan")
-    nutrition_plans = relationship("NutritionPlan", back_populates="user", cascade="all, delete-orphan")
-    workout_plans = relationship("WorkoutPlan", back_populates="user", cascade="all, delete-orphan")
+    nutrition_plans = relationship(
+        "NutritionPlan", back_populates="user", cascade="all, delete-orphan",
+        foreign_keys="NutritionPlan.user_id",
+    )
+    workout_plans = relationship(
+        "WorkoutPlan", back_populates="user", cascade="all, delete-orphan",
+        foreign_keys="WorkoutPlan.user_id",
+    )
     daily_logs = relationship("DailyLog", back_populates="user", cascade="all, delete-orphan")
     body_metric_logs = relationship("BodyMetricLog", back_populates="user", cascade="all, delete-orphan")
     streak = relationship("UserStreak", back_populates="user", uselist=False, cascade="all, delete-orphan")
@@ -70,34 +89,78 @@ class UserGoals(Base):
 
 class NutritionPlan(Base):
     __tablename__ = "nutrition_plans"
-    
+    __table_args__ = (
+        # "Latest plan for user" lookups
+        Index("ix_nutrition_plans_user_created", "user_id", "created_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    user = relationship("User", back_populates="nutrition_plans")
-    plan_data = Column(JSON)  
+    user = relationship("User", back_populates="nutrition_plans", foreign_keys=[user_id])
+    plan_data = Column(JSON(none_as_null=True))  # SQL NULL when stored as a delta
+    # Older versions are stored as a delta against a newer version (see app/utils/plan_deltas.py)
+    base_plan_id = Column(Integer, nullable=True)
+    plan_delta = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class WorkoutPlan(Base):
     __tablename__ = "workout_plans"
-    
+    __table_args__ = (
+        # "Latest plan for user" lookups
+        Index("ix_workout_plans_user_created", "user_id", "created_at"),
+    )
+
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    user = relationship("User", back_populates="workout_plans")
-    plan_data = Column(JSON)
+    user = relationship("User", back_populates="workout_plans", foreign_keys=[user_id])
+    plan_data = Column(JSON(none_as_null=True))  # SQL NULL when stored as a delta
+    # Older versions are stored as a delta against a newer version (see app/utils/plan_deltas.py)
+    base_plan_id = Column(Integer, nullable=True)
+    plan_delta = Column(JSON, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class ChatHistory(Base):
+    # On Postgres the table is range-partitioned by month on created_at, with the
+    # primary key (id, created_at); old months are archived (see app/utils/chat_archive.py)
     __tablename__ = "chat_history"
+    __table_args__ = (
+        # Keyset pagination and "latest N turns" lookups
+        Index("ix_chat_history_user_created_id", "user_id", "created_at", "id"),
+        # Idempotency key for write-behind inserts (see app/utils/write_behind.py);
+        # includes the partition key, as unique indexes on partitioned tables must
+        Index("uq_chat_history_write_id", "write_id", "created_at", unique=True),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, index=True)
     message = Column(Text)
     response = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    write_id = Column(String(32), nullable=True)
+
+
+class ChatArchiveSegment(Base):
+    """One user's turns from one archived chat_history month (see app/utils/chat_archive.py)."""
+    __tablename__ = "chat_archive_segments"
+    __table_args__ = (
+        # Archived pages of one user's history, newest month first
+        Index("uq_chat_archive_segments_user_month", "user_id", "month", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    month = Column(Date, nullable=False, index=True)  # first day of the archived month
+    byte_offset = Column(BigInteger, nullable=False)  # zstd frame position in the month's archive file
+    byte_length = Column(Integer, nullable=False)
+    row_count = Column(Integer, nullable=False)
 
 class GenerationTask(Base):
     __tablename__ = "generation_tasks"
-    
+    __table_args__ = (
+        # In-flight task check per user and plan type
+        Index("ix_generation_tasks_user_type_status", "user_id", "task_type", "status"),
+    )
+
     id = Column(String, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     task_type = Column(String)  # 'nutrition' or 'workout'
@@ -110,6 +173,10 @@ class GenerationTask(Base):
 
 class DailyLog(Base):
     __tablename__ = "daily_logs"
+    __table_args__ = (
+        # One log per user per date; also the conflict target for check-off upserts
+        Index("uq_daily_logs_user_date", "user_id", "log_date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -121,8 +188,28 @@ class DailyLog(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
 
+class DailyAdherence(Base):
+    """Materialized per-day plan adherence (see app/utils/adherence.py)."""
+    __tablename__ = "daily_adherence"
+    __table_args__ = (
+        # Rollups are a range scan on this index; also the upsert conflict target
+        Index("uq_daily_adherence_user_date", "user_id", "log_date", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    log_date = Column(Date, nullable=False)
+    scheduled_count = Column(Integer, default=0, nullable=False)  # exercises in the plan for that weekday
+    completed_count = Column(Integer, default=0, nullable=False)
+    plan_id = Column(Integer, ForeignKey("workout_plans.id", ondelete="SET NULL"), nullable=True)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+
 class BodyMetricLog(Base):
     __tablename__ = "body_metric_logs"
+    __table_args__ = (
+        Index("uq_body_metric_logs_user_date", "user_id", "logged_at", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -144,6 +231,8 @@ class UserStreak(Base):
     longest_streak = Column(Integer, default=0, nullable=False)
     last_active_date = Column(Date, nullable=True)
     total_workouts_completed = Column(Integer, default=0, nullable=False)
+    # Bitset of active days (see app/utils/streaks.py); the columns above are its projection
+    activity_bitmap = Column(LargeBinary, nullable=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
 
@@ -153,6 +242,9 @@ class PlanFeedback(Base):
     so the AI compounds the user's evolving preferences.
     """
     __tablename__ = "plan_feedbacks"
+    __table_args__ = (
+        Index("ix_plan_feedbacks_user_created_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
@@ -103,6 +103,20 @@ class WorkoutPlanResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class UserPlansResponse(BaseModel):
+    nutrition_plan: Optional[NutritionPlanResponse] = None
+    workout_plan: Optional[WorkoutPlanResponse] = None
+
+class PlanVersionItem(BaseModel):
+    id: int
+    plan_type: str  # 'workout' | 'nutrition'
+    created_at: datetime
+    is_current: bool
+
+class TaskAcceptedResponse(BaseModel):
+    task_id: str
+    status: str
+
 # Chat Schemas
 class ChatMessage(BaseModel):
     message: str
@@ -111,6 +125,31 @@ class ChatResponse(BaseModel):
     response: str
     created_at: datetime
 
+class ChatHistoryItem(BaseModel):
+    message: Optional[str] = None
+    response: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class FaqCacheStatsResponse(BaseModel):
+    hit: int
+    miss: int
+    personal: int  # messages about the user's own data, never cached
+    hit_rate: Optional[float] = None
+
+# Service Schemas
+class MessageResponse(BaseModel):
+    message: str
+
+class HealthResponse(BaseModel):
+    status: str
+
+class ReadinessResponse(BaseModel):
+    status: str  # 'ready' or 'not_ready'
+    checks: Dict[str, str]  # dependency -> 'ok', 'timeout' or 'error: ...'
+
 # Token Schemas
 class Token(BaseModel):
     access_token: str
@@ -141,18 +180,22 @@ class DailyLogCreate(BaseModel):
     completed_exercises: List[str] = []
 
 class DailyLogResponse(BaseModel):
-    id: int
+    id: Optional[int] = None  # null for a day with no saved log yet
     user_id: int
     log_date: date
     completed_exercises: List[str]
     workout_plan_id: Optional[int] = None
     total_exercises_completed: int = 0
-    created_at: datetime
-    updated_at: datetime
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
 
+class DailyLogCalendarResponse(BaseModel):
+    month: str  # YYYY-MM
+    days: Dict[int, List[int]]  # day of month -> [completed_count, scheduled_count]
+
 class ExerciseCheckOffRequest(BaseModel):
     exercise_name: str
     completed: bool  # True = mark done, False = unmark
@@ -174,6 +217,40 @@ class BodyMetricResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BodyMetricBucket(BaseModel):
+    period_start: date
+    entries: int
+    avg_weight_kg: Optional[float] = None
+    avg_body_fat_pct: Optional[float] = None
+    ema_weight_kg: Optional[float] = None  # weight EMA as of the bucket's last weigh-in
+
+class BodyMetricTrendResponse(BaseModel):
+    bucket: str  # 'week' | 'month'
+    buckets: List[BodyMetricBucket]
+    latest_ema_weight_kg: Optional[float] = None
+    slope_kg_per_week: Optional[float] = None  # least-squares weight trend
+
+class GoalForecastResponse(BaseModel):
+    status: str  # 'insufficient_data' | 'reached' | 'on_track' | 'behind' | 'off_track'
+    target_weight: Optional[float] = None
+    deadline: Optional[date] = None  # goal created_at + target_days
+    weigh_ins: int
+    current_weight_kg: Optional[float] = None  # trend line value today
+    slope_kg_per_week: Optional[float] = None  # Theil–Sen weight trend
+    required_kg_per_week: Optional[float] = None  # pace needed to hit the deadline
+    projected_date: Optional[date] = None
+    projected_date_earliest: Optional[date] = None
+    projected_date_latest: Optional[date] = None
+    computed_on: date
+
+class AdherenceBucket(BaseModel):
+    period_start: date
+    days_tracked: int
+    active_days: int  # days with at least one exercise checked off
+    scheduled_count: int
+    completed_count: int
+    adherence_pct: Optional[float] = None  # completed (capped per day at scheduled) / scheduled
+
 class UserStreakResponse(BaseModel):
     id: int
     user_id: int
@@ -186,6 +263,36 @@ class UserStreakResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ExerciseToggleEvent(BaseModel):
+    log_date: date
+    exercise_name: str
+    completed: bool
+    occurred_at: datetime  # client clock; events are replayed in this order
+
+class BodyMetricEvent(BodyMetricCreate):
+    occurred_at: datetime
+
+class TrackingSyncRequest(BaseModel):
+    exercise_toggles: List[ExerciseToggleEvent] = []
+    body_metrics: List[BodyMetricEvent] = []
+
+class TrackingSyncResponse(BaseModel):
+    daily_logs: List[DailyLogResponse]
+    body_metrics: List[BodyMetricResponse]
+    streak: UserStreakResponse
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    username: str
+    current_streak: int
+
+class LeaderboardResponse(BaseModel):
+    board: str  # 'global' | 'goal' | 'cohort'
+    entries: List[LeaderboardEntry]
+    my_rank: Optional[int] = None
+    my_streak: Optional[int] = None
+
 
 # ── Feedback Loop Schemas ─────────────────────────────────────────────────────
 
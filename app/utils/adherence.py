@@ -0,0 +1,291 @@
+"""
+Materialized daily plan adherence.
+
+`daily_adherence` keeps one row per user per day with the number of exercises
+the workout plan scheduled for that weekday and the number the user checked
+off. Check-offs upsert their day's row in the same transaction as the daily
+log, and a nightly job opens a row for every user with a plan so days without
+any check-off count as missed. Weekly/monthly rollups are then a range scan on
+(user_id, log_date) instead of comparing every DailyLog against plan JSON.
+
+Backfill the table from daily_logs and workout_plans with:
+    python -m app.utils.adherence
+"""
+import logging
+import re
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..core.database import dialect_insert
+from ..models import models
+from . import plan_deltas
+
+logger = logging.getLogger(__name__)
+
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+_REST_DAY = re.compile(r"^\s*(rest|off|recovery|active recovery)\b", re.IGNORECASE)
+_EXERCISE_SEPARATORS = re.compile(r"[,;\n]+")
+
+
+def _count_exercises(entry) -> int:
+    if isinstance(entry, list):
+        return sum(1 for item in entry if item)
+    if isinstance(entry, dict):
+        return _count_exercises(entry.get("exercises", []))
+    if not isinstance(entry, str) or not entry.strip() or _REST_DAY.match(entry):
+        return 0
+    return sum(1 for part in _EXERCISE_SEPARATORS.split(entry) if part.strip())
+
+
+def weekly_counts(plan_data: Optional[dict]) -> List[int]:
+    """Scheduled exercise count for each weekday (Monday first) of a workout plan."""
+    schedule = (plan_data or {}).get("weekly_schedule") or {}
+    if not isinstance(schedule, dict):
+        return [0] * 7
+    schedule = {str(day).lower(): entry for day, entry in schedule.items()}
+    return [_count_exercises(schedule.get(day)) for day in WEEKDAYS]
+
+
+def _plan_counts(db: Session, plan_ids: Iterable[int]) -> Dict[int, List[int]]:
+    plan_ids = {plan_id for plan_id in plan_ids if plan_id is not None}
+    if not plan_ids:
+        return {}
+    plans = plan_deltas.load(db, models.WorkoutPlan, plan_ids)
+    return {plan_id: weekly_counts(plan_data) for plan_id, plan_data in plans.items()}
+
+
+def _upsert(db: Session, rows: List[dict], overwrite: bool = True) -> None:
+    if not rows:
+        return
+    stmt = dialect_insert(db, models.DailyAdherence).values(rows)
+    if overwrite:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "log_date"],
+            set_={
+                "scheduled_count": stmt.excluded.scheduled_count,
+                "completed_count": stmt.excluded.completed_count,
+                "plan_id": stmt.excluded.plan_id,
+                "updated_at": func.now(),
+            },
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "log_date"])
+    db.execute(stmt)
+
+
+def record_days(db: Session, user_id: int, days: Iterable[Tuple[date, int, Optional[int]]]) -> None:
+    """
+    Upsert adherence rows for (log_date, completed_count, plan_id) triples taken
+    from the user's daily logs. Doesn't commit; callers write it in the same
+    transaction as the logs.
+    """
+    days = list(days)
+    counts = _plan_counts(db, (plan_id for _, _, plan_id in days))
+    _upsert(
+        db,
+        [
+            {
+                "user_id": user_id,
+                "log_date": log_date,
+                "scheduled_count": counts[plan_id][log_date.weekday()] if plan_id in counts else 0,
+                "completed_count": completed,
+                "plan_id": plan_id,
+            }
+            for log_date, completed, plan_id in days
+        ],
+    )
+
+
+def record_log(db: Session, log) -> None:
+    """record_days for a single DailyLog (ORM object or returned row)."""
+    record_days(
+        db, log.user_id, [(log.log_date, len(log.completed_exercises or []), log.workout_plan_id)]
+    )
+
+
+def backfill(
+    db: Session,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    overwrite: bool = True,
+    batch_size: int = 500,
+) -> int:
+    """
+    Materialize adherence for every user with a workout plan or daily log, for
+    each day from their first plan (or `start`) to `end` (default today). Days with a daily log
+    use its plan and completed count; other days use the latest plan created on
+    or before that day, with nothing completed.
+
+    With overwrite=False existing rows are left alone. Its cost grows with all
+    the plan history stored, so it is for the CLI; the nightly job uses
+    `open_day`. Returns rows written.
+    """
+    end = end or date.today()
+    logged = db.query(models.DailyLog.user_id).distinct()
+    if start:
+        logged = logged.filter(models.DailyLog.log_date >= start)
+    user_ids = sorted(
+        {user_id for (user_id,) in db.query(models.WorkoutPlan.user_id).distinct()}
+        | {user_id for (user_id,) in logged}
+    )
+
+    written = 0
+    for offset in range(0, len(user_ids), batch_size):
+        batch = user_ids[offset:offset + batch_size]
+        plans = (
+            db.query(models.WorkoutPlan.id, models.WorkoutPlan.user_id, models.WorkoutPlan.created_at)
+            .filter(models.WorkoutPlan.user_id.in_(batch))
+            .order_by(models.WorkoutPlan.user_id, models.WorkoutPlan.created_at)
+            .all()
+        )
+        log_query = db.query(
+            models.DailyLog.user_id,
+            models.DailyLog.log_date,
+            models.DailyLog.completed_exercises,
+            models.DailyLog.workout_plan_id,
+        ).filter(models.DailyLog.user_id.in_(batch), models.DailyLog.log_date <= end)
+        if start:
+            log_query = log_query.filter(models.DailyLog.log_date >= start)
+        logs = {(log.user_id, log.log_date): log for log in log_query}
+        counts = _plan_counts(
+            db, [plan.id for plan in plans] + [log.workout_plan_id for log in logs.values()]
+        )
+
+        rows = []
+        for user_id, user_plans in groupby(plans, key=lambda plan: plan.user_id):
+            user_plans = list(user_plans)
+            day = max(start or user_plans[0].created_at.date(), user_plans[0].created_at.date())
+            current = 0
+            while day <= end:
+                # Latest plan created on or before `day`
+                while current + 1 < len(user_plans) and user_plans[current + 1].created_at.date() <= day:
+                    current += 1
+                log = logs.get((user_id, day))
+                plan_id = log.workout_plan_id if log else user_plans[current].id
+                rows.append({
+                    "user_id": user_id,
+                    "log_date": day,
+                    "scheduled_count": counts[plan_id][day.weekday()] if plan_id in counts else 0,
+                    "completed_count": len(log.completed_exercises or []) if log else 0,
+                    "plan_id": plan_id,
+                })
+                day += timedelta(days=1)
+
+        # Logs from before the user's first plan (or without any plan) still count as completed work
+        first_plan_day = {}
+        for plan in plans:
+            first_plan_day.setdefault(plan.user_id, plan.created_at.date())
+        for (user_id, log_date), log in logs.items():
+            if user_id not in first_plan_day or log_date < first_plan_day[user_id]:
+                rows.append({
+                    "user_id": user_id,
+                    "log_date": log_date,
+                    "scheduled_count": counts[log.workout_plan_id][log_date.weekday()]
+                    if log.workout_plan_id in counts else 0,
+                    "completed_count": len(log.completed_exercises or []),
+                    "plan_id": log.workout_plan_id,
+                })
+
+        for chunk in range(0, len(rows), 1000):
+            _upsert(db, rows[chunk:chunk + 1000], overwrite)
+        db.commit()
+        written += len(rows)
+    return written
+
+
+def open_day(db: Session, day: date, batch_size: int = 1000) -> int:
+    """
+    Open `day`'s adherence row for every user with a current workout plan, with
+    nothing completed yet. Rows that check-offs already wrote are left alone.
+    Reads only the current plans, in batches of users. Returns the number of
+    users processed.
+    """
+    opened = 0
+    last_id = 0
+    while True:
+        users = (
+            db.query(models.User.id, models.User.current_workout_plan_id)
+            .filter(models.User.id > last_id, models.User.current_workout_plan_id.isnot(None))
+            .order_by(models.User.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not users:
+            return opened
+        counts = _plan_counts(db, (plan_id for _, plan_id in users))
+        _upsert(
+            db,
+            [
+                {
+                    "user_id": user_id,
+                    "log_date": day,
+                    "scheduled_count": counts[plan_id][day.weekday()] if plan_id in counts else 0,
+                    "completed_count": 0,
+                    "plan_id": plan_id,
+                }
+                for user_id, plan_id in users
+            ],
+            overwrite=False,
+        )
+        db.commit()
+        opened += len(users)
+        last_id = users[-1].id
+
+
+def rollup(db: Session, user_id: int, period: str, since: date, until: date) -> List[dict]:
+    """
+    Weekly (ISO, Monday start) or monthly adherence between `since` and `until`
+    from one range scan. A day's completed count is capped at what was
+    scheduled, so extra exercises don't push adherence over 100%.
+    """
+    rows = (
+        db.query(
+            models.DailyAdherence.log_date,
+            models.DailyAdherence.scheduled_count,
+            models.DailyAdherence.completed_count,
+        )
+        .filter(
+            models.DailyAdherence.user_id == user_id,
+            models.DailyAdherence.log_date >= since,
+            models.DailyAdherence.log_date <= until,
+        )
+        .order_by(models.DailyAdherence.log_date)
+        .all()
+    )
+
+    def period_start(day: date) -> date:
+        if period == "month":
+            return day.replace(day=1)
+        return day - timedelta(days=day.weekday())
+
+    buckets = []
+    for start, days in groupby(rows, key=lambda row: period_start(row.log_date)):
+        days = list(days)
+        scheduled = sum(row.scheduled_count for row in days)
+        on_plan = sum(min(row.completed_count, row.scheduled_count) for row in days)
+        buckets.append({
+            "period_start": start,
+            "days_tracked": len(days),
+            "active_days": sum(1 for row in days if row.completed_count > 0),
+            "scheduled_count": scheduled,
+            "completed_count": sum(row.completed_count for row in days),
+            "adherence_pct": round(on_plan / scheduled * 100, 1) if scheduled else None,
+        })
+    return buckets
+
+
+if __name__ == "__main__":
+    from ..core.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        count = backfill(session)
+        logger.info(f"Backfilled {count} daily adherence rows")
+    finally:
+        session.close()
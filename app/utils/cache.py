@@ -0,0 +1,53 @@
+"""
+Small Redis-backed cache for derived read models (aggregates, forecasts, ...).
+Every operation fails open: on any Redis error the caller just recomputes.
+"""
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from .rate_limit import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def get_json(key: str) -> Optional[Any]:
+    if redis_client is None:
+        return None
+    try:
+        raw = redis_client.get(key)
+    except Exception as e:
+        logger.error(f"Redis cache error: {e}")
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+def set_json(key: str, value: Any, ttl_seconds: int) -> None:
+    if redis_client is None:
+        return
+    try:
+        redis_client.set(key, json.dumps(value, default=str), ex=ttl_seconds)
+    except Exception as e:
+        logger.error(f"Redis cache error: {e}")
+
+
+def set_many_json(values: Dict[str, Any], ttl_seconds: int) -> None:
+    """Write several entries in one pipelined round trip."""
+    if redis_client is None or not values:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for key, value in values.items():
+            pipe.set(key, json.dumps(value, default=str), ex=ttl_seconds)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Redis cache error: {e}")
+
+
+def delete(key: str) -> None:
+    if redis_client is None:
+        return
+    try:
+        redis_client.delete(key)
+    except Exception as e:
+        logger.error(f"Redis cache error: {e}")
@@ -0,0 +1,256 @@
+"""
+Monthly chat_history partitions and their compressed cold archive.
+
+On Postgres chat_history is range-partitioned on created_at, one partition per
+month (chat_history_yYYYYmMM) plus a default partition for stray timestamps.
+Every chat turn reads only the newest turns, so it touches the small current
+partitions, and vacuum never has to revisit months that no longer change.
+
+`maintain` runs nightly:
+  * creates this month's partition and the next PARTITIONS_AHEAD months';
+  * archives partitions older than CHAT_HOT_MONTHS. Each month is written to
+    CHAT_ARCHIVE_DIR/chat_history_YYYY_MM.ndjson.zst as one zstd frame per user
+    (NDJSON turns, oldest first), the frame positions are recorded in
+    chat_archive_segments, and the partition is detached and dropped in the same
+    transaction, so turns are never missing from both places;
+  * deletes archived months older than CHAT_RETENTION_MONTHS (0 keeps them).
+
+GET /chat/history continues into the archive with the same cursor once a user
+scrolls past the live partitions; reading a page decompresses only that user's
+frame for each month it spans. The archive directory must be shared by the API
+and the worker.
+
+SQLite (local development) keeps a plain table, and `maintain` does nothing there.
+"""
+import logging
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from itertools import groupby
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+import zstandard
+from sqlalchemy import insert, text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models import models
+
+logger = logging.getLogger(__name__)
+
+PARTITIONS_AHEAD = 2
+DEFAULT_PARTITION = "chat_history_default"
+ZSTD_LEVEL = 10
+# Give up on detaching (and retry the next night) rather than queue chat writes behind the lock
+DETACH_LOCK_TIMEOUT = "5s"
+
+_PARTITION_PATTERN = "^chat_history_y[0-9]{4}m[0-9]{2}$"
+
+
+@dataclass(frozen=True)
+class ArchivedTurn:
+    id: int
+    message: Optional[str]
+    response: str
+    created_at: datetime
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"chat_history_y{month.year:04d}m{month.month:02d}"
+
+
+def _partition_month(name: str) -> date:
+    return date(int(name[14:18]), int(name[19:21]), 1)
+
+
+def archive_path(month: date) -> Path:
+    return Path(settings.CHAT_ARCHIVE_DIR) / f"chat_history_{month.year:04d}_{month.month:02d}.ndjson.zst"
+
+
+def create_partition(conn, month: date) -> None:
+    """Create the partition for `month` unless it exists. `conn` is a Session or Connection."""
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF chat_history "
+        f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') "
+        f"TO ('{add_months(month, 1).isoformat()} 00:00:00+00')"
+    ))
+
+
+def _partition_months(db: Session) -> List[date]:
+    names = db.execute(text(
+        "SELECT c.relname FROM pg_class c "
+        "JOIN pg_inherits i ON i.inhrelid = c.oid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'chat_history' AND c.relname ~ :pattern"
+    ), {"pattern": _PARTITION_PATTERN}).scalars()
+    return sorted(_partition_month(name) for name in names)
+
+
+def ensure_partitions(db: Session, today: date) -> None:
+    month = month_start(today)
+    for offset in range(PARTITIONS_AHEAD + 1):
+        create_partition(db, add_months(month, offset))
+    db.commit()
+
+
+def _write_archive(db: Session, month: date) -> List[dict]:
+    """Write the month's partition to its archive file; returns its chat_archive_segments rows."""
+    path = archive_path(month)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+    rows = db.execute(text(
+        f"SELECT user_id, id, message, response, created_at FROM {partition_name(month)} "
+        "ORDER BY user_id, created_at, id"
+    ).execution_options(yield_per=1000))
+    segments = []
+    with open(partial, "wb") as archive:
+        for user_id, turns in groupby(rows, key=lambda row: row.user_id):
+            body = b"".join(
+                orjson.dumps({
+                    "id": turn.id,
+                    "message": turn.message,
+                    "response": turn.response,
+                    "created_at": turn.created_at.isoformat(),
+                }) + b"\n"
+                for turn in turns
+            )
+            frame = compressor.compress(body)
+            segments.append({
+                "user_id": user_id,
+                "month": month,
+                "byte_offset": archive.tell(),
+                "byte_length": len(frame),
+                "row_count": body.count(b"\n"),
+            })
+            archive.write(frame)
+        archive.flush()
+        os.fsync(archive.fileno())
+    if segments:
+        os.replace(partial, path)
+    else:
+        partial.unlink()
+    return segments
+
+
+def _drop_partition(db: Session, month: date) -> None:
+    db.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+    db.execute(text(f"ALTER TABLE chat_history DETACH PARTITION {partition_name(month)}"))
+    db.execute(text(f"DROP TABLE {partition_name(month)}"))
+
+
+def archive_partition(db: Session, month: date) -> int:
+    """Move one month from its partition to the archive. Safe to re-run. Returns the turns archived."""
+    segments = _write_archive(db, month)
+    db.query(models.ChatArchiveSegment).filter(models.ChatArchiveSegment.month == month).delete()
+    if segments:
+        db.execute(insert(models.ChatArchiveSegment), segments)
+    _drop_partition(db, month)
+    db.commit()
+    return sum(segment["row_count"] for segment in segments)
+
+
+def purge_expired(db: Session, cutoff: date) -> int:
+    """Delete archived months before `cutoff`. Returns the number of months deleted."""
+    months = [
+        month for (month,) in db.query(models.ChatArchiveSegment.month)
+        .filter(models.ChatArchiveSegment.month < cutoff)
+        .distinct()
+    ]
+    for month in months:
+        db.query(models.ChatArchiveSegment).filter(models.ChatArchiveSegment.month == month).delete()
+        db.commit()
+        archive_path(month).unlink(missing_ok=True)
+    return len(months)
+
+
+def maintain(db: Session, today: Optional[date] = None) -> dict:
+    """Create upcoming partitions, archive cold ones and apply the retention policy."""
+    stats = {"archived_months": 0, "archived_turns": 0, "dropped_months": 0, "purged_months": 0}
+    if db.get_bind().dialect.name != "postgresql":
+        return stats
+    today = today or datetime.now(timezone.utc).date()
+    ensure_partitions(db, today)
+
+    hot_cutoff = add_months(month_start(today), -(max(settings.CHAT_HOT_MONTHS, 1) - 1))
+    retention_cutoff = (
+        add_months(month_start(today), -settings.CHAT_RETENTION_MONTHS)
+        if settings.CHAT_RETENTION_MONTHS else None
+    )
+    for month in _partition_months(db):
+        if month >= hot_cutoff:
+            break
+        if retention_cutoff and month < retention_cutoff:
+            # Already past retention: nothing worth archiving
+            _drop_partition(db, month)
+            db.commit()
+            stats["dropped_months"] += 1
+            continue
+        stats["archived_turns"] += archive_partition(db, month)
+        stats["archived_months"] += 1
+    if retention_cutoff:
+        stats["purged_months"] = purge_expired(db, retention_cutoff)
+    return stats
+
+
+def _read_segment(segment: models.ChatArchiveSegment) -> List[ArchivedTurn]:
+    with open(archive_path(segment.month), "rb") as archive:
+        archive.seek(segment.byte_offset)
+        frame = archive.read(segment.byte_length)
+    turns = []
+    for line in zstandard.ZstdDecompressor().decompress(frame).splitlines():
+        turn = orjson.loads(line)
+        turn["created_at"] = datetime.fromisoformat(turn["created_at"])
+        turns.append(ArchivedTurn(**turn))
+    return turns
+
+
+def _segments(db: Session, user_id: int, descending: bool, before: Optional[datetime] = None):
+    query = db.query(models.ChatArchiveSegment).filter(models.ChatArchiveSegment.user_id == user_id)
+    if before is not None:
+        query = query.filter(
+            models.ChatArchiveSegment.month <= before.astimezone(timezone.utc).date()
+        )
+    month = models.ChatArchiveSegment.month
+    return query.order_by(month.desc() if descending else month.asc()).all()
+
+
+def history_page(
+    db: Session, user_id: int, before: Optional[Sequence], limit: int
+) -> List[ArchivedTurn]:
+    """
+    Up to `limit` archived turns, newest first, older than the (created_at, id)
+    key `before` (None: from the newest archived turn).
+    """
+    turns: List[ArchivedTurn] = []
+    key: Optional[Tuple[datetime, int]] = tuple(before) if before else None
+    for segment in _segments(db, user_id, descending=True, before=key[0] if key else None):
+        try:
+            segment_turns = _read_segment(segment)
+        except (OSError, zstandard.ZstdError) as e:
+            logger.error(f"Chat archive {segment.month} unreadable for user {user_id}: {e}")
+            continue
+        for turn in reversed(segment_turns):
+            if key is not None and (turn.created_at, turn.id) >= key:
+                continue
+            turns.append(turn)
+            if len(turns) == limit:
+                return turns
+    return turns
+
+
+def iter_user_turns(db: Session, user_id: int) -> Iterator[ArchivedTurn]:
+    """All of a user's archived turns, oldest first."""
+    for segment in _segments(db, user_id, descending=False):
+        yield from _read_segment(segment)
@@ -0,0 +1,294 @@
+"""
+Per-user relevance index over chat history.
+
+Each turn (question + answer) is turned into a sparse hashed TF-IDF vector:
+unigrams and bigrams are hashed into DIMENSIONS buckets, term frequencies are
+log-scaled, and IDF weights come from the user's own document frequencies.
+Vectors live in process memory as NumPy postings arrays (bucket -> turns), so
+a top-k cosine search only touches the turns sharing a term with the query.
+
+Memory is proportional to the user's history: document frequencies and
+postings are kept only for the buckets the user's turns actually use.
+
+Turns added after the last pack go to a small unpacked delta segment that is
+scored by a scan; it is merged into the packed postings (and IDF recomputed)
+once it outgrows max(MERGE_MIN_TURNS, packed turns / MERGE_RATIO), so a new
+turn doesn't cost a full repack.
+
+Indexes are built lazily from the database, kept in an LRU of recently active
+users, appended to as turns are written, and caught up from the database before
+a search, so every worker process converges on the same history. Writers bump a
+per-user turn counter in Redis after committing (note_written); a search skips
+the catch-up query when the counter hasn't moved since the index last caught
+up, or only moved by this process's own add_turn. Ids don't arrive in order
+(write-behind batches commit after later synchronous writes), so the catch-up
+re-reads turns created within CATCH_UP_OVERLAP of the newest one indexed and
+skips ids it already has. A turn that reaches the database more than
+CATCH_UP_OVERLAP after its created_at (a long write-behind backlog) is picked
+up when the index is rebuilt, every REBUILD_SECONDS.
+"""
+import logging
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from ..models import models
+from .rate_limit import redis_client
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = 1 << 14
+MAX_INDEXED_USERS = 1000
+# Cosine similarity below this is treated as unrelated
+MIN_SCORE = 0.1
+CATCH_UP_OVERLAP = timedelta(minutes=10)
+REBUILD_SECONDS = 60 * 60
+# New turns are scored from a small unpacked segment until it outgrows
+# max(MERGE_MIN_TURNS, packed turns / MERGE_RATIO); then everything is repacked
+MERGE_MIN_TURNS = 64
+MERGE_RATIO = 8
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from have how i if in is it its me my "
+    "of on or should so that the this to was what when which will with you your".split()
+)
+
+
+def _features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed bucket indices and log-scaled term frequencies for `text`."""
+    tokens = [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not grams:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    hashed = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint32, count=len(grams))
+    buckets, counts = np.unique(hashed % DIMENSIONS, return_counts=True)
+    return buckets.astype(np.int32), (1.0 + np.log(counts)).astype(np.float32)
+
+
+def _turn_text(message: Optional[str], response: Optional[str]) -> str:
+    return f"{message or ''}\n{response or ''}"
+
+
+class ChatIndex:
+    """Sparse hashed TF-IDF vectors for one user's chat turns."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_at = time.monotonic()
+        # Newest created_at indexed; the next catch-up starts CATCH_UP_OVERLAP before it
+        self.watermark: Optional[datetime] = None
+        # The user's turn counter (see note_written) as of the last catch-up
+        self.version: Optional[int] = None
+        self._seen: Set[int] = set()
+        self._ids: List[int] = []
+        self._lengths: List[int] = []
+        self._indices: List[np.ndarray] = []
+        self._values: List[np.ndarray] = []
+        # Turns [0, _packed_count) are in _packed; later ones form the delta segment
+        self._packed = None
+        self._packed_count = 0
+        self._unknown_idf = 0.0
+        self._delta_weights: List[np.ndarray] = []
+        self._delta = None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(
+        self, chat_id: int, message: Optional[str], response: Optional[str], created_at: Optional[datetime]
+    ) -> None:
+        if chat_id in self._seen:
+            return
+        self._seen.add(chat_id)
+        if created_at is not None and (self.watermark is None or created_at > self.watermark):
+            self.watermark = created_at
+        buckets, tf = _features(_turn_text(message, response))
+        if not len(buckets):
+            return
+        self._ids.append(chat_id)
+        self._lengths.append(len(buckets))
+        self._indices.append(buckets)
+        self._values.append(tf)
+        self._delta = None
+
+    def _merge(self) -> None:
+        """
+        Rebuild the inverted (term -> postings) layout of the idf-weighted,
+        length-normalized vectors of every turn over the buckets in use (`terms`,
+        sorted), so a search only touches postings for the query's buckets.
+        IDF weights are recomputed here and nowhere else.
+        """
+        ids = np.array(self._ids, dtype=np.int64)
+        docs = np.repeat(np.arange(len(ids)), self._lengths)
+        buckets = np.concatenate(self._indices)
+        # A turn lists each bucket once, so occurrences are document frequencies
+        terms, positions, df = np.unique(buckets, return_inverse=True, return_counts=True)
+        idf = self._idf(df)
+        weights = np.concatenate(self._values) * idf[positions]
+        norms = np.sqrt(np.bincount(docs, weights=weights * weights, minlength=len(ids)))
+        weights /= norms[docs]
+
+        order = np.argsort(positions, kind="stable")
+        term_starts = np.searchsorted(positions[order], np.arange(len(terms) + 1))
+        self._packed = (ids, terms, idf, term_starts, docs[order], weights[order].astype(np.float32))
+        self._packed_count = len(ids)
+        self._unknown_idf = float(self._idf(0))
+        self._delta_weights = []
+        self._delta = None
+
+    def _idf(self, df) -> np.ndarray:
+        return np.log((1.0 + len(self._ids)) / (1.0 + np.asarray(df))).astype(np.float32) + 1.0
+
+    def _weigh(self, buckets: np.ndarray, tf: np.ndarray) -> np.ndarray:
+        """Normalized tf-idf weights for `buckets`, with the IDF of the last merge."""
+        terms, idf = self._packed[1], self._packed[2]
+        positions = np.minimum(np.searchsorted(terms, buckets), len(terms) - 1)
+        weights = tf * np.where(terms[positions] == buckets, idf[positions], self._unknown_idf)
+        return weights / np.linalg.norm(weights)
+
+    def _delta_segment(self):
+        """Ids, buckets, turn positions and weights of the turns added since the last merge."""
+        if self._delta is None:
+            for n in range(self._packed_count + len(self._delta_weights), len(self._ids)):
+                self._delta_weights.append(self._weigh(self._indices[n], self._values[n]))
+            lengths = self._lengths[self._packed_count:]
+            self._delta = (
+                np.array(self._ids[self._packed_count:], dtype=np.int64),
+                np.concatenate(self._indices[self._packed_count:]),
+                np.repeat(np.arange(len(lengths)), lengths),
+                np.concatenate(self._delta_weights),
+            )
+        return self._delta
+
+    def search(self, query: str, k: int, exclude_ids: Iterable[int] = ()) -> List[int]:
+        """Ids of up to `k` turns most similar to `query` by cosine similarity, best first."""
+        if not self._ids or k <= 0:
+            return []
+        q_buckets, q_tf = _features(query)
+        if not len(q_buckets):
+            return []
+        delta_count = len(self._ids) - self._packed_count
+        if self._packed is None or delta_count > max(MERGE_MIN_TURNS, self._packed_count // MERGE_RATIO):
+            self._merge()
+            delta_count = 0
+        ids, terms, _, term_starts, posting_docs, posting_weights = self._packed
+
+        # Query buckets no turn uses have df 0 and no postings
+        q_weights = self._weigh(q_buckets, q_tf)
+        positions = np.minimum(np.searchsorted(terms, q_buckets), len(terms) - 1)
+        known = terms[positions] == q_buckets
+        slices = [slice(term_starts[p], term_starts[p + 1]) for p in positions[known]]
+        scores = np.zeros(len(ids))
+        if slices:
+            docs = np.concatenate([posting_docs[s] for s in slices])
+            contributions = np.concatenate([posting_weights[s] * w for s, w in zip(slices, q_weights[known])])
+            scores = np.bincount(docs, weights=contributions, minlength=len(ids))
+
+        if delta_count:
+            delta_ids, delta_buckets, delta_docs, delta_weights = self._delta_segment()
+            matches = np.minimum(np.searchsorted(q_buckets, delta_buckets), len(q_buckets) - 1)
+            hit = q_buckets[matches] == delta_buckets
+            delta_scores = np.bincount(
+                delta_docs[hit], weights=delta_weights[hit] * q_weights[matches[hit]], minlength=len(delta_ids)
+            )
+            ids = np.concatenate([ids, delta_ids])
+            scores = np.concatenate([scores, delta_scores])
+
+        excluded = np.isin(ids, list(exclude_ids)) | (scores < MIN_SCORE)
+        candidates = np.flatnonzero(~excluded)
+        if not len(candidates):
+            return []
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return ids[top].tolist()
+
+
+_indexes: "OrderedDict[int, ChatIndex]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _catch_up(index: ChatIndex, user_id: int, db: Session) -> None:
+    query = db.query(
+        models.ChatHistory.id,
+        models.ChatHistory.message,
+        models.ChatHistory.response,
+        models.ChatHistory.created_at,
+    ).filter(models.ChatHistory.user_id == user_id)
+    if index.watermark is not None:
+        query = query.filter(models.ChatHistory.created_at >= index.watermark - CATCH_UP_OVERLAP)
+    rows = query.order_by(models.ChatHistory.created_at, models.ChatHistory.id).yield_per(500)
+    for row in rows:
+        index.add(row.id, row.message, row.response, row.created_at)
+
+
+def _version_key(user_id: int) -> str:
+    return f"chat_index:turns:{user_id}"
+
+
+def _current_version(user_id: int) -> Optional[int]:
+    if redis_client is None:
+        return None
+    try:
+        return int(redis_client.get(_version_key(user_id)) or 0)
+    except RedisError as e:
+        logger.warning(f"Chat index version read failed, catching up from the database: {e}")
+        return None
+
+
+def note_written(user_ids: Iterable[int]) -> List[Optional[int]]:
+    """
+    Bump the turn counters of `user_ids` after their new turns are committed, so
+    indexes in every process know to catch up. Returns the new counter values.
+    """
+    user_ids = list(user_ids)
+    if redis_client is None or not user_ids:
+        return [None] * len(user_ids)
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.incr(_version_key(user_id))
+        return pipe.execute()
+    except RedisError as e:
+        logger.warning(f"Chat index version bump failed: {e}")
+        return [None] * len(user_ids)
+
+
+def relevant_turn_ids(
+    db: Session, user_id: int, query: str, k: int, exclude_ids: Iterable[int] = ()
+) -> List[int]:
+    """Top-k past turn ids relevant to `query`, building or catching up the index first."""
+    with _lock:
+        index = _indexes.pop(user_id, None)
+        if index is None or time.monotonic() - index.built_at > REBUILD_SECONDS:
+            index = ChatIndex()
+        _indexes[user_id] = index
+        while len(_indexes) > MAX_INDEXED_USERS:
+            _indexes.popitem(last=False)
+    with index.lock:
+        # Read before the catch-up: every turn counted so far is committed and visible to it
+        version = _current_version(user_id)
+        if version is None or version != index.version:
+            _catch_up(index, user_id, db)
+            index.version = version
+        return index.search(query, k, exclude_ids)
+
+
+def add_turn(user_id: int, chat_id: int, message: str, response: str, created_at: datetime) -> None:
+    """Append a freshly committed turn to the user's index, if it's loaded in this process."""
+    version, = note_written([user_id])
+    with _lock:
+        index = _indexes.get(user_id)
+    if index is not None:
+        with index.lock:
+            index.add(chat_id, message, response, created_at)
+            # Only this turn was written since the last catch-up: nothing to fetch
+            if version is not None and index.version is not None and version == index.version + 1:
+                index.version = version
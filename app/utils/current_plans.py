@@ -0,0 +1,67 @@
+"""
+Current-plan pointers.
+
+`users.current_nutrition_plan_id` / `users.current_workout_plan_id` point at
+the user's latest plan version, so "the current plan" is a primary-key lookup
+instead of a sort over the whole (ever-growing) version history. Every plan
+write goes through `add_version`, which moves the pointer in the same
+transaction as the insert. The pointer only moves forward (to a higher id),
+so concurrent writers can't move it back to an older version.
+"""
+from typing import Dict, Optional, Union
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from ..models import models
+from . import plan_deltas
+
+PlanRow = Union[models.NutritionPlan, models.WorkoutPlan]
+
+# Plan type -> (model, pointer column on users)
+PLAN_TYPES = {
+    "nutrition": (models.NutritionPlan, models.User.current_nutrition_plan_id),
+    "workout": (models.WorkoutPlan, models.User.current_workout_plan_id),
+}
+
+
+def add_version(db: Session, user_id: int, plan_type: str, plan_data: dict) -> PlanRow:
+    """
+    Insert a new plan version and make it current; the version it replaces is
+    re-stored as a delta against it. Doesn't commit.
+    """
+    model, pointer = PLAN_TYPES[plan_type]
+    previous_id = current_plan_id(db, user_id, plan_type)
+    plan = model(user_id=user_id, plan_data=plan_data)
+    db.add(plan)
+    db.flush()
+    db.execute(
+        update(models.User)
+        .where(models.User.id == user_id, or_(pointer.is_(None), pointer < plan.id))
+        .values({pointer.key: plan.id})
+        .execution_options(synchronize_session=False)
+    )
+    if previous_id is not None:
+        plan_deltas.demote(db, model, previous_id, plan)
+    return plan
+
+
+def current_plan_ids(db: Session, user_id: int) -> Dict[str, Optional[int]]:
+    """Current plan id of each type, from one primary-key lookup."""
+    pointers = [pointer for _, pointer in PLAN_TYPES.values()]
+    row = db.query(*pointers).filter(models.User.id == user_id).first()
+    return dict(zip(PLAN_TYPES, row or (None,) * len(PLAN_TYPES)))
+
+
+def current_plan_id(db: Session, user_id: int, plan_type: str) -> Optional[int]:
+    _, pointer = PLAN_TYPES[plan_type]
+    row = db.query(pointer).filter(models.User.id == user_id).first()
+    return row[0] if row else None
+
+
+def current_plan(db: Session, user_id: int, plan_type: str) -> Optional[PlanRow]:
+    plan_id = current_plan_id(db, user_id, plan_type)
+    if plan_id is None:
+        return None
+    model, _ = PLAN_TYPES[plan_type]
+    return db.get(model, plan_id)
@@ -0,0 +1,44 @@
+"""
+Strong ETags for conditional GETs.
+
+Endpoints derive the tag from cheap row versions (plan ids, updated_at, counts)
+before loading the representation, and answer a matching If-None-Match with an
+empty 304 instead of loading and serializing it again.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+# Clients may keep the representation but must revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute(*parts: Any) -> str:
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def _matches(if_none_match: Optional[str], tag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison (RFC 9110 §13.1.2)
+    return any(
+        candidate.strip().removeprefix("W/") == tag for candidate in if_none_match.split(",")
+    )
+
+
+def set_headers(response: Response, tag: str) -> None:
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+
+def not_modified(request: Request, tag: str) -> Optional[Response]:
+    """A bodiless 304 if the request's If-None-Match carries `tag`, else None."""
+    if not _matches(request.headers.get("if-none-match"), tag):
+        return None
+    response = Response(status_code=304)
+    set_headers(response, tag)
+    return response
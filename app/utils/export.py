@@ -0,0 +1,144 @@
+"""
+Streaming export of a user's tracking and plan history.
+
+Each section is read through a server-side cursor (`yield_per`) and encoded row
+by row into CSV or NDJSON, optionally gzip-compressed as it goes, so memory use
+doesn't depend on how much history the user has.
+"""
+import csv
+import io
+import json
+import zlib
+from itertools import islice
+from datetime import date, datetime
+from typing import Any, Iterator, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from ..models import models
+from . import chat_archive, plan_deltas
+
+# Section name -> (record_type, model, exported columns); rows are ordered by id
+SECTIONS = {
+    "daily_logs": (
+        "daily_log",
+        models.DailyLog,
+        ("id", "log_date", "completed_exercises", "workout_plan_id", "created_at", "updated_at"),
+    ),
+    "body_metrics": (
+        "body_metric",
+        models.BodyMetricLog,
+        ("id", "logged_at", "weight_kg", "body_fat_pct", "created_at", "updated_at"),
+    ),
+    "chat_history": (
+        "chat",
+        models.ChatHistory,
+        ("id", "message", "response", "created_at"),
+    ),
+    "feedback": (
+        "feedback",
+        models.PlanFeedback,
+        ("id", "plan_type", "feedback_text", "changes_summary", "source_plan_id", "created_at"),
+    ),
+    "nutrition_plans": (
+        "nutrition_plan",
+        models.NutritionPlan,
+        ("id", "plan_data", "created_at"),
+    ),
+    "workout_plans": (
+        "workout_plan",
+        models.WorkoutPlan,
+        ("id", "plan_data", "created_at"),
+    ),
+}
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+_BATCH_SIZE = 500
+# Encoded rows are buffered up to this size before being handed to the response
+_CHUNK_BYTES = 64 * 1024
+
+
+def _scalar(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _with_plan_data(db: Session, model, rows: List[dict]) -> List[dict]:
+    """Fill in plan_data for versions stored as deltas (see plan_deltas.py)."""
+    missing = [row["id"] for row in rows if row["plan_data"] is None]
+    if missing:
+        rebuilt = plan_deltas.load(db, model, missing)
+        for row in rows:
+            if row["plan_data"] is None:
+                row["plan_data"] = rebuilt.get(row["id"])
+    return rows
+
+
+def _rows(db: Session, user_id: int, sections: Sequence[str]) -> Iterator[dict]:
+    for section in sections:
+        record_type, model, columns = SECTIONS[section]
+        if model is models.ChatHistory:
+            # Turns from archived months (see chat_archive.py) are older than any live row
+            for turn in chat_archive.iter_user_turns(db, user_id):
+                yield {"record_type": record_type, **{c: _scalar(getattr(turn, c)) for c in columns}}
+        query = (
+            db.query(*[getattr(model, column) for column in columns])
+            .filter(model.user_id == user_id)
+            .order_by(model.id)
+            .yield_per(_BATCH_SIZE)
+        )
+        records = (
+            {"record_type": record_type, **{c: _scalar(v) for c, v in zip(columns, row)}}
+            for row in query
+        )
+        if "plan_data" not in columns:
+            yield from records
+            continue
+        while batch := list(islice(records, _BATCH_SIZE)):
+            yield from _with_plan_data(db, model, batch)
+
+
+def csv_columns(sections: Sequence[str]) -> List[str]:
+    """record_type plus the union of the sections' columns, in first-seen order."""
+    columns = ["record_type"]
+    for section in sections:
+        columns.extend(c for c in SECTIONS[section][2] if c not in columns)
+    return columns
+
+
+def _encode(db: Session, user_id: int, sections: Sequence[str], fmt: str) -> Iterator[bytes]:
+    if fmt == "ndjson":
+        for record in _rows(db, user_id, sections):
+            yield (json.dumps(record, default=str) + "\n").encode()
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=csv_columns(sections), restval="")
+    writer.writeheader()
+    for record in _rows(db, user_id, sections):
+        writer.writerow({
+            k: json.dumps(v) if isinstance(v, (list, dict)) else v for k, v in record.items()
+        })
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def stream_export(
+    db: Session, user_id: int, sections: Sequence[str], fmt: str, gzip: bool = False
+) -> Iterator[bytes]:
+    """Yield the encoded export in ~64 KiB chunks, gzip-compressed on the fly if asked."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None
+    pending = bytearray()
+    for piece in _encode(db, user_id, sections, fmt):
+        pending += compressor.compress(piece) if compressor else piece
+        if len(pending) >= _CHUNK_BYTES:
+            yield bytes(pending)
+            pending.clear()
+    if compressor:
+        pending += compressor.flush()
+    if pending:
+        yield bytes(pending)
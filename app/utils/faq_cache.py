@@ -0,0 +1,134 @@
+"""
+Shared answer cache for generic (profile-independent) chat questions.
+
+A cheap rule-based classifier decides whether a message is an impersonal,
+definition-style fitness question ("what is progressive overload", "how does
+creatine work") rather than something about the user. Any first-person
+question is personal: "how much protein do I need" depends on the user's
+weight, goal and plan, so it never gets a shared answer. Generic
+questions are answered once without profile context and cached in Redis under
+a normalized key: lowercased, punctuation, filler phrases and stopwords
+removed, light plural stemming, tokens sorted, so rewordings and reorderings
+of the same question share an entry. Entries expire after FAQ_TTL_SECONDS.
+
+Hits, misses and personal (uncacheable) messages are counted in a Redis hash
+for hit-rate reporting. Every operation fails open.
+"""
+import hashlib
+import json
+import logging
+import re
+from typing import Optional
+
+from .rate_limit import redis_client
+
+logger = logging.getLogger(__name__)
+
+FAQ_TTL_SECONDS = 7 * 24 * 60 * 60
+MAX_GENERIC_WORDS = 20
+STATS_KEY = "faq:stats"
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Polite wrappers that don't change the question
+_FILLER = re.compile(
+    r"^(hey|hi|hello|ok|okay|so)\b[\s,]*|\b(can|could|would) you (please )?|\bplease\b|"
+    r"\bi (want|would like) to know\b"
+)
+_ASK_TO_EXPLAIN = re.compile(r"\b(tell me|help me understand)( about)?\b")
+# First person, or a reference to the user's own plan or timeline
+_PERSONAL = re.compile(
+    r"\b(i|i'm|im|i've|ive|i'd|i'll|me|my|mine|myself|we|we're|us|our|ours)\b|"
+    r"\b(plan|plans|today|tonight|tomorrow|yesterday|this week|last week|streak|progress|goal|goals|schedule)\b"
+)
+_GENERIC_OPENER = re.compile(
+    r"^(what|what's|whats|how|why|when|which|is|are|does|do|can|should|explain|define|"
+    r"benefits? of|difference between|tips for)\b"
+)
+_STOPWORDS = frozenset(
+    "a an the is are was were be been of to in on for and or with about what what's whats "
+    "explain define tell me does do should can i we you one it its this that there much "
+    "per any some".split()
+)
+
+
+def _clean(message: str) -> str:
+    text = message.lower().strip()
+    text = _ASK_TO_EXPLAIN.sub("explain", _FILLER.sub(" ", text))
+    return " ".join(_WORD.findall(text))
+
+
+def is_generic(message: str) -> bool:
+    """True if the message reads as a general question that doesn't depend on the user."""
+    text = _clean(message)
+    words = text.split()
+    if not words or len(words) > MAX_GENERIC_WORDS or not normalize(message):
+        return False
+    if _PERSONAL.search(text):
+        return False
+    return bool(_GENERIC_OPENER.match(text))
+
+
+def _stem(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize(message: str) -> str:
+    """Order-insensitive key text: content words only, lightly stemmed."""
+    words = {_stem(w) for w in _clean(message).split() if w not in _STOPWORDS}
+    return " ".join(sorted(words))
+
+
+def _answer_key(message: str) -> str:
+    return "faq:answer:" + hashlib.sha1(normalize(message).encode()).hexdigest()
+
+
+def record(outcome: str) -> None:
+    """Count a 'hit', 'miss' or 'personal' chat message."""
+    if redis_client is None:
+        return
+    try:
+        redis_client.hincrby(STATS_KEY, outcome, 1)
+    except Exception as e:
+        logger.error(f"Redis FAQ cache error: {e}")
+
+
+def get_answer(message: str) -> Optional[str]:
+    if redis_client is None:
+        return None
+    try:
+        raw = redis_client.get(_answer_key(message))
+    except Exception as e:
+        logger.error(f"Redis FAQ cache error: {e}")
+        return None
+    return json.loads(raw)["answer"] if raw is not None else None
+
+
+def store_answer(message: str, answer: str) -> None:
+    if redis_client is None or not answer:
+        return
+    try:
+        redis_client.set(
+            _answer_key(message),
+            json.dumps({"question": message, "answer": answer}),
+            ex=FAQ_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.error(f"Redis FAQ cache error: {e}")
+
+
+def stats() -> dict:
+    counts = {"hit": 0, "miss": 0, "personal": 0}
+    if redis_client is not None:
+        try:
+            counts.update({k: int(v) for k, v in redis_client.hgetall(STATS_KEY).items()})
+        except Exception as e:
+            logger.error(f"Redis FAQ cache error: {e}")
+    generic = counts["hit"] + counts["miss"]
+    return {
+        **counts,
+        "hit_rate": round(counts["hit"] / generic, 4) if generic else None,
+    }
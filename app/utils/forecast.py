@@ -0,0 +1,232 @@
+"""
+Goal ETA forecasting from body-metric history.
+
+A Theil–Sen line (median of pairwise slopes) is fitted over the user's recent
+weigh-ins, so a few bad scale readings don't swing the trend. The projected
+date the target weight is reached comes with a band from Sen's rank-based
+confidence interval on the slope, and is compared to the goal deadline
+(goal created_at + target_days).
+
+Forecasts are computed for every active user by a nightly batch job and
+cached per user; logging a metric or changing goals drops the cached entry.
+"""
+import logging
+import math
+from datetime import date, timedelta
+from itertools import groupby
+from statistics import NormalDist
+from typing import Optional, Sequence
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from ..models import models
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+FORECAST_WINDOW_DAYS = 90
+MIN_WEIGH_INS = 3
+MIN_SPAN_DAYS = 7
+# Within this distance of the target the goal counts as reached
+REACHED_TOLERANCE_KG = 0.5
+CONFIDENCE = 0.9
+# Projections further out than this are reported as off track
+MAX_HORIZON_DAYS = 5 * 365
+# Refreshed nightly and dropped on every new metric, so this is only a safety TTL
+FORECAST_TTL_SECONDS = 36 * 60 * 60
+
+
+def theil_sen(x: np.ndarray, y: np.ndarray, confidence: float = CONFIDENCE) -> tuple:
+    """
+    (slope, intercept, slope_low, slope_high) of the Theil–Sen fit. The slope
+    band is Sen's distribution-free interval: order statistics of the pairwise
+    slopes around the median, with the offset taken from the variance of
+    Kendall's S. `x` must be strictly increasing.
+    """
+    n = len(x)
+    i, j = np.triu_indices(n, k=1)
+    slopes = np.sort((y[j] - y[i]) / (x[j] - x[i]))
+    slope = float(np.median(slopes))
+    intercept = float(np.median(y - slope * x))
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    offset = z * math.sqrt(n * (n - 1) * (2 * n + 5) / 18)
+    pairs = len(slopes)
+    low = max(int(math.floor((pairs - offset) / 2)), 0)
+    high = min(int(math.ceil((pairs + offset) / 2)), pairs - 1)
+    return slope, intercept, float(slopes[low]), float(slopes[high])
+
+
+def goal_deadline(goals: models.UserGoals) -> Optional[date]:
+    if goals.created_at is None or goals.target_days is None:
+        return None
+    return goals.created_at.date() + timedelta(days=goals.target_days)
+
+
+def _eta(today: date, remaining: float, rate_per_day: float) -> Optional[date]:
+    if rate_per_day <= 0 or remaining / rate_per_day > MAX_HORIZON_DAYS:
+        return None
+    return today + timedelta(days=math.ceil(remaining / rate_per_day))
+
+
+def forecast_goal(
+    logged_at: Sequence[date],
+    weight_kg: Sequence[float],
+    target_weight: Optional[float],
+    deadline: Optional[date],
+    today: Optional[date] = None,
+) -> dict:
+    """
+    Forecast when `target_weight` is reached from a date-ordered weigh-in series.
+
+    Status is one of: insufficient_data, reached, on_track, behind (projected
+    after the deadline) or off_track (trend flat or moving away from the target).
+    """
+    today = today or date.today()
+    result = {
+        "status": "insufficient_data",
+        "target_weight": target_weight,
+        "deadline": deadline,
+        "weigh_ins": len(logged_at),
+        "current_weight_kg": None,
+        "slope_kg_per_week": None,
+        "required_kg_per_week": None,
+        "projected_date": None,
+        "projected_date_earliest": None,
+        "projected_date_latest": None,
+        "computed_on": today,
+    }
+    if (
+        target_weight is None
+        or len(logged_at) < MIN_WEIGH_INS
+        or (logged_at[-1] - logged_at[0]).days < MIN_SPAN_DAYS
+    ):
+        return result
+
+    days = np.array(logged_at, dtype="datetime64[D]")
+    x = (days - days[0]).astype(float)
+    y = np.array(weight_kg, dtype=float)
+    slope, intercept, slope_low, slope_high = theil_sen(x, y)
+
+    current = intercept + slope * float((np.datetime64(today) - days[0]).astype(int))
+    remaining = target_weight - current
+    result["current_weight_kg"] = round(current, 2)
+    result["slope_kg_per_week"] = round(slope * 7, 3)
+    if deadline and deadline > today:
+        result["required_kg_per_week"] = round(remaining / (deadline - today).days * 7, 3)
+
+    if abs(remaining) <= REACHED_TOLERANCE_KG:
+        result["status"] = "reached"
+        return result
+
+    # Rates of progress towards the target: positive means heading the right way
+    direction = 1.0 if remaining > 0 else -1.0
+    rate = slope * direction
+    slowest, fastest = sorted((slope_low * direction, slope_high * direction))
+    distance = abs(remaining)
+
+    result["projected_date"] = _eta(today, distance, rate)
+    result["projected_date_earliest"] = _eta(today, distance, fastest)
+    result["projected_date_latest"] = _eta(today, distance, slowest)
+    if result["projected_date"] is None:
+        result["status"] = "off_track"
+    elif deadline is None or result["projected_date"] <= deadline:
+        result["status"] = "on_track"
+    else:
+        result["status"] = "behind"
+    return result
+
+
+def cache_key(user_id: int) -> str:
+    return f"goal_forecast:{user_id}"
+
+
+def invalidate(user_id: int) -> None:
+    cache.delete(cache_key(user_id))
+
+
+def _weigh_ins(db: Session, since: date):
+    return (
+        db.query(
+            models.BodyMetricLog.user_id,
+            models.BodyMetricLog.logged_at,
+            models.BodyMetricLog.weight_kg,
+        )
+        .filter(
+            models.BodyMetricLog.logged_at >= since,
+            models.BodyMetricLog.weight_kg.isnot(None),
+        )
+        .order_by(models.BodyMetricLog.user_id, models.BodyMetricLog.logged_at)
+    )
+
+
+def forecast_for_user(user_id: int, db: Session, today: Optional[date] = None) -> Optional[dict]:
+    """Compute and cache one user's forecast. Returns None if the user has no goals."""
+    today = today or date.today()
+    goals = db.query(models.UserGoals).filter(models.UserGoals.user_id == user_id).first()
+    if not goals:
+        return None
+    rows = (
+        _weigh_ins(db, today - timedelta(days=FORECAST_WINDOW_DAYS))
+        .filter(models.BodyMetricLog.user_id == user_id)
+        .all()
+    )
+    forecast = forecast_goal(
+        [row.logged_at for row in rows],
+        [row.weight_kg for row in rows],
+        goals.target_weight,
+        goal_deadline(goals),
+        today,
+    )
+    cache.set_json(cache_key(user_id), forecast, FORECAST_TTL_SECONDS)
+    return forecast
+
+
+def forecast_all_users(db: Session, today: Optional[date] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute and cache forecasts for every user with goals and a weigh-in in
+    the forecast window, from one ordered scan of body_metric_logs.
+    Returns the number of forecasts written.
+    """
+    today = today or date.today()
+    goals_by_user = {
+        goals.user_id: goals
+        for goals in db.query(models.UserGoals).filter(models.UserGoals.target_weight.isnot(None))
+    }
+    rows = _weigh_ins(db, today - timedelta(days=FORECAST_WINDOW_DAYS)).yield_per(batch_size)
+
+    written = 0
+    pending = {}
+    for user_id, user_rows in groupby(rows, key=lambda row: row.user_id):
+        goals = goals_by_user.get(user_id)
+        if goals is None:
+            continue
+        user_rows = list(user_rows)
+        pending[cache_key(user_id)] = forecast_goal(
+            [row.logged_at for row in user_rows],
+            [row.weight_kg for row in user_rows],
+            goals.target_weight,
+            goal_deadline(goals),
+            today,
+        )
+        if len(pending) >= batch_size:
+            cache.set_many_json(pending, FORECAST_TTL_SECONDS)
+            written += len(pending)
+            pending = {}
+    if pending:
+        cache.set_many_json(pending, FORECAST_TTL_SECONDS)
+        written += len(pending)
+    return written
+
+
+if __name__ == "__main__":
+    from ..core.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        count = forecast_all_users(session)
+        logger.info(f"Cached goal forecasts for {count} users")
+    finally:
+        session.close()
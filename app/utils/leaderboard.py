@@ -0,0 +1,207 @@
+"""
+Streak leaderboards on Redis sorted sets.
+
+Every user with a streak row sits on the global board plus one board for their
+goal type and one for their cohort (signup month). Scores are current streaks,
+so rank lookups and top-k / around-me pages are O(log n) sorted-set reads.
+The boards a user belongs to are kept in a small Redis set, which lets a
+streak change fan out to all of them in a single script call with no DB reads.
+
+Rebuild all boards from user_streaks with:
+    python -m app.utils.leaderboard
+"""
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from redis import Redis
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+from ..models import models
+from .rate_limit import redis_client
+
+logger = logging.getLogger(__name__)
+
+BOARD_PREFIX = "leaderboard:streak"
+GLOBAL_BOARD = f"{BOARD_PREFIX}:global"
+
+# KEYS[1] = user's membership set, KEYS[2] = global board; ARGV[1] = user id, ARGV[2] = streak
+_RECORD_SCRIPT = """
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+for _, board in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    redis.call('ZADD', board, ARGV[2], ARGV[1])
+end
+return 1
+"""
+
+# KEYS[1] = membership set, KEYS[2] = global board, KEYS[3..] = new boards; ARGV[1] = user id
+_ASSIGN_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[2], ARGV[1])
+for _, board in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    redis.call('ZREM', board, ARGV[1])
+end
+redis.call('DEL', KEYS[1])
+for i = 3, #KEYS do
+    redis.call('SADD', KEYS[1], KEYS[i])
+    if score then
+        redis.call('ZADD', KEYS[i], score, ARGV[1])
+    end
+end
+return 1
+"""
+
+_record = redis_client.register_script(_RECORD_SCRIPT) if redis_client is not None else None
+_assign = redis_client.register_script(_ASSIGN_SCRIPT) if redis_client is not None else None
+
+
+def goal_board(goal_type: str) -> str:
+    return f"{BOARD_PREFIX}:goal:{goal_type.lower().replace(' ', '_')}"
+
+
+def cohort_board(signed_up_at: datetime) -> str:
+    return f"{BOARD_PREFIX}:cohort:{signed_up_at.strftime('%Y-%m')}"
+
+
+def _membership_key(user_id: int) -> str:
+    return f"{BOARD_PREFIX}:boards:{user_id}"
+
+
+def _user_boards(goal_type: Optional[str], signed_up_at: Optional[datetime]) -> List[str]:
+    boards = []
+    if goal_type:
+        boards.append(goal_board(goal_type))
+    if signed_up_at:
+        boards.append(cohort_board(signed_up_at))
+    return boards
+
+
+def record_streak(user_id: int, current_streak: int) -> None:
+    """Publish a user's current streak to every board they belong to."""
+    if redis_client is None:
+        return
+    try:
+        _record(keys=[_membership_key(user_id), GLOBAL_BOARD], args=[user_id, current_streak])
+    except Exception as e:
+        logger.error(f"Redis leaderboard error: {e}")
+
+
+def record_streaks(user_ids: List[int], current_streak: int) -> None:
+    """Publish the same streak for many users in one pipelined round trip."""
+    if redis_client is None or not user_ids:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for user_id in user_ids:
+            _record(keys=[_membership_key(user_id), GLOBAL_BOARD], args=[user_id, current_streak], client=pipe)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Redis leaderboard error: {e}")
+
+
+def assign_boards(user_id: int, goal_type: Optional[str], signed_up_at: Optional[datetime]) -> None:
+    """Move the user onto the goal/cohort boards matching their current profile."""
+    if redis_client is None:
+        return
+    try:
+        _assign(
+            keys=[_membership_key(user_id), GLOBAL_BOARD, *_user_boards(goal_type, signed_up_at)],
+            args=[user_id],
+        )
+    except Exception as e:
+        logger.error(f"Redis leaderboard error: {e}")
+
+
+def _client() -> Redis:
+    # Reads can't fail open like the writes above; callers turn RedisError into a 503
+    if redis_client is None:
+        raise RedisError("Redis is not configured")
+    return redis_client
+
+
+def rank(board: str, user_id: int) -> Optional[tuple]:
+    """(1-based rank, streak) of the user on `board`, or None if not ranked."""
+    pipe = _client().pipeline()
+    pipe.zrevrank(board, user_id)
+    pipe.zscore(board, user_id)
+    position, score = pipe.execute()
+    if position is None:
+        return None
+    return position + 1, int(score)
+
+
+def top(board: str, limit: int) -> List[tuple]:
+    """[(rank, user_id, streak), ...] for the first `limit` places."""
+    entries = _client().zrevrange(board, 0, limit - 1, withscores=True)
+    return [(i + 1, int(member), int(score)) for i, (member, score) in enumerate(entries)]
+
+
+def around(board: str, user_id: int, radius: int) -> List[tuple]:
+    """Up to `radius` places either side of the user, including the user."""
+    client = _client()
+    position = client.zrevrank(board, user_id)
+    if position is None:
+        return []
+    start = max(position - radius, 0)
+    entries = client.zrevrange(board, start, position + radius, withscores=True)
+    return [(start + i + 1, int(member), int(score)) for i, (member, score) in enumerate(entries)]
+
+
+def rebuild_leaderboards(db: Session, batch_size: int = 1000) -> int:
+    """
+    Rebuild every board and membership set from user_streaks. New boards are
+    written under temporary keys and swapped in with RENAME, so readers never
+    see a half-built board. Returns the number of users ranked.
+    """
+    rows = (
+        db.query(
+            models.UserStreak.user_id,
+            models.UserStreak.current_streak,
+            models.UserGoals.goal_type,
+            models.User.created_at,
+        )
+        .join(models.User, models.User.id == models.UserStreak.user_id)
+        .outerjoin(models.UserGoals, models.UserGoals.user_id == models.UserStreak.user_id)
+        .yield_per(batch_size)
+    )
+
+    staging = f"{BOARD_PREFIX}:rebuild:"
+    built = set()
+    ranked = 0
+    client = _client()
+    pipe = client.pipeline(transaction=False)
+    for user_id, current_streak, goal_type, signed_up_at in rows:
+        boards = _user_boards(goal_type, signed_up_at)
+        for board in (GLOBAL_BOARD, *boards):
+            pipe.zadd(staging + board, {user_id: current_streak})
+            built.add(board)
+        pipe.delete(_membership_key(user_id))
+        if boards:
+            pipe.sadd(_membership_key(user_id), *boards)
+        ranked += 1
+        if ranked % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+
+    existing = {GLOBAL_BOARD}
+    for kind in ("goal", "cohort"):
+        existing.update(client.scan_iter(f"{BOARD_PREFIX}:{kind}:*"))
+    swap = client.pipeline()
+    for board in built:
+        swap.rename(staging + board, board)
+    for board in existing - built:
+        swap.delete(board)
+    swap.execute()
+    return ranked
+
+
+if __name__ == "__main__":
+    from ..core.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        count = rebuild_leaderboards(session)
+        logger.info(f"Rebuilt streak leaderboards for {count} users")
+    finally:
+        session.close()
@@ -0,0 +1,218 @@
+"""
+Delta-compressed plan version storage.
+
+Plan versions are stored as reverse deltas. The current version of a plan is
+always a full snapshot in `plan_data`. When a newer version is added, the
+previous one is rewritten as a delta (`plan_delta`) against it and points at it
+through `base_plan_id`, so a feedback adaptation that changes one field costs
+one small delta instead of another copy of the whole plan.
+
+Every SNAPSHOT_EVERY-th version of a user's plan is kept whole, as is any
+version whose delta wouldn't be smaller than the plan itself. Rebuilding an old
+version therefore applies at most SNAPSHOT_EVERY - 1 deltas, and reading the
+current version never applies any. Serialized versions are cached by
+plan_json.py, so reconstruction only runs on a cache miss.
+
+Deltas are JSON objects that turn the base's data into the version's:
+    {"set": {key: value}, "del": [key], "sub": {key: nested delta}}  objects
+    {"items": {index: nested delta}}                                  same-length lists
+    {"replace": value}                                                anything else
+
+Compact existing history (full copies of every version) with:
+    python -m app.utils.plan_deltas
+"""
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from ..models import models
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_EVERY = 10
+
+PLAN_MODELS = (models.NutritionPlan, models.WorkoutPlan)
+
+
+def _diffable(base: Any, target: Any) -> bool:
+    if isinstance(base, dict) and isinstance(target, dict):
+        return True
+    return isinstance(base, list) and isinstance(target, list) and len(base) == len(target)
+
+
+def make_delta(base: Any, target: Any) -> dict:
+    """Delta that turns `base` into `target`."""
+    if not _diffable(base, target):
+        return {"replace": target}
+    if isinstance(target, list):
+        return {
+            "items": {
+                str(index): make_delta(old, new)
+                for index, (old, new) in enumerate(zip(base, target))
+                if old != new
+            }
+        }
+    delta = {}
+    changed = {}
+    nested = {}
+    for key, value in target.items():
+        if key not in base:
+            changed[key] = value
+        elif base[key] != value:
+            if _diffable(base[key], value):
+                nested[key] = make_delta(base[key], value)
+            else:
+                changed[key] = value
+    removed = [key for key in base if key not in target]
+    if changed:
+        delta["set"] = changed
+    if removed:
+        delta["del"] = removed
+    if nested:
+        delta["sub"] = nested
+    return delta
+
+
+def apply_delta(base: Any, delta: dict) -> Any:
+    """Apply a make_delta result to `base`, without modifying `base`."""
+    if "replace" in delta:
+        return delta["replace"]
+    if "items" in delta:
+        result = list(base)
+        for index, nested in delta["items"].items():
+            result[int(index)] = apply_delta(result[int(index)], nested)
+        return result
+    result = dict(base)
+    for key in delta.get("del", ()):
+        result.pop(key, None)
+    result.update(delta.get("set", {}))
+    for key, nested in delta.get("sub", {}).items():
+        result[key] = apply_delta(result[key], nested)
+    return result
+
+
+def _worth_storing(delta: dict, data: Any) -> bool:
+    return len(json.dumps(delta)) < len(json.dumps(data))
+
+
+def demote(db: Session, model, plan_id: int, base: Any) -> bool:
+    """
+    Rewrite version `plan_id` as a delta against `base`, a newer version of the
+    same plan (an ORM row holding full plan_data), unless it is a periodic
+    snapshot or already a delta. Doesn't commit. Returns True if rewritten.
+    """
+    plan = db.get(model, plan_id)
+    if plan is None or plan.plan_data is None or plan_id >= base.id:
+        return False
+    ordinal = (
+        db.query(func.count(model.id))
+        .filter(model.user_id == plan.user_id, model.id < plan_id)
+        .scalar()
+    )
+    if ordinal % SNAPSHOT_EVERY == 0:
+        return False
+    delta = make_delta(base.plan_data, plan.plan_data)
+    if not _worth_storing(delta, plan.plan_data):
+        return False
+    plan.plan_delta = delta
+    plan.base_plan_id = base.id
+    plan.plan_data = None
+    return True
+
+
+def load(db: Session, model, plan_ids: Iterable[int]) -> Dict[int, Any]:
+    """Full plan_data for each existing id in `plan_ids`, rebuilding delta-stored versions."""
+    rows = {}
+    wanted = {plan_id for plan_id in plan_ids if plan_id is not None}
+    missing = set(wanted)
+    # One query per level of the delta chains, which are at most SNAPSHOT_EVERY long
+    while missing:
+        for row in db.query(
+            model.id, model.plan_data, model.plan_delta, model.base_plan_id
+        ).filter(model.id.in_(missing)):
+            rows[row.id] = row
+        missing = {
+            row.base_plan_id for row in rows.values()
+            if row.plan_data is None and row.base_plan_id is not None
+        } - rows.keys()
+
+    data: Dict[int, Any] = {}
+
+    def rebuild(plan_id: int) -> Optional[Any]:
+        # Iterative walk: the chain is followed up to the nearest full snapshot
+        chain = []
+        while plan_id not in data:
+            row = rows.get(plan_id)
+            if row is None:
+                return None
+            if row.plan_data is not None:
+                data[plan_id] = row.plan_data
+                break
+            chain.append(row)
+            plan_id = row.base_plan_id
+        value = data.get(plan_id)
+        for row in reversed(chain):
+            value = data[row.id] = apply_delta(value, row.plan_delta)
+        return value
+
+    result = {}
+    for plan_id in wanted:
+        value = rebuild(plan_id)
+        if value is not None:
+            result[plan_id] = value
+    return result
+
+
+def plan_data(db: Session, plan) -> Any:
+    """Full plan_data of an ORM plan row, whether stored whole or as a delta."""
+    if plan.plan_data is not None:
+        return plan.plan_data
+    return load(db, type(plan), [plan.id]).get(plan.id)
+
+
+def compact(db: Session, batch_size: int = 200) -> dict:
+    """
+    Rewrite existing plan history into snapshots plus deltas, one user's plan
+    at a time, committing every `batch_size` users. Idempotent: versions
+    already stored the right way are left untouched. Returns the number of
+    versions rewritten per plan table.
+    """
+    stats = {}
+    for model in PLAN_MODELS:
+        rewritten = 0
+        user_ids = [user_id for (user_id,) in db.query(model.user_id).distinct().order_by(model.user_id)]
+        for offset, user_id in enumerate(user_ids, start=1):
+            versions = db.query(model).filter(model.user_id == user_id).order_by(model.id).all()
+            full = load(db, model, [version.id for version in versions])
+            # Each version is stored against the next newer one; the newest stays whole
+            for ordinal, version in enumerate(versions):
+                data = full[version.id]
+                stored = (data, None, None)
+                if ordinal + 1 < len(versions) and ordinal % SNAPSHOT_EVERY != 0:
+                    newer = versions[ordinal + 1]
+                    delta = make_delta(full[newer.id], data)
+                    if _worth_storing(delta, data):
+                        stored = (None, delta, newer.id)
+                if (version.plan_data, version.plan_delta, version.base_plan_id) != stored:
+                    version.plan_data, version.plan_delta, version.base_plan_id = stored
+                    rewritten += 1
+            if offset % batch_size == 0:
+                db.commit()
+        db.commit()
+        stats[model.__tablename__] = rewritten
+    return stats
+
+
+if __name__ == "__main__":
+    from ..core.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        for table, count in compact(session).items():
+            logger.info(f"Rewrote {count} {table} versions")
+    finally:
+        session.close()
@@ -0,0 +1,74 @@
+"""
+Pre-serialized plan JSON.
+
+Plan versions are immutable: regeneration and feedback adaptation always
+insert a new version. The JSON for a plan row therefore never changes (even
+when its storage is later rewritten as a delta), so it is encoded once and
+kept in a process-local LRU keyed by (plan type, row id). Readers look up
+only the id of the plan they need and splice the cached bytes into their
+response, so a hit neither loads nor re-encodes plan_data (nor rebuilds a
+delta-stored version, see plan_deltas.py). Current plan ids come from the
+users' plan pointers (see current_plans.py).
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models import models, schemas
+from . import plan_deltas
+
+MAX_CACHED_PLANS = 2000
+
+# Plan type -> (model, response schema)
+PLAN_TYPES = {
+    "nutrition": (models.NutritionPlan, schemas.NutritionPlanResponse),
+    "workout": (models.WorkoutPlan, schemas.WorkoutPlanResponse),
+}
+
+_cache: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _get(key: Tuple[str, int]) -> Optional[bytes]:
+    with _lock:
+        body = _cache.get(key)
+        if body is not None:
+            _cache.move_to_end(key)
+        return body
+
+
+def _put(key: Tuple[str, int], body: bytes) -> None:
+    with _lock:
+        _cache[key] = body
+        while len(_cache) > MAX_CACHED_PLANS:
+            _cache.popitem(last=False)
+
+
+def plan_bytes(db: Session, plan_type: str, plan_id: int) -> Optional[bytes]:
+    """Serialized plan response for one plan row, or None if the row doesn't exist."""
+    key = (plan_type, plan_id)
+    body = _get(key)
+    if body is None:
+        model, schema = PLAN_TYPES[plan_type]
+        plan = db.get(model, plan_id)
+        if plan is None:
+            return None
+        body = schema(
+            id=plan.id,
+            user_id=plan.user_id,
+            plan_data=plan_deltas.plan_data(db, plan),
+            created_at=plan.created_at,
+        ).model_dump_json().encode()
+        _put(key, body)
+    return body
+
+
+def plans_bytes(db: Session, plan_ids: Dict[str, Optional[int]]) -> bytes:
+    """The GET /plans body (schemas.UserPlansResponse) for the given plan ids."""
+    parts = []
+    for plan_type, plan_id in plan_ids.items():
+        body = plan_bytes(db, plan_type, plan_id) if plan_id is not None else None
+        parts.append(b'"%s_plan":%s' % (plan_type.encode(), body or b"null"))
+    return b"{" + b",".join(parts) + b"}"
@@ -0,0 +1,208 @@
+"""
+Redis-backed quota ledger for per-user daily limits.
+
+Each (user, resource) pair keeps hourly counters in Redis covering a rolling
+24h window. Admission is a single atomic Lua call that sums the window and,
+if the limit isn't reached, increments the current bucket. Postgres is only
+read to rebuild a ledger that Redis doesn't have (first use, eviction, flush)
+or when Redis is unreachable.
+"""
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Iterable, Optional
+
+from .rate_limit import redis_client
+
+logger = logging.getLogger(__name__)
+
+QUOTA_WINDOW_SECONDS = 24 * 60 * 60
+BUCKET_SECONDS = 60 * 60
+BUCKET_COUNT = QUOTA_WINDOW_SECONDS // BUCKET_SECONDS
+# Buckets outlive the window by one bucket so the oldest one is still readable
+KEY_TTL_SECONDS = QUOTA_WINDOW_SECONDS + BUCKET_SECONDS
+
+# KEYS[1]   = ledger marker (present once the ledger has been seeded)
+# KEYS[2]   = charge record: remembers which bucket this unit was charged to
+# KEYS[3..] = bucket keys, current bucket first
+# ARGV[1]   = limit, ARGV[2] = key TTL, ARGV[3] = current bucket index
+# Returns -1 if the ledger needs a rebuild, 0 if over the limit, 1 if admitted.
+_ACQUIRE_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return -1
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+local total = 0
+for i = 3, #KEYS do
+    total = total + tonumber(redis.call('GET', KEYS[i]) or '0')
+end
+if total >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('INCR', KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+redis.call('SET', KEYS[2], ARGV[3], 'EX', ARGV[2])
+return 1
+"""
+
+# KEYS[1] = charge record, ARGV[1] = bucket key prefix
+# Refunds the charged bucket once, never below zero. Returns 1 if a unit was given back.
+_REFUND_SCRIPT = """
+local bucket = redis.call('GET', KEYS[1])
+if not bucket then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+local key = ARGV[1] .. bucket
+if tonumber(redis.call('GET', key) or '0') > 0 then
+    redis.call('DECR', key)
+    return 1
+end
+return 0
+"""
+
+# KEYS[1] = slot key, ARGV[1] = holder; deletes the slot only if it still belongs to the holder
+_RELEASE_SLOT_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+if redis_client is not None:
+    _acquire = redis_client.register_script(_ACQUIRE_SCRIPT)
+    _refund = redis_client.register_script(_REFUND_SCRIPT)
+    _release_slot = redis_client.register_script(_RELEASE_SLOT_SCRIPT)
+else:
+    _acquire = _refund = _release_slot = None
+
+
+def _bucket_index(ts: float) -> int:
+    return int(ts) // BUCKET_SECONDS
+
+
+def _marker_key(user_id: int, resource: str) -> str:
+    return f"quota:{resource}:{user_id}"
+
+
+def _bucket_key(user_id: int, resource: str, bucket: int) -> str:
+    return f"quota:{resource}:{user_id}:{bucket}"
+
+
+def _charge_key(user_id: int, resource: str, charge_id: str) -> str:
+    return f"quota:{resource}:{user_id}:charge:{charge_id}"
+
+
+def _window_keys(user_id: int, resource: str, now: float) -> list:
+    current = _bucket_index(now)
+    return [_bucket_key(user_id, resource, current - i) for i in range(BUCKET_COUNT)]
+
+
+def _to_timestamp(value: datetime) -> float:
+    # SQLite hands back naive datetimes; server_default timestamps are UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def rebuild_quota(user_id: int, resource: str, accepted_at: Iterable[datetime]) -> None:
+    """Replace the Redis ledger with counts derived from accepted work timestamps."""
+    now = time.time()
+    window_keys = _window_keys(user_id, resource, now)
+    oldest = _bucket_index(now) - BUCKET_COUNT + 1
+
+    counts = {}
+    for value in accepted_at:
+        bucket = _bucket_index(_to_timestamp(value))
+        if bucket >= oldest:
+            counts[bucket] = counts.get(bucket, 0) + 1
+
+    pipe = redis_client.pipeline()
+    pipe.delete(*window_keys)
+    for bucket, count in counts.items():
+        pipe.set(_bucket_key(user_id, resource, bucket), count, ex=KEY_TTL_SECONDS)
+    pipe.set(_marker_key(user_id, resource), 1, ex=KEY_TTL_SECONDS)
+    pipe.execute()
+
+
+def acquire_quota(
+    user_id: int,
+    resource: str,
+    limit: int,
+    load_history: Callable[[], list],
+    charge_id: str,
+) -> bool:
+    """
+    Try to consume one unit of `resource` for the user in the rolling 24h window.
+    Returns True (and records the unit) if the user is under `limit`.
+
+    `load_history` returns the `created_at` timestamps of work accepted in the
+    last 24h from Postgres. It's only called when the ledger must be rebuilt,
+    or when Redis is unavailable, in which case the DB count decides.
+    `charge_id` (e.g. the task id) names the unit for `release_quota`.
+    """
+    if redis_client is not None:
+        try:
+            now = time.time()
+            keys = [_marker_key(user_id, resource), _charge_key(user_id, resource, charge_id)]
+            keys += _window_keys(user_id, resource, now)
+            args = [limit, KEY_TTL_SECONDS, _bucket_index(now)]
+            admitted = _acquire(keys=keys, args=args)
+            if admitted == -1:
+                rebuild_quota(user_id, resource, load_history())
+                admitted = _acquire(keys=keys, args=args)
+            return admitted == 1
+        except Exception as e:
+            logger.error(f"Redis quota ledger error: {e}")
+
+    logger.warning("Redis is not available; checking quota against the database.")
+    return len(load_history()) < limit
+
+
+def release_quota(user_id: int, resource: str, charge_id: str) -> None:
+    """
+    Give back the unit acquire_quota charged under `charge_id` when the accepted
+    work didn't happen. The refund goes to the bucket that was charged, even if
+    the hour has turned since, and at most once.
+    """
+    if redis_client is None:
+        return
+    try:
+        _refund(
+            keys=[_charge_key(user_id, resource, charge_id)],
+            args=[_bucket_key(user_id, resource, "")],
+        )
+    except Exception as e:
+        logger.error(f"Redis quota ledger error: {e}")
+
+
+def acquire_slot(user_id: int, resource: str, holder: str, ttl_seconds: int) -> Optional[bool]:
+    """
+    Claim the single in-flight slot for (user, resource), e.g. one active generation task.
+    The slot expires on its own after `ttl_seconds`, so a stuck task never blocks forever.
+    Returns None when Redis is unavailable so the caller can fall back to the database.
+    """
+    if redis_client is None:
+        return None
+    try:
+        return bool(redis_client.set(f"slot:{resource}:{user_id}", holder, nx=True, ex=ttl_seconds))
+    except Exception as e:
+        logger.error(f"Redis quota ledger error: {e}")
+        return None
+
+
+def release_slot(user_id: int, resource: str, holder: str) -> None:
+    """Free the slot if `holder` still holds it; a late, stale holder can't free a newer one's slot."""
+    if redis_client is None:
+        return
+    try:
+        _release_slot(keys=[f"slot:{resource}:{user_id}"], args=[holder])
+    except Exception as e:
+        logger.error(f"Redis quota ledger error: {e}")
+
+
+def release_generation(user_id: int, task_type: str, task_id: str, failed: bool) -> None:
+    """Free the task's generation slot; refund its daily plan quota unit if the task failed."""
+    release_slot(user_id, f"generate:{task_type}", task_id)
+    if failed:
+        release_quota(user_id, f"plan:{task_type}", task_id)
@@ -0,0 +1,38 @@
+"""
+Read-your-writes guard for replica reads.
+
+After a user's write request succeeds, their reads are pinned to the primary
+for READ_YOUR_WRITES_SECONDS, long enough for the replicas to catch up, so a
+GET right after a POST never shows the state from before it. Other users keep
+reading from the replicas. Fails closed: if Redis can't be reached, reads go
+to the primary.
+"""
+import logging
+
+from ..core.config import settings
+from .rate_limit import redis_client
+
+logger = logging.getLogger(__name__)
+
+
+def _key(user_id: int) -> str:
+    return f"ryw:{user_id}"
+
+
+def pin(user_id: int) -> None:
+    if redis_client is None:
+        return
+    try:
+        redis_client.set(_key(user_id), 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+    except Exception as e:
+        logger.error(f"Redis read-your-writes error: {e}")
+
+
+def is_pinned(user_id: int) -> bool:
+    if redis_client is None:
+        return True
+    try:
+        return bool(redis_client.exists(_key(user_id)))
+    except Exception as e:
+        logger.error(f"Redis read-your-writes error, reading from the primary: {e}")
+        return True
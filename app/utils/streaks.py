@@ -0,0 +1,249 @@
+"""
+Bitmap-backed streak engine.
+
+Each user's active days are kept as a little-endian bitset in
+`user_streaks.activity_bitmap`: bit n is set when the user completed at least
+one exercise on STREAK_EPOCH + n days. Setting or clearing a day is O(1), and
+streak lengths are run-length queries over 64-bit words, so days can be logged
+in any order. The other UserStreak columns are a projection of the bitmap.
+
+Rebuild every bitmap from daily_logs with:
+    python -m app.utils.streaks
+"""
+import logging
+import struct
+import time
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Optional
+
+from sqlalchemy import func, or_, update
+from sqlalchemy.orm import Session
+
+from ..core.database import dialect_insert
+from ..models import models
+from . import leaderboard
+
+logger = logging.getLogger(__name__)
+
+STREAK_EPOCH = date(2020, 1, 1)
+
+_WORD_BITS = 64
+_FULL_WORD = (1 << _WORD_BITS) - 1
+
+
+def day_index(day: date) -> int:
+    """Bit position of `day` in the bitmap."""
+    index = (day - STREAK_EPOCH).days
+    if index < 0:
+        raise ValueError(f"Dates before {STREAK_EPOCH.isoformat()} can't be tracked")
+    return index
+
+
+def _set_bit(bits: bytearray, index: int) -> None:
+    byte, bit = divmod(index, 8)
+    if byte >= len(bits):
+        bits.extend(b"\x00" * (byte + 1 - len(bits)))
+    bits[byte] |= 1 << bit
+
+
+def set_day(bitmap: Optional[bytes], day: date, active: bool) -> bytes:
+    """Return `bitmap` with `day` marked active or inactive."""
+    index = day_index(day)
+    bits = bytearray(bitmap or b"")
+    if active:
+        _set_bit(bits, index)
+    else:
+        byte, bit = divmod(index, 8)
+        if byte < len(bits):
+            bits[byte] &= ~(1 << bit) & 0xFF
+    return bytes(bits)
+
+
+def is_active(bitmap: Optional[bytes], day: date) -> bool:
+    index = (day - STREAK_EPOCH).days
+    byte, bit = divmod(index, 8)
+    return 0 <= index and byte < len(bitmap or b"") and bool(bitmap[byte] >> bit & 1)
+
+
+def _trailing_ones(word: int) -> int:
+    return (word ^ (word + 1)).bit_length() - 1
+
+
+def _leading_ones(word: int) -> int:
+    return _WORD_BITS - (~word & _FULL_WORD).bit_length()
+
+
+def _longest_run_in_word(word: int) -> int:
+    length = 0
+    while word:
+        word &= word >> 1
+        length += 1
+    return length
+
+
+def longest_run(bitmap: Optional[bytes]) -> int:
+    """Longest run of consecutive active days, scanning the bitmap a word at a time."""
+    if not bitmap:
+        return 0
+    padded = bitmap + b"\x00" * (-len(bitmap) % 8)
+    best = run = 0
+    for (word,) in struct.iter_unpack("<Q", padded):
+        if word == _FULL_WORD:
+            run += _WORD_BITS
+            continue
+        if word == 0:
+            best = max(best, run)
+            run = 0
+            continue
+        # Low bits continue the run carried over from the previous (earlier) word
+        best = max(best, run + _trailing_ones(word), _longest_run_in_word(word))
+        run = _leading_ones(word)
+    return max(best, run)
+
+
+def last_run(bitmap: Optional[bytes]) -> tuple:
+    """Length and end date of the run ending at the latest active day."""
+    value = int.from_bytes(bitmap or b"", "little")
+    if not value:
+        return 0, None
+    last = value.bit_length() - 1
+    gaps = ~value & ((1 << (last + 1)) - 1)
+    return last + 1 - gaps.bit_length(), STREAK_EPOCH + timedelta(days=last)
+
+
+def projection(bitmap: Optional[bytes], today: Optional[date] = None) -> dict:
+    """
+    UserStreak column values derived from the bitmap. The current streak is the
+    run ending at the last active day, or 0 once that day is before yesterday.
+    """
+    today = today or date.today()
+    run, last_active = last_run(bitmap)
+    if last_active is None or last_active < today - timedelta(days=1):
+        run = 0
+    return {
+        "current_streak": run,
+        "longest_streak": longest_run(bitmap),
+        "last_active_date": last_active,
+        "total_workouts_completed": int.from_bytes(bitmap or b"", "little").bit_count(),
+    }
+
+
+def apply_projection(streak: models.UserStreak, today: Optional[date] = None) -> models.UserStreak:
+    for column, value in projection(streak.activity_bitmap, today).items():
+        setattr(streak, column, value)
+    return streak
+
+
+def rebuild_all_streaks(db: Session, batch_size: int = 1000) -> int:
+    """
+    Rebuild every user's bitmap and projection from daily_logs in one ordered pass,
+    inside a single transaction. Users without any active day end up zeroed.
+    Returns the number of users with at least one active day.
+    """
+    today = date.today()
+    columns = ("activity_bitmap", *projection(None).keys())
+
+    def flush(rows):
+        stmt = dialect_insert(db, models.UserStreak).values(rows)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id"],
+                set_={
+                    **{column: getattr(stmt.excluded, column) for column in columns},
+                    "updated_at": func.now(),
+                },
+            )
+        )
+
+    # Start from zero so users whose logs were all cleared or deleted don't keep a streak
+    db.query(models.UserStreak).update(
+        {"activity_bitmap": b"", **projection(None, today)}, synchronize_session=False
+    )
+
+    active_days = (
+        db.query(models.DailyLog.user_id, models.DailyLog.log_date)
+        .filter(
+            models.DailyLog.log_date >= STREAK_EPOCH,
+            func.json_array_length(models.DailyLog.completed_exercises) > 0,
+        )
+        .order_by(models.DailyLog.user_id)
+        .yield_per(batch_size)
+    )
+
+    users = 0
+    pending = []
+    for user_id, rows in groupby(active_days, key=lambda row: row.user_id):
+        bits = bytearray()
+        for row in rows:
+            _set_bit(bits, day_index(row.log_date))
+        bitmap = bytes(bits)
+        pending.append({"user_id": user_id, "activity_bitmap": bitmap, **projection(bitmap, today)})
+        users += 1
+        if len(pending) >= batch_size:
+            flush(pending)
+            pending = []
+    if pending:
+        flush(pending)
+
+    db.commit()
+    return users
+
+
+def expire_stale_streaks(db: Session, today: Optional[date] = None, batch_size: int = 10000) -> dict:
+    """
+    Zero `current_streak` for every user whose last active day is before
+    yesterday. Runs one set-based UPDATE per user_id range of `batch_size`,
+    committing each so row locks stay short, and pushes the zeros to the
+    leaderboards. Returns the affected row count and run timing.
+    """
+    started = time.monotonic()
+    cutoff = (today or date.today()) - timedelta(days=1)
+    lowest, highest = db.query(
+        func.min(models.UserStreak.user_id), func.max(models.UserStreak.user_id)
+    ).one()
+
+    expired = batches = 0
+    if lowest is not None:
+        for start in range(lowest, highest + 1, batch_size):
+            # The predicate is re-checked under the row lock, so a user who
+            # logs a workout while the job runs keeps their new streak
+            result = db.execute(
+                update(models.UserStreak)
+                .where(
+                    models.UserStreak.user_id >= start,
+                    models.UserStreak.user_id < start + batch_size,
+                    models.UserStreak.current_streak > 0,
+                    or_(
+                        models.UserStreak.last_active_date < cutoff,
+                        models.UserStreak.last_active_date.is_(None),
+                    ),
+                )
+                .values(current_streak=0)
+                .returning(models.UserStreak.user_id)
+                .execution_options(synchronize_session=False)
+            )
+            user_ids = result.scalars().all()
+            db.commit()
+            leaderboard.record_streaks(user_ids, 0)
+            expired += len(user_ids)
+            batches += 1
+
+    return {
+        "expired": expired,
+        "batches": batches,
+        "cutoff": cutoff.isoformat(),
+        "duration_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    from ..core.database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        count = rebuild_all_streaks(session)
+        logger.info(f"Rebuilt streak bitmaps for {count} active users from daily_logs")
+    finally:
+        session.close()
@@ -0,0 +1,116 @@
+"""
+Vectorized body-metric aggregation: calendar buckets, exponential moving
+average and a least-squares weight trend, computed with NumPy over a user's
+whole series in one pass.
+"""
+import math
+from typing import Optional, Sequence
+
+import numpy as np
+
+# EMA blocks are solved in closed form, which divides by decay ** k. Blocks are
+# at most _EMA_BLOCK long, and shorter for large alphas (small decays), so that
+# decay ** -k stays below _EMA_MAX_SCALE, far from the float64 maximum.
+_EMA_BLOCK = 128
+_EMA_MAX_SCALE = 1e100
+
+
+def _ema_block_length(decay: float) -> int:
+    if decay <= 0.0:
+        return 1
+    if decay >= 1.0:
+        return _EMA_BLOCK
+    return max(1, min(_EMA_BLOCK, int(math.log(_EMA_MAX_SCALE) / -math.log(decay))))
+
+
+def ema(values: np.ndarray, alpha: float) -> np.ndarray:
+    """Exponential moving average (seeded with the first value), vectorized per block."""
+    out = np.empty(len(values), dtype=float)
+    if not len(values):
+        return out
+    decay = 1.0 - alpha
+    prev = float(values[0])
+    block_length = _ema_block_length(decay)
+    for start in range(0, len(values), block_length):
+        block = values[start:start + block_length]
+        k = np.arange(len(block))
+        powers = decay ** k
+        # ema_k = decay^(k+1) * prev + alpha * sum_{i<=k} decay^(k-i) * x_i
+        weighted = np.cumsum(block / powers) * powers * alpha
+        out[start:start + len(block)] = weighted + prev * decay ** (k + 1)
+        prev = out[start + len(block) - 1]
+    return out
+
+
+def _bucket_keys(days: np.ndarray, bucket: str) -> np.ndarray:
+    if bucket == "month":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    # ISO weeks start on Monday; 1970-01-01 was a Thursday
+    offsets = (days.astype(np.int64) + 3) % 7
+    return days - offsets.astype("timedelta64[D]")
+
+
+def _bucket_mean(values: np.ndarray, inverse: np.ndarray, size: int) -> list:
+    present = ~np.isnan(values)
+    sums = np.bincount(inverse[present], weights=values[present], minlength=size)
+    counts = np.bincount(inverse[present], minlength=size)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+    return [round(float(m), 2) if c else None for m, c in zip(means, counts)]
+
+
+def summarize_body_metrics(
+    logged_at: Sequence,
+    weight_kg: Sequence[Optional[float]],
+    body_fat_pct: Sequence[Optional[float]],
+    bucket: str = "week",
+    alpha: float = 0.25,
+) -> dict:
+    """
+    Aggregate a date-ordered body-metric series.
+
+    Returns per-bucket averages (with the weight EMA as of each bucket's last
+    weigh-in), the latest EMA value and the linear weight trend in kg/week.
+    """
+    days = np.array(logged_at, dtype="datetime64[D]")
+    weights = np.array([np.nan if w is None else w for w in weight_kg], dtype=float)
+    fats = np.array([np.nan if f is None else f for f in body_fat_pct], dtype=float)
+
+    keys, inverse, entries = np.unique(
+        _bucket_keys(days, bucket), return_inverse=True, return_counts=True
+    )
+    avg_weight = _bucket_mean(weights, inverse, len(keys))
+    avg_fat = _bucket_mean(fats, inverse, len(keys))
+
+    has_weight = ~np.isnan(weights)
+    weigh_in_days = days[has_weight]
+    smoothed = ema(weights[has_weight], alpha)
+
+    # EMA value at the last weigh-in of each bucket
+    bucket_ema = [None] * len(keys)
+    if len(smoothed):
+        weigh_in_buckets = inverse[has_weight]
+        last_in_bucket = np.flatnonzero(np.r_[weigh_in_buckets[1:] != weigh_in_buckets[:-1], True])
+        for position in last_in_bucket:
+            bucket_ema[weigh_in_buckets[position]] = round(float(smoothed[position]), 2)
+
+    slope_per_week = None
+    if len(np.unique(weigh_in_days)) >= 2:
+        x = (weigh_in_days - weigh_in_days[0]).astype(float)
+        slope_per_day, _ = np.polyfit(x, weights[has_weight], 1)
+        slope_per_week = round(float(slope_per_day) * 7, 3)
+
+    return {
+        "buckets": [
+            {
+                "period_start": keys[i].item(),
+                "entries": int(entries[i]),
+                "avg_weight_kg": avg_weight[i],
+                "avg_body_fat_pct": avg_fat[i],
+                "ema_weight_kg": bucket_ema[i],
+            }
+            for i in range(len(keys))
+        ],
+        "latest_ema_weight_kg": round(float(smoothed[-1]), 2) if len(smoothed) else None,
+        "slope_kg_per_week": slope_per_week,
+    }
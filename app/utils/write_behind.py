@@ -0,0 +1,215 @@
+"""
+Write-behind persistence for chat turns.
+
+The chat endpoint appends each turn to a Redis stream and returns without
+waiting on a database commit; `created_at` comes from the app clock. A Celery
+beat task drains the stream through a consumer group and bulk-inserts batches
+into chat_history with one multi-row INSERT.
+
+Durability:
+  * A turn is only acknowledged to the client once XADD has succeeded. The
+    stream lives on its own Redis (WRITE_BEHIND_REDIS_URL) running appendonly +
+    appendfsync always (docker-compose.yml), so an acknowledged turn is on disk
+    before the response is sent. The shared Redis (broker, cache, quota ledger)
+    only fsyncs every second.
+  * If Redis is unreachable the endpoint writes the row synchronously instead.
+  * Stream entries are XACKed only after the batch is committed. A drainer that
+    dies mid-batch leaves its entries pending; they are reclaimed after
+    CLAIM_IDLE_MS and inserted again.
+  * Every turn carries a unique write_id, fixed together with its created_at
+    when it is queued, and inserts are ON CONFLICT DO NOTHING on
+    (write_id, created_at), so redelivery never duplicates a row.
+
+Turns reach chat_history (and the retrieval index) within one drain interval.
+Until then each queued turn is also kept in a per-user list, written in the
+same MULTI as the XADD and trimmed once the turn is committed, and
+merge_queued adds those turns to what the prompt context and the history
+endpoint read from the database, so a user always sees their latest turn.
+"""
+import json
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+import redis
+from redis.exceptions import ResponseError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import dialect_insert
+from ..models import models
+from . import chat_index
+
+logger = logging.getLogger(__name__)
+
+try:
+    stream_client = redis.from_url(settings.WRITE_BEHIND_REDIS_URL or settings.REDIS_URL, decode_responses=True)
+except Exception as e:
+    logger.error(f"Failed to connect to Redis for write-behind: {e}")
+    stream_client = None
+
+CHAT_STREAM = "writebehind:chat_history"
+GROUP = "db-writer"
+BATCH_SIZE = 500
+# Entries pending this long belong to a drainer that died; take them over
+CLAIM_IDLE_MS = 60 * 1000
+DRAIN_INTERVAL_SECONDS = 1.0
+# Safety net for the per-user lists of queued turns, which the drain trims
+QUEUED_TTL_SECONDS = 24 * 60 * 60
+
+
+def _queued_key(user_id: int) -> str:
+    return f"writebehind:queued:{user_id}"
+
+
+def _consumer() -> str:
+    # Resolved per call: prefork workers import this module before forking
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def enqueue_chat_turn(user_id: int, message: str, response: str) -> Optional[datetime]:
+    """
+    Queue a chat turn for insertion. Returns its created_at, or None if Redis
+    couldn't take it and the caller must write the row itself.
+    """
+    if stream_client is None:
+        return None
+    created_at = datetime.now(timezone.utc)
+    payload = {
+        "write_id": uuid.uuid4().hex,
+        "user_id": user_id,
+        "message": message,
+        "response": response,
+        "created_at": created_at.isoformat(),
+    }
+    encoded = json.dumps(payload)
+    try:
+        pipe = stream_client.pipeline()
+        pipe.xadd(CHAT_STREAM, {"payload": encoded})
+        pipe.rpush(_queued_key(user_id), encoded)
+        pipe.expire(_queued_key(user_id), QUEUED_TTL_SECONDS)
+        pipe.execute()
+    except Exception as e:
+        logger.error(f"Redis write-behind error, writing synchronously: {e}")
+        return None
+    return created_at
+
+
+def queued_turns(user_id: int) -> List[models.ChatHistory]:
+    """
+    The user's turns still waiting in the stream, oldest first, as unsaved
+    ChatHistory rows. Their id is 0, which orders them before any stored turn
+    with the same created_at, so they can end a keyset page.
+    """
+    if stream_client is None:
+        return []
+    try:
+        encoded = stream_client.lrange(_queued_key(user_id), 0, -1)
+    except Exception as e:
+        logger.error(f"Redis write-behind error reading queued turns: {e}")
+        return []
+    turns = []
+    for item in encoded:
+        payload = json.loads(item)
+        payload["created_at"] = datetime.fromisoformat(payload["created_at"])
+        turns.append(models.ChatHistory(id=0, **payload))
+    return turns
+
+
+def _position(created_at: datetime, turn_id: int) -> tuple:
+    # SQLite hands back naive UTC timestamps
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return created_at, turn_id
+
+
+def merge_queued(
+    records: Sequence[models.ChatHistory], user_id: int, limit: int, before: Optional[Sequence] = None
+) -> List[models.ChatHistory]:
+    """
+    The newest `limit` turns among `records` (newest-first rows read from the
+    database) and the user's queued turns, newest first. With `before`, a
+    (created_at, id) keyset position, only queued turns older than it count.
+    """
+    stored = {record.write_id for record in records if record.write_id}
+    queued = [turn for turn in queued_turns(user_id) if turn.write_id not in stored]
+    if before is not None:
+        queued = [turn for turn in queued if _position(turn.created_at, turn.id) < _position(*before)]
+    if not queued:
+        return list(records)
+    return sorted(
+        [*records, *queued], key=lambda turn: _position(turn.created_at, turn.id), reverse=True
+    )[:limit]
+
+
+def _ensure_group() -> None:
+    try:
+        stream_client.xgroup_create(CHAT_STREAM, GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+
+def _write_rows(db: Session, rows: list) -> None:
+    stmt = dialect_insert(db, models.ChatHistory).values(rows)
+    db.execute(stmt.on_conflict_do_nothing(index_elements=["write_id", "created_at"]))
+    db.commit()
+
+
+def _insert(db: Session, entries: list) -> None:
+    rows = []
+    for _, fields in entries:
+        payload = json.loads(fields["payload"])
+        payload["created_at"] = datetime.fromisoformat(payload["created_at"])
+        rows.append(payload)
+    try:
+        _write_rows(db, rows)
+    except IntegrityError:
+        # One bad row (e.g. the user was deleted meanwhile) mustn't block the stream;
+        # retry row by row and drop only the rows that can never be inserted
+        db.rollback()
+        for row in rows:
+            try:
+                _write_rows(db, [row])
+            except IntegrityError as e:
+                db.rollback()
+                logger.error(f"Dropping queued chat turn {row['write_id']}: {e}")
+    chat_index.note_written({row["user_id"] for row in rows})
+
+    entry_ids = [entry_id for entry_id, _ in entries]
+    pipe = stream_client.pipeline()
+    pipe.xack(CHAT_STREAM, GROUP, *entry_ids)
+    pipe.xdel(CHAT_STREAM, *entry_ids)
+    for (_, fields), row in zip(entries, rows):
+        pipe.lrem(_queued_key(row["user_id"]), 1, fields["payload"])
+    pipe.execute()
+
+
+def drain(db: Session, max_batches: int = 20) -> int:
+    """Insert queued chat turns in batches of BATCH_SIZE. Returns the number of turns written."""
+    if stream_client is None:
+        return 0
+    _ensure_group()
+
+    written = 0
+    # Entries left pending by a drainer that died before acknowledging them
+    _, stale, _ = stream_client.xautoclaim(
+        CHAT_STREAM, GROUP, _consumer(), CLAIM_IDLE_MS, start_id="0-0", count=BATCH_SIZE
+    )
+    stale = [entry for entry in stale if entry[1]]
+    if stale:
+        _insert(db, stale)
+        written += len(stale)
+
+    for _ in range(max_batches):
+        response = stream_client.xreadgroup(GROUP, _consumer(), {CHAT_STREAM: ">"}, count=BATCH_SIZE)
+        entries = response[0][1] if response else []
+        if not entries:
+            break
+        _insert(db, entries)
+        written += len(entries)
+    return written
@@ -1,10 +1,17 @@
 import logging
-from celery import Celery
+from datetime import date
+from celery import Celery, Task
+from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy import exc
+from sqlalchemy.orm import Session, scoped_session
 from app.core.config import settings
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, dispose_engines
 from app.models import models
 from app.core.langraph_workflow import workflow_manager
-from app.utils import helpers
+from app.utils import (
+    adherence, chat_archive, current_plans, forecast, helpers, leaderboard, quota, streaks, write_behind
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,12 +31,103 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    beat_schedule={
+        "drain-chat-write-behind": {
+            "task": "app.worker.drain_write_behind_task",
+            "schedule": write_behind.DRAIN_INTERVAL_SECONDS,
+        },
+        "expire-stale-streaks": {
+            "task": "app.worker.expire_stale_streaks_task",
+            "schedule": crontab(hour=0, minute=5),
+        },
+        "open-adherence-day": {
+            "task": "app.worker.open_adherence_day_task",
+            "schedule": crontab(hour=0, minute=15),
+        },
+        "maintain-chat-partitions": {
+            "task": "app.worker.maintain_chat_partitions_task",
+            "schedule": crontab(hour=1, minute=0),
+        },
+        "forecast-goals": {
+            "task": "app.worker.forecast_goals_task",
+            "schedule": crontab(hour=0, minute=30),
+        },
+    },
 )
 
-@celery_app.task(name="app.worker.generate_nutrition_plan_task")
-def generate_nutrition_plan_task(task_id: str, user_id: int):
+# Errors from a dropped or unreachable database (or an exhausted pool): worth a retry
+DB_CONNECTION_ERRORS = (exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+
+
+@worker_process_init.connect
+def _init_worker_process(**kwargs):
+    # Prefork children inherit the parent's pools; never share those sockets
+    dispose_engines(close=False)
+
+
+@worker_process_shutdown.connect
+def _shutdown_worker_process(**kwargs):
+    dispose_engines()
+
+
+# One session per worker thread, released after every task
+TaskSession = scoped_session(SessionLocal)
+
+
+class DatabaseTask(Task):
+    """
+    Base for tasks that use the database. `self.db` is the worker's scoped
+    session; it is closed after each run, retries included. Connection errors
+    that escape the task retry it with exponential backoff.
+    """
+
+    autoretry_for = DB_CONNECTION_ERRORS
+    max_retries = 3
+    retry_backoff = True
+    retry_jitter = True
+
+    @property
+    def db(self) -> Session:
+        return TaskSession()
+
+    def retry(self, *args, **kwargs):
+        # The failed session may hold a dead connection; the next attempt starts clean
+        TaskSession.remove()
+        return super().retry(*args, **kwargs)
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        TaskSession.remove()
+
+
+def _profile_and_goals(db: Session, user_id: int):
+    """The user's profile and goals in one query, or (None, None) if either is missing."""
+    row = (
+        db.query(models.UserProfile, models.UserGoals)
+        .join(models.UserGoals, models.UserGoals.user_id == models.UserProfile.user_id)
+        .filter(models.UserProfile.user_id == user_id)
+        .first()
+    )
+    return row if row else (None, None)
+
+
+def _mark_failed(task_id: str, error: str) -> None:
+    """
+    Record a generation task as FAILED. Uses a fresh session: the task's own
+    may be holding the dead connection that made it fail.
+    """
+    TaskSession.remove()
+    db = TaskSession()
+    task = db.query(models.GenerationTask).filter(models.GenerationTask.id == task_id).first()
+    if task:
+        task.status = "FAILED"
+        task.error = error
+        db.commit()
+
+
+@celery_app.task(name="app.worker.generate_nutrition_plan_task", base=DatabaseTask, bind=True)
+def generate_nutrition_plan_task(self, task_id: str, user_id: int):
     logger.info(f"Starting nutrition plan generation task {task_id} for user {user_id}")
-    db = SessionLocal()
+    db = self.db
     try:
         # Update task status to PROCESSING
         task = db.query(models.GenerationTask).filter(models.GenerationTask.id == task_id).first()
@@ -40,8 +138,7 @@ def generate_nutrition_plan_task(task_id: str, user_id: int):
         db.commit()
 
         # Get profile and goals
-        profile = db.query(models.UserProfile).filter(models.UserProfile.user_id == user_id).first()
-        goals = db.query(models.UserGoals).filter(models.UserGoals.user_id == user_id).first()
+        profile, goals = _profile_and_goals(db, user_id)
         if not profile or not goals:
             raise ValueError("User profile and goals must be set before generating a nutrition plan")
 
@@ -80,35 +177,34 @@ def generate_nutrition_plan_task(task_id: str, user_id: int):
         else:
             nutrition_json = nutrition_plan_data
 
-        # Store nutrition plan
-        nutrition_plan = models.NutritionPlan(
-            user_id=user_id,
-            plan_data=nutrition_json,
-        )
-        db.add(nutrition_plan)
+        # Store nutrition plan as the user's current version
+        current_plans.add_version(db, user_id, "nutrition", nutrition_json)
 
         # Update task status to SUCCESS
         task.status = "SUCCESS"
         task.result = {"nutrition_plan": nutrition_json}
         db.commit()
+        quota.release_generation(user_id, "nutrition", task_id, failed=False)
         logger.info(f"Nutrition plan generation task {task_id} succeeded")
 
     except Exception as e:
+        if isinstance(e, DB_CONNECTION_ERRORS) and self.request.retries < self.max_retries:
+            # DatabaseTask retries the whole task; the quota reservation stays held
+            raise
         logger.error(f"Nutrition plan generation task {task_id} failed: {str(e)}")
-        db.rollback()
-        task = db.query(models.GenerationTask).filter(models.GenerationTask.id == task_id).first()
-        if task:
-            task.status = "FAILED"
-            task.error = str(e)
-            db.commit()
-    finally:
-        db.close()
+        try:
+            _mark_failed(task_id, str(e))
+        except Exception as mark_error:
+            # Not retried: the generation itself already failed for good
+            logger.error(f"Could not mark task {task_id} FAILED: {mark_error}")
+        finally:
+            quota.release_generation(user_id, "nutrition", task_id, failed=True)
 
 
-@celery_app.task(name="app.worker.generate_workout_plan_task")
-def generate_workout_plan_task(task_id: str, user_id: int):
+@celery_app.task(name="app.worker.generate_workout_plan_task", base=DatabaseTask, bind=True)
+def generate_workout_plan_task(self, task_id: str, user_id: int):
     logger.info(f"Starting workout plan generation task {task_id} for user {user_id}")
-    db = SessionLocal()
+    db = self.db
     try:
         # Update task status to PROCESSING
         task = db.query(models.GenerationTask).filter(models.GenerationTask.id == task_id).first()
@@ -119,11 +215,8 @@ def generate_workout_plan_task(task_id: str, user_id: int):
         db.commit()
 
         # Get profile, goals, and nutrition plan
-        profile = db.query(models.UserProfile).filter(models.UserProfile.user_id == user_id).first()
-        goals = db.query(models.UserGoals).filter(models.UserGoals.user_id == user_id).first()
-        nutrition_plan = db.query(models.NutritionPlan).filter(
-            models.NutritionPlan.user_id == user_id
-        ).order_by(models.NutritionPlan.created_at.desc()).first()
+        profile, goals = _profile_and_goals(db, user_id)
+        nutrition_plan = current_plans.current_plan(db, user_id, "nutrition")
 
         if not profile or not goals or not nutrition_plan:
             raise ValueError("User profile, goals, and nutrition plan must be set before generating a workout plan")
@@ -166,26 +259,79 @@ def generate_workout_plan_task(task_id: str, user_id: int):
         else:
             workout_json = workout_plan_data
 
-        # Store workout plan
-        workout_plan = models.WorkoutPlan(
-            user_id=user_id,
-            plan_data=workout_json,
-        )
-        db.add(workout_plan)
+        # Store workout plan as the user's current version
+        current_plans.add_version(db, user_id, "workout", workout_json)
 
         # Update task status to SUCCESS
         task.status = "SUCCESS"
         task.result = {"workout_plan": workout_json}
         db.commit()
+        quota.release_generation(user_id, "workout", task_id, failed=False)
         logger.info(f"Workout plan generation task {task_id} succeeded")
 
     except Exception as e:
+        if isinstance(e, DB_CONNECTION_ERRORS) and self.request.retries < self.max_retries:
+            # DatabaseTask retries the whole task; the quota reservation stays held
+            raise
         logger.error(f"Workout plan generation task {task_id} failed: {str(e)}")
-        db.rollback()
-        task = db.query(models.GenerationTask).filter(models.GenerationTask.id == task_id).first()
-        if task:
-            task.status = "FAILED"
-            task.error = str(e)
-            db.commit()
-    finally:
-        db.close()
+        try:
+            _mark_failed(task_id, str(e))
+        except Exception as mark_error:
+            # Not retried: the generation itself already failed for good
+            logger.error(f"Could not mark task {task_id} FAILED: {mark_error}")
+        finally:
+            quota.release_generation(user_id, "workout", task_id, failed=True)
+
+
+@celery_app.task(name="app.worker.rebuild_leaderboards_task", base=DatabaseTask, bind=True)
+def rebuild_leaderboards_task(self):
+    """Rebuild the Redis streak leaderboards from user_streaks."""
+    count = leaderboard.rebuild_leaderboards(self.db)
+    logger.info(f"Rebuilt streak leaderboards for {count} users")
+
+
+@celery_app.task(name="app.worker.expire_stale_streaks_task", base=DatabaseTask, bind=True)
+def expire_stale_streaks_task(self):
+    """Nightly: zero the current streak of users who missed yesterday."""
+    stats = streaks.expire_stale_streaks(self.db)
+    logger.info(
+        f"Expired {stats['expired']} stale streaks (last active before {stats['cutoff']}) "
+        f"in {stats['batches']} batches, {stats['duration_ms']} ms"
+    )
+    return stats
+
+
+@celery_app.task(name="app.worker.forecast_goals_task", base=DatabaseTask, bind=True)
+def forecast_goals_task(self):
+    """Nightly: recompute and cache goal ETA forecasts for all active users."""
+    count = forecast.forecast_all_users(self.db)
+    logger.info(f"Cached goal forecasts for {count} users")
+    return count
+
+
+@celery_app.task(name="app.worker.open_adherence_day_task", base=DatabaseTask, bind=True)
+def open_adherence_day_task(self):
+    """Nightly: add today's scheduled-but-not-yet-done adherence rows for every user with a plan."""
+    today = date.today()
+    count = adherence.open_day(self.db, today)
+    logger.info(f"Opened daily adherence rows for {count} users for {today.isoformat()}")
+    return count
+
+
+@celery_app.task(name="app.worker.drain_write_behind_task", base=DatabaseTask, bind=True, ignore_result=True)
+def drain_write_behind_task(self):
+    """Batch-insert chat turns queued by the API (see app/utils/write_behind.py)."""
+    count = write_behind.drain(self.db)
+    if count:
+        logger.info(f"Wrote {count} queued chat turns")
+
+
+@celery_app.task(name="app.worker.maintain_chat_partitions_task", base=DatabaseTask, bind=True)
+def maintain_chat_partitions_task(self):
+    """Nightly: create upcoming chat_history partitions, archive cold months, apply retention."""
+    stats = chat_archive.maintain(self.db)
+    logger.info(
+        f"Archived {stats['archived_turns']} chat turns from {stats['archived_months']} months, "
+        f"dropped {stats['dropped_months']} expired partitions, purged {stats['purged_months']} archived months"
+    )
+    return stats
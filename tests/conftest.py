@@ -0,0 +1,51 @@
+"""
+Test setup: a throwaway SQLite database and an in-process fake Redis.
+
+Settings are read at import time, so the environment is prepared here, before
+any `app` module is imported.
+"""
+import os
+import tempfile
+
+import fakeredis
+import pytest
+import redis
+
+_db_dir = tempfile.mkdtemp(prefix="fitness-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_db_dir}/test.db")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("CHAT_ARCHIVE_DIR", f"{_db_dir}/archive")
+
+_fake_server = fakeredis.FakeServer()
+
+
+def _fake_from_url(url, **kwargs):
+    return fakeredis.FakeRedis(server=_fake_server, decode_responses=kwargs.get("decode_responses", False))
+
+
+redis.from_url = _fake_from_url
+redis.Redis.from_url = staticmethod(_fake_from_url)
+
+from app.core.database import SessionLocal, engine  # noqa: E402
+from app.models import models  # noqa: E402
+from app.utils.rate_limit import redis_client  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    redis_client.flushall()
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    account = models.User(email="alice@example.com", username="alice", full_name="Alice", hashed_password="x")
+    db.add(account)
+    db.commit()
+    return account
@@ -0,0 +1,43 @@
+from datetime import date
+from unittest import mock
+
+from app.models import models
+from app.utils import adherence, current_plans, plan_deltas
+
+MONDAY = date(2026, 10, 19)
+
+
+def _plan(monday_exercises):
+    return {"weekly_schedule": {"Monday": monday_exercises, "Tuesday": "Rest"}}
+
+
+def test_open_day_uses_current_plan_only(db, user):
+    for version in range(3):
+        current_plans.add_version(db, user.id, "workout", _plan(["squat"] * (version + 1)))
+    db.commit()
+    db.refresh(user)
+
+    with mock.patch.object(adherence.plan_deltas, "load", wraps=plan_deltas.load) as load:
+        assert adherence.open_day(db, MONDAY) == 1
+    loaded_ids = {plan_id for call in load.call_args_list for plan_id in call.args[2]}
+    assert loaded_ids == {user.current_workout_plan_id}
+
+    row = db.query(models.DailyAdherence).one()
+    assert (row.log_date, row.scheduled_count, row.completed_count, row.plan_id) == (
+        MONDAY, 3, 0, user.current_workout_plan_id
+    )
+
+
+def test_open_day_keeps_existing_rows_and_skips_users_without_plan(db, user):
+    other = models.User(email="bob@example.com", username="bob", full_name="Bob", hashed_password="x")
+    db.add(other)
+    current_plans.add_version(db, user.id, "workout", _plan(["squat", "lunge"]))
+    db.commit()
+    db.refresh(user)
+    adherence.record_days(db, user.id, [(MONDAY, 2, user.current_workout_plan_id)])
+    db.commit()
+
+    adherence.open_day(db, MONDAY)
+
+    rows = db.query(models.DailyAdherence).all()
+    assert [(row.user_id, row.completed_count) for row in rows] == [(user.id, 2)]
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from app.models import models
+from app.utils import chat_index
+
+NOW = datetime(2026, 10, 19, 12, 0, 0)
+
+
+def _turn(db, user, chat_id, message, created_at):
+    turn = models.ChatHistory(id=chat_id, user_id=user.id, message=message, response="noted", created_at=created_at)
+    db.add(turn)
+    db.commit()
+    return turn
+
+
+def test_search_ranks_by_similarity():
+    index = chat_index.ChatIndex()
+    index.add(1, "my knee hurts when I squat", "try box squats", NOW)
+    index.add(2, "how much protein after lifting", "about 30 g", NOW)
+    index.add(3, "running shoes for flat feet", "look for stability shoes", NOW)
+
+    assert index.search("knee pain during squats", 2) == [1]
+    assert index.search("protein shake", 3, exclude_ids=[2]) == []
+    assert index.search("completely unrelated words", 3) == []
+
+
+def test_memory_follows_history_size():
+    index = chat_index.ChatIndex()
+    index.add(1, "deadlift form", "keep a neutral spine", NOW)
+    index._merge()
+    packed_bytes = sum(part.nbytes for part in index._packed)
+    assert packed_bytes < 2_000
+
+
+def test_catch_up_indexes_turns_committed_out_of_id_order(db, user):
+    chat_index._indexes.clear()
+    _turn(db, user, 2, "best stretches for hamstrings", NOW)
+    assert chat_index.relevant_turn_ids(db, user.id, "hamstring stretches", 5) == [2]
+
+    # A write-behind batch commits an earlier turn with a lower id afterwards
+    _turn(db, user, 1, "creatine loading phase", NOW - timedelta(seconds=30))
+    chat_index.note_written([user.id])
+    assert chat_index.relevant_turn_ids(db, user.id, "creatine loading", 5) == [1]
+    assert len(chat_index._indexes[user.id]) == 2
+
+
+def test_new_turns_are_searched_without_repacking():
+    index = chat_index.ChatIndex()
+    for n in range(200):
+        index.add(n, f"filler question {n}", "filler answer", NOW)
+    assert index.search("filler", 1)
+    packed = index._packed
+
+    index.add(500, "my knee hurts when I squat", "try box squats", NOW)
+    index.add(501, "how much protein after lifting", "about 30 g", NOW)
+    assert index.search("knee pain during squats", 2) == [500]
+    assert index.search("protein after lifting", 1) == [501]
+    assert index._packed is packed
+
+    for n in range(chat_index.MERGE_MIN_TURNS):
+        index.add(1000 + n, f"more filler {n}", "more", NOW)
+    assert index.search("knee pain during squats", 1) == [500]
+    assert index._packed is not packed and index._packed_count == len(index)
+
+
+def test_catch_up_skipped_until_another_writer_commits(db, user):
+    chat_index._indexes.clear()
+    _turn(db, user, 1, "best stretches for hamstrings", NOW)
+    chat_index.note_written([user.id])
+    assert chat_index.relevant_turn_ids(db, user.id, "hamstring stretches", 5) == [1]
+
+    with mock.patch.object(chat_index, "_catch_up", wraps=chat_index._catch_up) as catch_up:
+        # Committed and indexed by this process
+        turn = _turn(db, user, 2, "creatine loading phase", NOW)
+        chat_index.add_turn(user.id, turn.id, turn.message, turn.response, turn.created_at)
+        assert chat_index.relevant_turn_ids(db, user.id, "creatine loading", 5) == [2]
+        assert catch_up.call_count == 0
+
+        # Committed by another process
+        _turn(db, user, 3, "foam rolling before runs", NOW)
+        chat_index.note_written([user.id])
+        assert chat_index.relevant_turn_ids(db, user.id, "foam rolling", 5) == [3]
+        assert catch_up.call_count == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from app.utils import faq_cache
+
+
+@pytest.mark.parametrize("message", [
+    "What is progressive overload?",
+    "How does creatine work?",
+    "Explain the difference between HIIT and LISS",
+    "Tell me about delayed onset muscle soreness",
+    "Is creatine safe?",
+    "What are the benefits of foam rolling?",
+])
+def test_definition_questions_are_generic(message):
+    assert faq_cache.is_generic(message)
+
+
+@pytest.mark.parametrize("message", [
+    "How many calories should I eat?",
+    "How much protein do I need?",
+    "How much weight should I lose per week?",
+    "What should I eat for dinner?",
+    "How many sets should I do for squats",
+    "How much water should I drink?",
+    "Can we swap leg day for cardio?",
+    "Why is my bench press stalling?",
+    "What's on my plan today?",
+    "Creatine safe?",
+])
+def test_personal_questions_are_not_generic(message):
+    assert not faq_cache.is_generic(message)
+
+
+def test_rewordings_share_a_key():
+    assert faq_cache.normalize("What is progressive overload?") == faq_cache.normalize(
+        "Can you please explain progressive overload"
+    )
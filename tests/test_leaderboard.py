@@ -0,0 +1,27 @@
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.endpoints import tracking
+from app.utils import leaderboard
+
+
+def test_boards_are_read_in_streak_order(db, user):
+    for user_id, streak in ((user.id, 3), (101, 7), (102, 1)):
+        leaderboard.record_streak(user_id, streak)
+
+    assert leaderboard.top(leaderboard.GLOBAL_BOARD, 2) == [(1, 101, 7), (2, user.id, 3)]
+    assert leaderboard.rank(leaderboard.GLOBAL_BOARD, user.id) == (2, 3)
+    assert leaderboard.around(leaderboard.GLOBAL_BOARD, 102, 1) == [(2, user.id, 3), (3, 102, 1)]
+
+
+@pytest.mark.parametrize("read", [
+    lambda user, db: tracking.get_leaderboard(board="global", limit=10, current_user=user, db=db),
+    lambda user, db: tracking.get_leaderboard_around_me(board="global", radius=5, current_user=user, db=db),
+])
+def test_leaderboards_unavailable_without_redis(db, user, read):
+    with mock.patch.object(leaderboard, "redis_client", None):
+        with pytest.raises(HTTPException) as raised:
+            read(user, db)
+    assert raised.value.status_code == 503
@@ -0,0 +1,19 @@
+from unittest import mock
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+
+from app.core.config import settings
+
+
+def test_migrations_run_on_sqlite(tmp_path):
+    url = f"sqlite:///{tmp_path}/migrations.db"
+    config = Config("alembic.ini")
+    with mock.patch.object(settings, "DATABASE_URL", url):
+        command.upgrade(config, "head")
+        foreign_keys = inspect(create_engine(url)).get_foreign_keys("users")
+        assert {fk["name"] for fk in foreign_keys} == {
+            "fk_users_current_nutrition_plan_id", "fk_users_current_workout_plan_id"
+        }
+        command.downgrade(config, "base")
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import Response
+from sqlalchemy import event, insert
+
+from app.api.endpoints import chat, feedback
+from app.core.database import engine
+from app.models import models
+from app.utils import pagination
+
+TURNS = 1000
+PAGE = 50
+
+
+@pytest.fixture
+def statements():
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append(context.compiled.statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    yield captured
+    event.remove(engine, "before_cursor_execute", capture)
+
+
+@pytest.mark.parametrize("model, read_page", [
+    (models.ChatHistory, lambda response, user, db, cursor: chat.get_chat_history(
+        response, current_user=user, db=db, limit=PAGE, cursor=cursor
+    )),
+    (models.PlanFeedback, lambda response, user, db, cursor: feedback.get_feedback_history(
+        response, plan_type=None, skip=0, limit=PAGE, cursor=cursor, current_user=user, db=db
+    )),
+])
+def test_deep_keyset_pages_match_offset_without_offset(db, user, statements, model, read_page):
+    start = datetime(2026, 1, 1)
+    # Pairs of rows share a created_at, so the id tiebreak matters
+    rows = [{"user_id": user.id, "created_at": start + timedelta(minutes=n // 2)} for n in range(TURNS)]
+    if model is models.ChatHistory:
+        rows = [{**row, "message": "question", "response": "answer"} for row in rows]
+    else:
+        rows = [{**row, "plan_type": "workout", "feedback_text": "more rest"} for row in rows]
+    db.execute(insert(model), rows)
+    db.commit()
+
+    by_offset = db.query(model.id).filter(model.user_id == user.id).order_by(
+        model.created_at.desc(), model.id.desc()
+    )
+    cursor = None
+    for depth in range(0, TURNS, PAGE):
+        response = Response()
+        del statements[:]
+        page = read_page(response, user, db, cursor)
+        # SQLite always renders an OFFSET clause; the value is what matters
+        assert all(not getattr(statement, "_offset", None) for statement in statements)
+        assert [row.id for row in page] == [row.id for row in by_offset.offset(depth).limit(PAGE)]
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+    assert cursor is not None
+    response = Response()
+    assert read_page(response, user, db, cursor) == []
+    assert pagination.NEXT_CURSOR_HEADER not in response.headers
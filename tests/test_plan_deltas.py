@@ -0,0 +1,20 @@
+from app.models import models
+from app.utils import current_plans, plan_deltas
+
+
+def _plan(calories):
+    return {"calories": calories, "meals": [{"name": f"meal {n}", "items": ["oats"] * 20} for n in range(5)]}
+
+
+def test_demoted_versions_store_sql_null(db, user):
+    ids = [current_plans.add_version(db, user.id, "nutrition", _plan(2000 + n)).id for n in range(3)]
+    db.commit()
+
+    Plan = models.NutritionPlan
+    delta_ids = {row.id for row in db.query(Plan.id).filter(Plan.base_plan_id.isnot(None))}
+    assert delta_ids == {ids[1]}
+    # Compared in SQL, so a JSON 'null' would not match
+    assert {row.id for row in db.query(Plan.id).filter(Plan.plan_data.is_(None))} == delta_ids
+
+    loaded = plan_deltas.load(db, Plan, ids)
+    assert [loaded[plan_id] for plan_id in ids] == [_plan(2000 + n) for n in range(3)]
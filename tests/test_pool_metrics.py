@@ -0,0 +1,30 @@
+import pytest
+from sqlalchemy.pool import QueuePool
+
+from app.core import database, pool_metrics
+
+
+@pytest.fixture
+def engines():
+    created = []
+    yield created
+    for name, db_engine in created:
+        pool_metrics._engines.pop(name, None)
+        db_engine.dispose()
+
+
+def test_sqlite_keeps_default_pool(engines, tmp_path):
+    db_engine = database._create_engine(f"sqlite:///{tmp_path}/dev.db", "test_sqlite")
+    engines.append(("test_sqlite", db_engine))
+
+    assert type(db_engine.pool) is QueuePool
+    assert "test_sqlite" not in pool_metrics._engines
+    assert 'pool="test_sqlite"' not in pool_metrics.render()
+
+
+def test_server_database_is_instrumented(engines):
+    db_engine = database._create_engine("postgresql+psycopg2://user@localhost/test", "test_server")
+    engines.append(("test_server", db_engine))
+
+    assert isinstance(db_engine.pool, pool_metrics.InstrumentedQueuePool)
+    assert 'db_pool_checkouts_total{pool="test_server"} 0' in pool_metrics.render()
@@ -0,0 +1,132 @@
+"""
+EXPLAIN regression checks: the latest-plan and active-task lookups must use
+the composite indexes from migration a7b8c9d0e1f2, and the chat and feedback
+history pages the keyset indexes from d4e5f6a7b8c9, rather than scan or sort
+the table. The tables are seeded and analyzed so the planner picks the index
+on its own. Runs on the configured test database (SQLite by default, Postgres
+when DATABASE_URL points at one).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, text
+
+from app.models import models
+from app.utils import current_plans, pagination
+
+
+def _plan(session, query) -> str:
+    bind = session.get_bind()
+    dialect = type(bind.dialect)(paramstyle="named")
+    compiled = query.statement.compile(dialect=dialect, compile_kwargs={"render_postcompile": True})
+    if bind.dialect.name == "postgresql":
+        sql = "EXPLAIN " + str(compiled)
+    else:
+        sql = "EXPLAIN QUERY PLAN " + str(compiled)
+    rows = session.execute(text(sql), compiled.params).all()
+    return "\n".join(str(row[-1]) for row in rows)
+
+
+def _assert_uses(plan: str, index: str, ordered: bool = False) -> None:
+    assert index in plan, plan
+    assert "Seq Scan" not in plan, plan
+    assert "SCAN" not in plan.replace(f"SCAN {index}", ""), plan
+    if ordered:
+        # Rows come back in index order, with no sort step
+        assert "Sort" not in plan and "TEMP B-TREE" not in plan, plan
+
+
+USERS = 200
+ROWS_PER_USER = 10
+# The user under test has a long chat and feedback history, where sorting would cost most
+HISTORY_ROWS = 2000
+
+
+@pytest.fixture
+def seeded(db, user):
+    db.execute(insert(models.User), [
+        {"email": f"user{n}@example.com", "username": f"user{n}", "hashed_password": "x"}
+        for n in range(USERS - 1)
+    ])
+    user_ids = [user_id for user_id, in db.query(models.User.id)]
+    start = datetime(2026, 1, 1)
+    rows = [
+        (user_id, version, start + timedelta(days=version))
+        for user_id in user_ids for version in range(ROWS_PER_USER)
+    ]
+    for model in (models.WorkoutPlan, models.NutritionPlan):
+        db.execute(insert(model), [
+            {"user_id": user_id, "plan_data": {"v": version}, "created_at": created_at}
+            for user_id, version, created_at in rows
+        ])
+    db.execute(insert(models.GenerationTask), [
+        {
+            "id": f"{user_id}-{version}", "user_id": user_id, "task_type": "workout",
+            "status": "FAILED" if version % 3 else "SUCCESS", "created_at": created_at,
+        }
+        for user_id, version, created_at in rows
+    ])
+    history = rows + [(user.id, n, start + timedelta(hours=n)) for n in range(HISTORY_ROWS)]
+    db.execute(insert(models.ChatHistory), [
+        {"user_id": user_id, "message": "question", "response": "answer", "created_at": created_at}
+        for user_id, _, created_at in history
+    ])
+    db.execute(insert(models.PlanFeedback), [
+        {"user_id": user_id, "plan_type": "workout", "feedback_text": "more rest", "created_at": created_at}
+        for user_id, _, created_at in history
+    ])
+    db.commit()
+    if db.get_bind().dialect.name == "sqlite":
+        db.execute(text("ANALYZE"))
+    else:
+        for table in ("workout_plans", "nutrition_plans", "generation_tasks", "chat_history", "plan_feedbacks"):
+            db.execute(text(f"ANALYZE {table}"))
+    db.commit()
+    return user
+
+
+@pytest.mark.parametrize("plan_type", ["workout", "nutrition"])
+def test_plan_version_pages_use_user_created_index(db, seeded, plan_type):
+    model, _ = current_plans.PLAN_TYPES[plan_type]
+    cursor = pagination.encode_cursor([datetime(2026, 1, 5), 10**6])
+    for page_cursor in (None, cursor):
+        query = pagination.keyset(
+            db.query(model.id, model.created_at).filter(model.user_id == seeded.id),
+            [model.created_at, model.id],
+            page_cursor,
+        ).limit(20)
+        _assert_uses(_plan(db, query), f"ix_{model.__tablename__}_user_created")
+
+
+def test_active_task_lookup_uses_task_index(db, seeded):
+    query = db.query(models.GenerationTask).filter(
+        models.GenerationTask.user_id == seeded.id,
+        models.GenerationTask.task_type == "workout",
+        models.GenerationTask.status.in_(["PENDING", "PROCESSING"]),
+    ).limit(1)
+    _assert_uses(_plan(db, query), "ix_generation_tasks_user_type_status")
+
+
+def test_daily_quota_history_uses_task_index(db, seeded):
+    query = db.query(models.GenerationTask.created_at).filter(
+        models.GenerationTask.user_id == seeded.id,
+        models.GenerationTask.task_type == "workout",
+        models.GenerationTask.status != "FAILED",
+        models.GenerationTask.created_at >= datetime(2026, 1, 3),
+    )
+    _assert_uses(_plan(db, query), "ix_generation_tasks_user_type_status")
+
+
+@pytest.mark.parametrize("model, index", [
+    (models.ChatHistory, "ix_chat_history_user_created_id"),
+    (models.PlanFeedback, "ix_plan_feedbacks_user_created_id"),
+])
+def test_history_pages_use_keyset_index(db, seeded, model, index):
+    cursor = pagination.encode_cursor([datetime(2026, 2, 15), 10**6])
+    for page_cursor in (None, cursor):
+        query = pagination.keyset(
+            db.query(model).filter(model.user_id == seeded.id),
+            [model.created_at, model.id],
+            page_cursor,
+        ).limit(50)
+        _assert_uses(_plan(db, query), index, ordered=True)
@@ -0,0 +1,59 @@
+import time
+from unittest import mock
+
+from app.utils import quota
+from app.utils.rate_limit import redis_client
+
+HOUR = quota.BUCKET_SECONDS
+# Just before the end of the current hour
+LAST_SECONDS = (int(time.time()) // HOUR + 1) * HOUR - 5
+
+
+def _at(timestamp):
+    """Freeze the ledger's clock only; Redis keeps real time for key expiry."""
+    return mock.patch.object(quota, "time", mock.Mock(time=mock.Mock(return_value=timestamp)))
+
+
+def _charged(user_id, resource, now):
+    value = redis_client.get(quota._bucket_key(user_id, resource, quota._bucket_index(now)))
+    return int(value or 0)
+
+
+def test_release_slot_only_frees_own_slot(db):
+    assert quota.acquire_slot(1, "generate:nutrition", "old-task", 60) is True
+    # The stale task's slot expired and a newer task took it
+    redis_client.delete("slot:generate:nutrition:1")
+    assert quota.acquire_slot(1, "generate:nutrition", "new-task", 60) is True
+
+    quota.release_slot(1, "generate:nutrition", "old-task")
+    assert redis_client.get("slot:generate:nutrition:1") == "new-task"
+
+    quota.release_slot(1, "generate:nutrition", "new-task")
+    assert redis_client.get("slot:generate:nutrition:1") is None
+
+
+def test_release_quota_refunds_charged_bucket_across_hours(db):
+    charged_at = LAST_SECONDS
+    with _at(charged_at):
+        assert quota.acquire_quota(1, "plan:nutrition", 1, lambda: [], "task-1")
+    assert _charged(1, "plan:nutrition", charged_at) == 1
+
+    # The failure is reported in the next hour
+    with _at(charged_at + 10):
+        quota.release_quota(1, "plan:nutrition", "task-1")
+        quota.release_quota(1, "plan:nutrition", "task-1")
+    assert _charged(1, "plan:nutrition", charged_at) == 0
+    assert _charged(1, "plan:nutrition", charged_at + 10) == 0
+
+    with _at(charged_at + 10):
+        assert quota.acquire_quota(1, "plan:nutrition", 1, lambda: [], "task-2")
+        assert not quota.acquire_quota(1, "plan:nutrition", 1, lambda: [], "task-3")
+
+
+def test_release_quota_never_goes_negative(db):
+    with _at(LAST_SECONDS):
+        assert quota.acquire_quota(1, "feedback:workout", 5, lambda: [], "charge-1")
+        # The ledger was rebuilt from the database in between, without this unit
+        quota.rebuild_quota(1, "feedback:workout", [])
+        quota.release_quota(1, "feedback:workout", "charge-1")
+        assert _charged(1, "feedback:workout", LAST_SECONDS) == 0
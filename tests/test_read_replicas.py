@@ -0,0 +1,40 @@
+import pytest
+from fastapi import Request, Response
+from sqlalchemy import create_engine
+
+from app.api.endpoints import tracking
+from app.core.database import ReadSessionLocal
+from app.models import models
+
+
+@pytest.fixture
+def lagging_replica(tmp_path):
+    # A replica that hasn't received any rows yet
+    replica = create_engine(f"sqlite:///{tmp_path}/replica.db")
+    models.Base.metadata.create_all(bind=replica)
+    yield replica
+    replica.dispose()
+
+
+def _get_streak(user, replica):
+    db = ReadSessionLocal(replica=replica)
+    try:
+        request = Request({"type": "http", "method": "GET", "headers": []})
+        return tracking.get_streak(request, Response(), current_user=user, db=db)
+    finally:
+        db.close()
+
+
+def test_streak_on_lagging_replica_returns_primary_row(db, user, lagging_replica):
+    db.add(models.UserStreak(user_id=user.id, current_streak=4, longest_streak=9, total_workouts_completed=12))
+    db.commit()
+
+    streak = _get_streak(user, lagging_replica)
+    assert (streak.current_streak, streak.longest_streak) == (4, 9)
+    assert db.query(models.UserStreak).count() == 1
+
+
+def test_missing_streak_is_created_on_the_primary(db, user, lagging_replica):
+    streak = _get_streak(user, lagging_replica)
+    assert (streak.current_streak, streak.total_workouts_completed) == (0, 0)
+    assert db.query(models.UserStreak.user_id).all() == [(user.id,)]
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from app.utils import trends
+
+
+def _reference_ema(values, alpha):
+    out, prev = [], float(values[0])
+    for value in values:
+        prev = alpha * value + (1 - alpha) * prev
+        out.append(prev)
+    return np.array(out)
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.25, 0.9, 0.999, 0.999999])
+def test_ema_matches_recurrence(alpha):
+    rng = np.random.default_rng(7)
+    values = 80 + np.cumsum(rng.normal(0, 0.3, 300))
+    result = trends.ema(values, alpha)
+    assert np.isfinite(result).all()
+    np.testing.assert_allclose(result, _reference_ema(values, alpha), rtol=1e-9)
+
+
+def test_ema_empty_and_single():
+    assert len(trends.ema(np.array([]), 0.5)) == 0
+    np.testing.assert_allclose(trends.ema(np.array([72.5]), 0.999), [72.5])
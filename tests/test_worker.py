@@ -0,0 +1,125 @@
+import uuid
+from unittest import mock
+
+import pytest
+from sqlalchemy import exc
+
+from app import worker
+from app.models import models
+from app.utils import current_plans, quota
+from app.utils.rate_limit import redis_client
+
+
+@pytest.fixture
+def profile(db, user):
+    db.add(models.UserProfile(
+        user_id=user.id, height=180, weight=80, age=30, gender="male", activity_level="moderate"
+    ))
+    db.add(models.UserGoals(user_id=user.id, goal_type="weight_loss", target_weight=75, target_days=60))
+    db.commit()
+    return user
+
+
+def _admit(db, user_id, task_type):
+    """What the generation endpoint does before queueing the task."""
+    task_id = str(uuid.uuid4())
+    assert quota.acquire_slot(user_id, f"generate:{task_type}", task_id, 3600)
+    assert quota.acquire_quota(user_id, f"plan:{task_type}", 1, lambda: [], task_id)
+    db.add(models.GenerationTask(id=task_id, user_id=user_id, task_type=task_type, status="PENDING"))
+    db.commit()
+    return task_id
+
+
+def _quota_used(user_id, task_type):
+    keys = redis_client.keys(f"quota:plan:{task_type}:{user_id}:[0-9]*")
+    return sum(int(redis_client.get(key)) for key in keys)
+
+
+def _task(db, task_id):
+    db.expire_all()
+    return db.get(models.GenerationTask, task_id)
+
+
+@pytest.mark.parametrize("task_type", ["nutrition", "workout"])
+def test_generation_task_succeeds(db, profile, task_type):
+    if task_type == "workout":
+        current_plans.add_version(db, profile.id, "nutrition", {"meals": []})
+        db.commit()
+    task_id = _admit(db, profile.id, task_type)
+    plan = {"days": [{"day": 1}]}
+    with mock.patch.object(
+        worker.workflow_manager, f"generate_{task_type}_plan", return_value={f"{task_type}_plan": plan}
+    ) as generate:
+        getattr(worker, f"generate_{task_type}_plan_task").apply(args=(task_id, profile.id)).get()
+
+    generate.assert_called_once()
+    task = _task(db, task_id)
+    assert task.status == "SUCCESS"
+    assert task.result == {f"{task_type}_plan": plan}
+    assert current_plans.current_plan(db, profile.id, task_type).plan_data == plan
+    assert redis_client.get(f"slot:generate:{task_type}:{profile.id}") is None
+    assert _quota_used(profile.id, task_type) == 1
+
+
+@pytest.mark.parametrize("task_type", ["nutrition", "workout"])
+def test_generation_task_fails(db, profile, task_type):
+    if task_type == "workout":
+        current_plans.add_version(db, profile.id, "nutrition", {"meals": []})
+        db.commit()
+    task_id = _admit(db, profile.id, task_type)
+    with mock.patch.object(
+        worker.workflow_manager, f"generate_{task_type}_plan", side_effect=RuntimeError("model unavailable")
+    ):
+        getattr(worker, f"generate_{task_type}_plan_task").apply(args=(task_id, profile.id)).get()
+
+    task = _task(db, task_id)
+    assert task.status == "FAILED"
+    assert task.error == "model unavailable"
+    assert redis_client.get(f"slot:generate:{task_type}:{profile.id}") is None
+    assert _quota_used(profile.id, task_type) == 0
+
+
+def test_workout_task_fails_without_nutrition_plan(db, profile):
+    task_id = _admit(db, profile.id, "workout")
+    with mock.patch.object(worker.workflow_manager, "generate_workout_plan") as generate:
+        worker.generate_workout_plan_task.apply(args=(task_id, profile.id)).get()
+
+    generate.assert_not_called()
+    assert _task(db, task_id).status == "FAILED"
+    assert _quota_used(profile.id, "workout") == 0
+
+
+def _connection_lost(user_data):
+    # The task's session is left holding a dead connection
+    error = exc.OperationalError("SELECT 1", {}, Exception("server closed the connection unexpectedly"))
+    session = worker.TaskSession()
+    session.query = mock.Mock(side_effect=error)
+    session.rollback = mock.Mock(side_effect=error)
+    raise error
+
+
+def test_generation_task_fails_on_a_fresh_session_after_db_retries(db, profile):
+    task_id = _admit(db, profile.id, "nutrition")
+    with mock.patch.object(
+        worker.workflow_manager, "generate_nutrition_plan", side_effect=_connection_lost
+    ) as generate:
+        worker.generate_nutrition_plan_task.apply(args=(task_id, profile.id)).get()
+
+    assert generate.call_count == worker.DatabaseTask.max_retries + 1
+    task = _task(db, task_id)
+    assert task.status == "FAILED"
+    assert "server closed the connection" in task.error
+    assert redis_client.get(f"slot:generate:nutrition:{profile.id}") is None
+    assert _quota_used(profile.id, "nutrition") == 0
+
+
+def test_generation_task_releases_quota_when_failure_cannot_be_recorded(db, profile):
+    task_id = _admit(db, profile.id, "nutrition")
+    with mock.patch.object(
+        worker.workflow_manager, "generate_nutrition_plan", side_effect=RuntimeError("model unavailable")
+    ), mock.patch.object(worker, "_mark_failed", side_effect=exc.OperationalError("UPDATE", {}, Exception("down"))):
+        worker.generate_nutrition_plan_task.apply(args=(task_id, profile.id)).get()
+
+    assert _task(db, task_id).status == "PROCESSING"
+    assert redis_client.get(f"slot:generate:nutrition:{profile.id}") is None
+    assert _quota_used(profile.id, "nutrition") == 0
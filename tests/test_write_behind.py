@@ -0,0 +1,99 @@
+from unittest import mock
+
+import pytest
+import redis
+from fastapi import Response
+
+from app.api.endpoints import chat
+from app.models import models
+from app.utils import pagination, write_behind
+
+
+def test_queued_turns_are_drained_once(db, user):
+    created_at = write_behind.enqueue_chat_turn(user.id, "what is a deload week?", "a lighter week")
+    assert created_at is not None
+    assert write_behind.stream_client.xlen(write_behind.CHAT_STREAM) == 1
+
+    assert write_behind.drain(db) == 1
+    assert write_behind.drain(db) == 0
+    turns = db.query(models.ChatHistory).all()
+    assert [(turn.user_id, turn.message) for turn in turns] == [(user.id, "what is a deload week?")]
+    assert write_behind.stream_client.xlen(write_behind.CHAT_STREAM) == 0
+
+
+def test_queued_turns_are_read_before_the_drain(db, user):
+    db.add(models.ChatHistory(user_id=user.id, message="stored question", response="stored answer"))
+    db.commit()
+    write_behind.enqueue_chat_turn(user.id, "queued question", "queued answer")
+
+    history = chat.get_chat_history(Response(), current_user=user, db=db, limit=50, cursor=None)
+    assert [turn.message for turn in history] == ["queued question", "stored question"]
+
+    # Drained: read from the table, not twice
+    write_behind.drain(db)
+    assert write_behind.queued_turns(user.id) == []
+    stored = db.query(models.ChatHistory).order_by(models.ChatHistory.id.desc()).all()
+    assert [turn.message for turn in write_behind.merge_queued(stored, user.id, 50)] == [
+        "queued question", "stored question"
+    ]
+
+
+def test_queued_turns_respect_the_page_limit_and_cursor(db, user):
+    for n in range(3):
+        write_behind.enqueue_chat_turn(user.id, f"question {n}", "answer")
+
+    response = Response()
+    first = chat.get_chat_history(response, current_user=user, db=db, limit=2, cursor=None)
+    assert [turn.message for turn in first] == ["question 2", "question 1"]
+    cursor = response.headers[pagination.NEXT_CURSOR_HEADER]
+    second = chat.get_chat_history(Response(), current_user=user, db=db, limit=2, cursor=cursor)
+    assert [turn.message for turn in second] == ["question 0"]
+
+
+def _pending_count():
+    return write_behind.stream_client.xpending(write_behind.CHAT_STREAM, write_behind.GROUP)["pending"]
+
+
+def test_unacknowledged_turns_are_reclaimed(db, user):
+    write_behind.enqueue_chat_turn(user.id, "how long should I rest between sets?", "1-3 minutes")
+    # A drainer reads the entry and dies before inserting or acknowledging it
+    write_behind._ensure_group()
+    write_behind.stream_client.xreadgroup(
+        write_behind.GROUP, "dead-worker", {write_behind.CHAT_STREAM: ">"}, count=10
+    )
+    assert _pending_count() == 1
+
+    # Not idle for CLAIM_IDLE_MS yet: left to its owner
+    assert write_behind.drain(db) == 0
+    with mock.patch.object(write_behind, "CLAIM_IDLE_MS", 0):
+        assert write_behind.drain(db) == 1
+    assert [turn.message for turn in db.query(models.ChatHistory)] == ["how long should I rest between sets?"]
+    assert _pending_count() == 0
+
+
+def test_redelivered_turns_are_inserted_once(db, user):
+    write_behind.enqueue_chat_turn(user.id, "is cardio bad for gains?", "not in moderation")
+    # The batch commits, then the drainer dies before XACK
+    with mock.patch.object(write_behind.stream_client, "pipeline", side_effect=redis.ConnectionError):
+        with pytest.raises(redis.ConnectionError):
+            write_behind.drain(db)
+    assert db.query(models.ChatHistory).count() == 1
+    assert _pending_count() == 1
+
+    # ON CONFLICT (write_id, created_at) DO NOTHING: no IntegrityError, nothing dropped
+    with mock.patch.object(write_behind, "CLAIM_IDLE_MS", 0), mock.patch.object(write_behind.logger, "error") as error:
+        assert write_behind.drain(db) == 1
+    error.assert_not_called()
+    assert db.query(models.ChatHistory).count() == 1
+    assert _pending_count() == 0
+
+
+def test_turn_is_written_synchronously_when_xadd_fails(db, user):
+    with mock.patch.object(write_behind.stream_client, "pipeline", side_effect=redis.ConnectionError):
+        saved = chat._save_turn(user.id, "best time to train?", "whenever you're consistent", db)
+
+    turn = db.query(models.ChatHistory).one()
+    assert (turn.message, turn.write_id) == ("best time to train?", None)
+    assert saved.created_at == turn.created_at
+    assert write_behind.stream_client.xlen(write_behind.CHAT_STREAM) == 0
+    assert write_behind.queued_turns(user.id) == []